@@ -5,22 +5,37 @@ import time
 import tempfile
 
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, session, send_from_directory, url_for, redirect
+from flask import Flask, Response, render_template, request, jsonify, session, send_from_directory, url_for, redirect, stream_with_context
 from flask_login import LoginManager, current_user
 from flask_session import Session as FlaskSession
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+from langchain_core.callbacks import BaseCallbackHandler
 from httpx import Client
 
 from document_processor import DocumentExtractionAgent
 from enhanced_evaluation_agent import EnhancedEvaluationAgent
+from evaluation_agent import EvaluationAgent
 from simple_pdf_generator import create_simple_consultation_pdf
+from rate_limiter import ModelRateLimiter, QuotaExhaustedError
+from circuit_breaker import CircuitBreaker, CircuitOpenError, parse_retry_after
+from patient_reply_filter import PatientReplyFilter, filter_patient_reply
+from llm_cache import LLMResponseCache
+from evaluation_jobs import EvaluationJobQueue
+from evaluation_policy import EvaluationPolicy, EvaluationDeferred
+from incremental_evaluation import IncrementalEvaluator
+from conversation_store import ConversationStore, enable_sqlite_wal, to_message_dicts
+from system_prompts import SystemPromptRegistry
+from case_cache import CaseCache, TemplateFile
+from context_policy import ContextPolicy
+from rescore import RescoreRunner
+from rollups import enable_stats_rollups, needs_rebuild, rebuild as rebuild_stats
 from models import (
-    db, Student, Teacher, AdminAccess, PatientCase, StudentPerformance, CaseImage,
+    db, Student, Teacher, AdminAccess, PatientCase, CaseImage,
     OSCESession, SessionParticipant, SessionStationAssignment,
     CompetitionSession, CompetitionParticipant, CompetitionStationBank,
-    StudentCompetitionSession, StudentStationAssignment
+    StudentCompetitionSession, StudentStationAssignment, EvaluationJob
 )
 from auth import auth_bp
 from blueprints.admin import admin_bp
@@ -42,16 +57,108 @@ LLAMA_MODELS = {
         'temperature': 0.1,
         'max_tokens': 150,
         'timeout': 30
+    },
+    # Per-task chains and generation parameters, selected with invoke(..., profile=name).
+    # Keys left out fall back to 'chain' / 'config' above.
+    'profiles': {
+        # Patient replies: latency first, the small fast model leads
+        'chat': {
+            'chain': ['llama-3.1-8b-instant', 'meta-llama/llama-4-scout-17b-16e-instruct',
+                      'meta-llama/llama-4-maverick-17b-16e-instruct', 'gemma2-9b-it'],
+            'max_tokens': 150,
+            'timeout': 15
+        },
+        # Checklist grading: one verdict line per call (or per criterion in batched prompts)
+        'evaluation': {
+            'max_tokens': 150,
+            'temperature': 0.1
+        },
+        # Whole-document JSON extraction: larger models and a real output budget
+        'extraction': {
+            'chain': ['meta-llama/llama-4-maverick-17b-16e-instruct', 'meta-llama/llama-4-scout-17b-16e-instruct',
+                      'llama-3.3-70b-versatile'],
+            'max_tokens': 4096,
+            'temperature': 0.0,
+            'timeout': 120
+        },
+        # Rolling "facts already disclosed" summary of long consultations
+        'summary': {
+            'chain': ['llama-3.1-8b-instant', 'gemma2-9b-it'],
+            'max_tokens': 300,
+            'timeout': 20
+        },
+        # Startup reachability check
+        'ping': {
+            'chain': ['llama-3.1-8b-instant', 'meta-llama/llama-4-scout-17b-16e-instruct',
+                      'meta-llama/llama-4-maverick-17b-16e-instruct', 'gemma2-9b-it'],
+            'max_tokens': 1,
+            'timeout': 10
+        },
+    },
+    # Per-model quotas (Groq free tier) used to route requests proactively:
+    # rpm = requests/minute, tpm = tokens/minute, tpd = tokens/day
+    'limits': {
+        'meta-llama/llama-4-maverick-17b-16e-instruct': {'rpm': 30, 'tpm': 6000, 'tpd': 500000},
+        'meta-llama/llama-4-scout-17b-16e-instruct':    {'rpm': 30, 'tpm': 30000, 'tpd': 500000},
+        'llama-3.3-70b-versatile':                      {'rpm': 30, 'tpm': 12000, 'tpd': 100000},
+        'llama-3.1-8b-instant':                         {'rpm': 30, 'tpm': 6000, 'tpd': 500000},
+        'gemma2-9b-it':                                 {'rpm': 30, 'tpm': 15000, 'tpd': 500000},
+    },
+    # Per-model circuit breaker: open on fallback-class errors, probe again after the cooldown
+    'circuit_breaker': {
+        'failure_threshold': 1,
+        'cooldown_seconds': 60,
+        'max_cooldown_seconds': 900
+    },
+    # Disk cache for deterministic calls that opt in with invoke(..., cache=True)
+    'cache': {
+        'filename': 'llm_cache.sqlite',  # in the Flask instance folder
+        'max_entries': 5000,
+        'ttl_seconds': 7 * 24 * 3600
     }
 }
 
 
+class _UsageRecorder(BaseCallbackHandler):
+    """Captures the token usage Groq reports in llm_output (it is not set on the returned message)"""
+
+    def __init__(self):
+        self.total_tokens = None
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        self.total_tokens = usage.get('total_tokens')
+
+
 class FallbackGroqClient:
     """
     Drop-in replacement for ChatGroq that wraps a chain of models.
-    On rate-limit / 429 / service errors from the active model, it
-    automatically retries the request against the next model in the chain.
-    Successful model is remembered and used first on subsequent calls.
+    On rate-limit / 429 / service errors from a model, it automatically
+    retries the request against the next model in the chain.
+
+    Models are always tried in chain order. Each has a circuit breaker that
+    opens on fallback-class errors, so a failing model is skipped without a
+    round-trip until its cooldown ends; a single half-open probe then brings
+    the preferred model back once it recovers. `active_model` is the model
+    that served the last request.
+
+    Before sending, each model's rate-limit budget is checked: models that
+    would exceed their requests/tokens per minute or tokens per day are
+    skipped without a round-trip. See remaining_budget().
+
+    Calls made with invoke(..., cache=True) are answered from the persistent
+    response cache when an identical call (model, messages, params) was made
+    before. Only deterministic prompts should opt in, never patient chat.
+
+    `profiles` maps task names ('chat', 'evaluation', 'extraction', ...) to
+    their own chain, max_tokens, temperature and timeout; calls pick one with
+    invoke(..., profile=name). Calls without a profile, or naming one that is
+    not configured, use `models` and `config`. Per-call max_tokens/temperature
+    still override the profile. `active_model` follows the chat profile;
+    model_for(profile) is the model serving any other profile.
+
+    `client_factory(model)` replaces ChatGroq as the per-model client, e.g. the
+    fake chat model of benchmarks/fake_llm.py for offline benchmarks.
     """
 
     # Errors that should trigger a fallback to the next model.
@@ -61,58 +168,255 @@ class FallbackGroqClient:
         'model_not_found', 'model not found', 'decommissioned'
     )
 
-    def __init__(self, api_key, http_client, models, config):
+    # Rough characters-per-token ratio used to estimate a prompt's cost
+    _CHARS_PER_TOKEN = 4
+
+    # Profiles whose calls update active_model
+    _ACTIVE_PROFILES = (None, 'chat', 'ping')
+
+    def __init__(self, api_key, http_client, models, config, limits=None, rate_limiter=None,
+                 breaker_config=None, clock=time.monotonic, cache=None, client_factory=None,
+                 profiles=None):
         self.api_key = api_key
         self.http_client = http_client
         self.models = list(models)
         self.config = config
+        self.profiles = profiles or {}
         self._clients = {}
-        self.active_model = self.models[0]
-
-    def _get_client(self, model):
-        if model not in self._clients:
-            self._clients[model] = ChatGroq(
+        self.active_model = self._profile('chat')['chain'][0]
+        # Model that answered the last call of each profile
+        self._serving_models = {}
+        self.rate_limiter = rate_limiter or ModelRateLimiter(limits, clock=clock)
+        # One breaker per model, shared by every profile that uses it
+        all_models = list(dict.fromkeys(
+            self.models + [m for profile in self.profiles.values() for m in profile.get('chain', [])]
+        ))
+        self.breakers = {
+            model: CircuitBreaker(model, clock=clock, **(breaker_config or {}))
+            for model in all_models
+        }
+        self.cache = cache
+        self.client_factory = client_factory
+
+    def _profile(self, name):
+        """Chain and generation parameters of a profile (the defaults if it is not configured)"""
+        profile = self.profiles.get(name, {}) if name else {}
+        return {
+            'chain': list(profile.get('chain', self.models)),
+            'max_tokens': profile.get('max_tokens', self.config['max_tokens']),
+            'temperature': profile.get('temperature', self.config['temperature']),
+            'timeout': profile.get('timeout', self.config['timeout']),
+        }
+
+    def _generation_kwargs(self, profile, kwargs):
+        """Per-call kwargs with the profile's max_tokens/temperature as defaults"""
+        return {
+            'max_tokens': profile['max_tokens'],
+            'temperature': profile['temperature'],
+            **kwargs
+        }
+
+    def _get_client(self, model, timeout=None):
+        # Generation params are passed per call; only the timeout is fixed per client
+        timeout = timeout or self.config['timeout']
+        key = (model, timeout)
+        if key not in self._clients:
+            if self.client_factory is not None:
+                self._clients[key] = self.client_factory(model)
+                return self._clients[key]
+            self._clients[key] = ChatGroq(
                 api_key=self.api_key,
                 model=model,
                 temperature=self.config['temperature'],
                 max_tokens=self.config['max_tokens'],
-                timeout=self.config['timeout'],
+                timeout=timeout,
                 http_client=self.http_client,
             )
-        return self._clients[model]
+        return self._clients[key]
 
     def _is_fallback_error(self, err):
         msg = str(err).lower()
         return any(k in msg for k in self._FALLBACK_KEYWORDS)
 
-    def invoke(self, messages, config=None, **kwargs):
+    def _estimate_tokens(self, messages, kwargs):
+        """Prompt size estimate plus the completion budget requested for this call"""
+        if isinstance(messages, str):
+            messages = [messages]
+        prompt_chars = sum(len(str(getattr(m, 'content', m))) for m in messages)
+        max_tokens = kwargs.get('max_tokens') or self.config['max_tokens']
+        return prompt_chars // self._CHARS_PER_TOKEN + max_tokens
+
+    @staticmethod
+    def _with_usage_recorder(config, recorder):
+        config = dict(config or {})
+        callbacks = config.get('callbacks')
+        if callbacks is None:
+            config['callbacks'] = [recorder]
+        elif isinstance(callbacks, list):
+            config['callbacks'] = callbacks + [recorder]
+        # A callback manager is left untouched; usage then falls back to the estimate
+        return config
+
+    def model_for(self, profile):
+        """Model serving `profile`: the one that answered its last call, else the head of its chain"""
+        return self._serving_models.get(profile) or self._profile(profile)['chain'][0]
+
+    def remaining_budget(self, model=None):
+        """Remaining rpm/tpm/tpd budget per model (or for a single `model`)"""
+        return self.rate_limiter.remaining_budget(model)
+
+    def circuit_states(self):
+        """Circuit breaker state per model"""
+        return {model: breaker.snapshot() for model, breaker in self.breakers.items()}
+
+    def _next_model(self, profile, estimated_tokens):
+        """
+        Model _run_on_chain would try first, without reserving anything: the
+        first with a closed circuit (or one due for its probe) and budget left.
+        None if there is none.
+        """
+        for model in self._profile(profile)['chain']:
+            circuit = self.breakers[model].snapshot()
+            if circuit['state'] == 'half_open' or circuit['open_for'] > 0:
+                continue
+            if self.rate_limiter.has_budget(model, estimated_tokens):
+                return model
+        return None
+
+    def _run_on_chain(self, messages, config, kwargs, call, profile=None):
+        """
+        Run `call(client, messages, config, **kwargs)` on the first model of the
+        profile's chain that has a closed circuit and budget left, falling back
+        on errors.
+        Returns (model, estimated_tokens, usage_recorder, result).
+        """
+        settings = self._profile(profile)
+        chain = settings['chain']
+        kwargs = self._generation_kwargs(settings, kwargs)
         last_error = None
-        # Try the currently-active model first, then the rest of the chain
-        order = [self.active_model] + [m for m in self.models if m != self.active_model]
-        for model in order:
+        over_budget = []
+        circuit_open = []
+        estimated_tokens = self._estimate_tokens(messages, kwargs)
+        # Always walk the chain in preference order; open circuits are skipped
+        for model in chain:
+            breaker = self.breakers[model]
+            if not breaker.allow_request():
+                circuit_open.append(model)
+                continue
+            if not self.rate_limiter.acquire(model, estimated_tokens):
+                breaker.release_probe()
+                logger.info(f"[Groq budget] skipping '{model}': no budget for ~{estimated_tokens} tokens")
+                over_budget.append(model)
+                continue
+            recorder = _UsageRecorder()
             try:
-                client = self._get_client(model)
-                response = client.invoke(messages, config=config, **kwargs)
-                if model != self.active_model:
-                    logger.warning(f"[Groq fallback] switched active model to '{model}'")
-                    self.active_model = model
-                return response
+                client = self._get_client(model, settings['timeout'])
+                result = call(client, messages, self._with_usage_recorder(config, recorder), **kwargs)
             except Exception as e:
+                self.rate_limiter.release(model, estimated_tokens)
                 last_error = e
                 if self._is_fallback_error(e):
+                    breaker.record_failure(retry_after=parse_retry_after(e))
                     logger.warning(
                         f"[Groq fallback] '{model}' failed ({type(e).__name__}): "
                         f"{str(e)[:250]}. Trying next model…"
                     )
                     continue
-                # Non-fallback error (auth, bad request, etc.) — don't cycle
+                # Non-fallback error (auth, bad request, etc.) — the model answered,
+                # so its circuit stays closed; don't cycle
+                breaker.record_success()
                 logger.error(f"[Groq] non-recoverable error on '{model}': {e}")
                 raise
+
+            breaker.record_success()
+            self._serving_models[profile] = model
+            if profile in self._ACTIVE_PROFILES and model != self.active_model:
+                logger.warning(f"[Groq fallback] switched active model to '{model}'")
+                self.active_model = model
+            return model, estimated_tokens, recorder, result
+
+        if last_error is None and over_budget:
+            # The first model to free up, whether its budget refills or its circuit probes again
+            retry_after = min(
+                [self.rate_limiter.seconds_until_available(m, estimated_tokens) for m in over_budget] +
+                [self.breakers[m].seconds_until_probe() for m in circuit_open]
+            )
+            if circuit_open:
+                reason = (f"Groq quota budget exhausted on {len(over_budget)} models and "
+                          f"{len(circuit_open)} cooling down after errors")
+            else:
+                reason = f"Groq quota budget exhausted on all {len(over_budget)} models"
+            raise QuotaExhaustedError(f"{reason}; retry in ~{retry_after:.0f}s", retry_after=retry_after)
+        if last_error is None and circuit_open:
+            retry_after = min(self.breakers[m].seconds_until_probe() for m in circuit_open)
+            raise CircuitOpenError(
+                f"All Groq models are cooling down after errors; retry in ~{retry_after:.0f}s",
+                retry_after=retry_after
+            )
         raise Exception(
-            f"All Groq models exhausted ({len(self.models)} tried). "
+            f"All Groq models exhausted ({len(chain)} tried). "
             f"Last error: {last_error}"
         )
 
+    def _settle_usage(self, model, estimated_tokens, recorder):
+        actual_tokens = recorder.total_tokens
+        self.rate_limiter.reconcile(
+            model, estimated_tokens, actual_tokens if actual_tokens is not None else estimated_tokens
+        )
+
+    def _cache_params(self, profile, kwargs):
+        """Generation params that determine a response: profile defaults overridden per call"""
+        return self._generation_kwargs(self._profile(profile), kwargs)
+
+    def cache_stats(self):
+        """Hit/miss counters and entry count of the response cache (None if disabled)"""
+        return self.cache.stats() if self.cache is not None else None
+
+    def invoke(self, messages, config=None, cache=False, profile=None, **kwargs):
+        """Like ChatGroq.invoke, on the chain and with the generation params of `profile`"""
+        use_cache = cache and self.cache is not None
+        if use_cache:
+            params = self._cache_params(profile, kwargs)
+            # Only the answer of the model that would serve the call now: a fallback's
+            # cached verdict must not outlive the preferred model's recovery
+            model = self._next_model(profile, self._estimate_tokens(messages, params))
+            cached = self.cache.get([LLMResponseCache.make_key(model, messages, params)]) if model else None
+            if cached is not None:
+                logger.info(f"[Groq cache] hit for '{model}'")
+                return AIMessage(content=cached[1], response_metadata={'model_name': model, 'cache_hit': True})
+
+        model, estimated_tokens, recorder, response = self._run_on_chain(
+            messages, config, kwargs,
+            lambda client, msgs, cfg, **kw: client.invoke(msgs, config=cfg, **kw),
+            profile=profile
+        )
+        self._settle_usage(model, estimated_tokens, recorder)
+
+        if use_cache:
+            self.cache.set(LLMResponseCache.make_key(model, messages, params), model, response.content)
+        return response
+
+    def stream(self, messages, config=None, profile=None, **kwargs):
+        """
+        Stream message chunks from the first available model. Falling back to
+        the next model is only possible until the first chunk has arrived.
+        """
+        def open_stream(client, msgs, cfg, **kw):
+            chunks = client.stream(msgs, config=cfg, **kw)
+            # Pull the first chunk here so connection/rate-limit errors trigger the fallback
+            return next(chunks, None), chunks
+
+        model, estimated_tokens, recorder, (first_chunk, chunks) = self._run_on_chain(
+            messages, config, kwargs, open_stream, profile=profile
+        )
+        try:
+            if first_chunk is not None:
+                yield first_chunk
+                yield from chunks
+        finally:
+            chunks.close()
+            self._settle_usage(model, estimated_tokens, recorder)
+
     # Forward other LangChain Runnable-style calls to the active client
     def __call__(self, messages, config=None, **kwargs):
         return self.invoke(messages, config=config, **kwargs)
@@ -123,20 +427,24 @@ class FallbackGroqClient:
         return getattr(self._get_client(self.active_model), name)
 
 
-def create_groq_client(api_key, http_client):
+def create_groq_client(api_key, http_client, cache=None):
     """Create Groq client with a runtime fallback chain across multiple models."""
     client = FallbackGroqClient(
         api_key=api_key,
         http_client=http_client,
         models=LLAMA_MODELS['chain'],
         config=LLAMA_MODELS['config'],
+        limits=LLAMA_MODELS['limits'],
+        breaker_config=LLAMA_MODELS['circuit_breaker'],
+        cache=cache,
+        profiles=LLAMA_MODELS['profiles'],
     )
 
     # Lightweight ping — find the first model in the chain that currently
     # works. We don't fail startup here because rate-limits are per-day:
     # a model may be unavailable right now but fine in 10 minutes.
     try:
-        client.invoke([HumanMessage(content="ping")])
+        client.invoke([HumanMessage(content="ping")], profile='ping')
         logger.info(
             f"Groq client ready. Active model: {client.active_model}. "
             f"Chain: {LLAMA_MODELS['chain']}"
@@ -205,7 +513,9 @@ def setup_enhanced_logging():
 setup_enhanced_logging()
 logger = logging.getLogger(__name__)
 
-def create_app():
+def create_app(config=None):
+    """Application factory. `config` overrides settings before the extensions
+    start, e.g. a throwaway database and session directory for benchmarks/."""
     app = Flask(__name__,
                 static_folder='static',
                 template_folder='templates')
@@ -215,9 +525,7 @@ def create_app():
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'ecos-fmpm-secret-key-2026')
     app.config['SESSION_TYPE'] = 'filesystem'
     # Store session files next to the app so they survive restarts
-    _session_dir = os.path.join(os.path.dirname(__file__), 'flask_session_data')
-    os.makedirs(_session_dir, exist_ok=True)
-    app.config['SESSION_FILE_DIR'] = _session_dir
+    app.config['SESSION_FILE_DIR'] = os.path.join(os.path.dirname(__file__), 'flask_session_data')
     app.config['SESSION_FILE_THRESHOLD'] = 500          # max files before old ones are removed
     app.config['SESSION_PERMANENT'] = True
     app.config['SESSION_USE_SIGNER'] = True
@@ -228,6 +536,10 @@ def create_app():
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=2)
     app.config['SESSION_COOKIE_SECURE'] = False
     app.config['APP_VERSION'] = '20260404v'
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///osce_simulator.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(config or {})
+    os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
 
     # Activate server-side session BEFORE any other extension so the session
     # object is upgraded from cookie-based to filesystem-based.
@@ -237,10 +549,6 @@ def create_app():
     def inject_version():
         return {'app_version': app.config['APP_VERSION']}
 
-    # Configure database
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///osce_simulator.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
     # Initialize extensions
     db.init_app(app)
     login_manager = LoginManager()
@@ -334,6 +642,11 @@ def create_app():
     # Create tables if they don't exist
     with app.app_context():
         try:
+            # WAL journaling: per-turn appends don't block readers or rewrite the file
+            enable_sqlite_wal(db.engine)
+            # student_stats / case_stats follow every flush that records an attempt
+            enable_stats_rollups()
+
             # Create all tables
             db.create_all()
             
@@ -393,6 +706,82 @@ def create_app():
             except Exception as migration_err:
                 logger.warning(f"Migration note for teacher.email: {migration_err}")
 
+            # Add evaluation_strategy column to patient_case1 (per-case checklist evaluation strategy)
+            try:
+                from sqlalchemy import text
+                inspector4 = db.inspect(db.engine)
+                case_columns = [c['name'] for c in inspector4.get_columns('patient_case1')]
+                if 'evaluation_strategy' not in case_columns:
+                    with db.engine.connect() as conn:
+                        conn.execute(text('ALTER TABLE patient_case1 ADD COLUMN evaluation_strategy VARCHAR(20)'))
+                        conn.commit()
+                    logger.info("Added evaluation_strategy column to patient_case1 table")
+            except Exception as migration_err:
+                logger.warning(f"Migration note for patient_case1.evaluation_strategy: {migration_err}")
+
+            # Add conversation_id columns: transcripts referenced in the conversation store
+            for table in ('student_performance', 'evaluation_jobs'):
+                try:
+                    from sqlalchemy import text
+                    table_columns = [c['name'] for c in db.inspect(db.engine).get_columns(table)]
+                    if 'conversation_id' not in table_columns:
+                        with db.engine.connect() as conn:
+                            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN conversation_id VARCHAR(32)'))
+                            conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_conversation_id ON {table} (conversation_id)'))
+                            conn.commit()
+                        logger.info(f"Added conversation_id column to {table} table")
+                except Exception as migration_err:
+                    logger.warning(f"Migration note for {table}.conversation_id: {migration_err}")
+
+            # Covering indexes for the dashboard rollups (create_all skips existing tables)
+            try:
+                from sqlalchemy import text
+                with db.engine.connect() as conn:
+                    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_student_performance_case_rollup '
+                                      'ON student_performance (case_number, percentage_score, completed_at)'))
+                    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_student_performance_student_rollup '
+                                      'ON student_performance (student_id, case_number, percentage_score, completed_at)'))
+                    conn.commit()
+            except Exception as migration_err:
+                logger.warning(f"Migration note for student_performance rollup indexes: {migration_err}")
+
+            # Add system_prompt_id column to conversations (prompt shared through system_prompts)
+            try:
+                from sqlalchemy import text
+                conversation_columns = [c['name'] for c in db.inspect(db.engine).get_columns('conversations')]
+                if 'system_prompt_id' not in conversation_columns:
+                    with db.engine.connect() as conn:
+                        conn.execute(text('ALTER TABLE conversations ADD COLUMN system_prompt_id VARCHAR(32)'))
+                        conn.commit()
+                    logger.info("Added system_prompt_id column to conversations table")
+            except Exception as migration_err:
+                logger.warning(f"Migration note for conversations.system_prompt_id: {migration_err}")
+
+            # Add rolling summary columns to conversations (bounded chat context)
+            for column, ddl in (('summary', 'TEXT'), ('summary_message_count', 'INTEGER NOT NULL DEFAULT 0')):
+                try:
+                    from sqlalchemy import text
+                    conversation_columns = [c['name'] for c in db.inspect(db.engine).get_columns('conversations')]
+                    if column not in conversation_columns:
+                        with db.engine.connect() as conn:
+                            conn.execute(text(f'ALTER TABLE conversations ADD COLUMN {column} {ddl}'))
+                            conn.commit()
+                        logger.info(f"Added {column} column to conversations table")
+                except Exception as migration_err:
+                    logger.warning(f"Migration note for conversations.{column}: {migration_err}")
+
+            # Add heartbeat_at column to rescore_runs (claiming a run across processes)
+            try:
+                from sqlalchemy import text
+                run_columns = [c['name'] for c in db.inspect(db.engine).get_columns('rescore_runs')]
+                if 'heartbeat_at' not in run_columns:
+                    with db.engine.connect() as conn:
+                        conn.execute(text('ALTER TABLE rescore_runs ADD COLUMN heartbeat_at DATETIME'))
+                        conn.commit()
+                    logger.info("Added heartbeat_at column to rescore_runs table")
+            except Exception as migration_err:
+                logger.warning(f"Migration note for rescore_runs.heartbeat_at: {migration_err}")
+
             # Drop NOT NULL constraint on teacher.login by recreating the table
             # SQLite doesn't support ALTER COLUMN, so we recreate the table
             try:
@@ -421,6 +810,35 @@ def create_app():
             except Exception as migration_err:
                 logger.warning(f"Migration note for teacher.login nullable: {migration_err}")
 
+            # Competition score columns, promoted out of the performance_data blob
+            for column, ddl in (('percentage_score', 'FLOAT'), ('points_earned', 'INTEGER'),
+                                ('points_total', 'INTEGER'), ('duration_seconds', 'INTEGER')):
+                try:
+                    from sqlalchemy import text
+                    assignment_columns = [c['name'] for c in db.inspect(db.engine).get_columns('student_station_assignments')]
+                    if column not in assignment_columns:
+                        with db.engine.connect() as conn:
+                            conn.execute(text(f'ALTER TABLE student_station_assignments ADD COLUMN {column} {ddl}'))
+                            conn.commit()
+                        logger.info(f"Added {column} column to student_station_assignments table")
+                except Exception as migration_err:
+                    logger.warning(f"Migration note for student_station_assignments.{column}: {migration_err}")
+            try:
+                backfilled = StudentStationAssignment.backfill_scores()
+                if backfilled:
+                    logger.info(f"Backfilled scores of {backfilled} station assignments from performance_data")
+            except Exception as migration_err:
+                db.session.rollback()
+                logger.warning(f"Migration note for student_station_assignments score backfill: {migration_err}")
+
+            # Backfill student_stats / case_stats when they were just added to an existing database
+            try:
+                if needs_rebuild():
+                    rebuild_stats()
+            except Exception as migration_err:
+                db.session.rollback()
+                logger.warning(f"Migration note for student_stats/case_stats backfill: {migration_err}")
+
         except Exception as e:
             logger.error(f"Error creating database tables: {str(e)}")
 
@@ -439,9 +857,22 @@ def create_app():
         logger.error("GROQ_API_KEY not found in environment variables")
         raise ValueError("GROQ_API_KEY not found in environment variables")
 
+    # Persistent LLM response cache (evaluation / extraction calls opt in)
+    llm_cache = None
+    try:
+        os.makedirs(app.instance_path, exist_ok=True)
+        cache_config = LLAMA_MODELS['cache']
+        llm_cache = LLMResponseCache(
+            os.path.join(app.instance_path, cache_config['filename']),
+            max_entries=cache_config['max_entries'],
+            ttl_seconds=cache_config['ttl_seconds']
+        )
+    except Exception as e:
+        logger.warning(f"LLM response cache disabled: {str(e)}")
+
     # Initialize ChatGroq client
     try:
-        client, active_model = create_groq_client(api_key, http_client)
+        client, active_model = create_groq_client(api_key, http_client, cache=llm_cache)
         app.config['ACTIVE_MODEL'] = active_model
         logger.info(f"ChatGroq client initialized successfully with model: {active_model}")
     except Exception as e:
@@ -451,29 +882,73 @@ def create_app():
     # Initialize document processor
     document_agent = DocumentExtractionAgent(llm_client=client)
     
-    # Initialize evaluation agent 
-    evaluation_agent = EnhancedEvaluationAgent(llm_client=client)
-
-
     EVALUATION_CONFIG = {
         'min_conversation_length': 3,  # Minimum messages for LLM evaluation
         'max_tokens_per_evaluation': 150,  # Tokens per criterion evaluation
         'evaluation_temperature': 0.1,  # Low temperature for consistent results
-        'cache_enabled': True,  # Enable caching for repeated evaluations
-        'fallback_to_patterns': True  # Use pattern matching as fallback
+        'cache_enabled': True,  # Cache evaluations (in memory and in the LLM response cache)
+        'fallback_to_patterns': True,  # Use pattern matching as fallback
+        'evaluation_strategy': 'concurrent',  # 'concurrent', 'sequential' or 'batched' (one prompt per category)
+        'max_concurrent_criteria': 5,  # Max LLM calls in flight across evaluations
+        'criterion_timeout_seconds': 45,  # Per-item timeout in concurrent mode
+        'job_workers': 2,  # Background evaluation jobs run at once
+        'job_max_attempts': 3,  # Attempts before a job is marked failed
+        'job_retry_backoff_seconds': 10,  # Doubled after each failed attempt
+        'job_lease_seconds': 600,  # A running job older than this is considered lost
+        'incremental_evaluation': True,  # Re-check the checklist in the background after each turn
+        'incremental_workers': 2,  # Conversations updated at once
+        'incremental_max_conversations': 500,  # In-progress conversations tracked
+        'incremental_ttl_seconds': 7200,  # Forget conversations idle for longer than this
+        'incremental_final_wait_seconds': 10,  # How long the final pass waits for an in-flight update
+        'rescore_workers': 2,  # Transcripts re-scored at once by a bulk re-scoring run
+        'rescore_batch_size': 20,  # Results written per transaction
+        'rescore_headroom_tokens': 4000,  # Rate-limit budget a model must have before each re-score
+        'rescore_stale_seconds': 600,  # A running re-scoring run without heartbeat for this long can be resumed elsewhere
+        'policy_enabled': True,  # Degrade to cheaper evaluation tiers under load (see evaluation_policy.py)
+        'policy_practice_depth': {'batched': 3, 'single_prompt': 8, 'patterns': 20},  # Queue depth per tier
+        'policy_competition_depth': {'batched': 6, 'single_prompt': 15},
+        'policy_competition_floor': 'single_prompt',  # Competitions are never graded below this tier
+        'policy_budget_headroom': 1.2,  # Margin over a tier's estimated token cost
+        'policy_upgrade_delay_seconds': 300,  # Re-score degraded practice evaluations after this delay
+        'policy_upgrade_retry_seconds': 300,  # Postpone an upgrade this long while the system is busy
+        'policy_incremental_per_update': 3,  # Criteria re-checked per in-progress update
+        'policy_incremental_per_conversation': 20,  # Criteria re-checked per consultation before the final pass
+        'policy_incremental_debounce_seconds': 15  # Minimum delay between two updates of a consultation
     }
 
+    # Initialize evaluation agent 
+    evaluation_agent = EnhancedEvaluationAgent(llm_client=client, settings=EVALUATION_CONFIG)
+
     # Store instances in app config for access by other modules
     app.config['DOCUMENT_AGENT'] = document_agent
     app.config['EVALUATION_AGENT'] = evaluation_agent
     app.config['GROQ_CLIENT'] = client
     app.config['EVALUATION_CONFIG'] = EVALUATION_CONFIG
 
-    def load_patient_case(case_number):
-        """Load patient case data from the database"""
+    # Consultations in progress: the session only keeps the conversation id
+    conversation_store = ConversationStore()
+    app.config['CONVERSATION_STORE'] = conversation_store
+
+    # History sent to the patient model: recent turns plus a rolling summary (see context_policy.py)
+    CHAT_CONTEXT_CONFIG = {
+        'enabled': True,
+        'keep_turns': 6,  # Exchanges (question + reply) always sent verbatim
+        'summarize_every': 4,  # Older exchanges folded into the summary at a time
+        'summary_profile': 'summary'  # LLAMA_MODELS profile writing the summary
+    }
+    context_policy = ContextPolicy(app, client, settings=CHAT_CONTEXT_CONFIG)
+    app.config['CONTEXT_POLICY'] = context_policy
+    with app.app_context():
+        try:
+            conversation_store.purge_abandoned(app.config['PERMANENT_SESSION_LIFETIME'])
+        except Exception as e:
+            logger.warning(f"Could not purge abandoned conversations: {str(e)}")
+
+    def read_patient_case(case_number):
+        """Load patient case data from the database (load_patient_case goes through the case cache)"""
         try:
             # First try to load from database
-            case_data_db = PatientCase.query.filter_by(case_number=str(case_number)).first()
+            case_data_db = PatientCase.query.options(db.undefer_group('case_content')).filter_by(case_number=str(case_number)).first()
 
             if case_data_db:
                 # Convert the SQLAlchemy object to a dictionary-like structure
@@ -490,6 +965,7 @@ def create_app():
                     "additional_notes": case_data_db.additional_notes,
                     "lab_results": case_data_db.lab_results,
                     "custom_sections": case_data_db.custom_sections,
+                    "evaluation_strategy": case_data_db.evaluation_strategy,
                     "images": []
                 }
                 
@@ -512,27 +988,39 @@ def create_app():
             logger.error(f"Error loading patient case {case_number} from database: {str(e)}")
             raise
 
+    def case_updated_at(case_number):
+        """Version of a case for the cache: its updated_at, None if it does not exist"""
+        return db.session.query(PatientCase.updated_at).filter_by(case_number=str(case_number)).scalar()
+
+    # Parsed cases and their system prompts, re-validated against updated_at
+    case_cache = CaseCache(read_patient_case, case_updated_at, revalidate_seconds=5)
+    app.config['CASE_CACHE'] = case_cache
+    system_template_file = TemplateFile("response_template.json")
+
+    def load_patient_case(case_number):
+        """Load patient case data (a copy from the case cache)"""
+        try:
+            return case_cache.get(case_number)
+        except Exception as e:
+            logger.error(f"Error loading patient case {case_number}: {str(e)}")
+            raise
+
     def load_system_template():
-        """Load system prompt template"""
+        """Load system prompt template (re-read only when the file changes)"""
         try:
-            template_path = "response_template.json"
-            logger.debug(f"Loading system template from: {template_path}")
-            
-            if not os.path.exists(template_path):
-                raise FileNotFoundError("Response template file not found")
-                
-            with open(template_path, "r", encoding="utf-8") as f:
-                template = json.load(f)
-                logger.info("Successfully loaded system template")
-                return template
+            return system_template_file.load()
         except Exception as e:
             logger.error(f"Error loading system template: {str(e)}")
             raise
 
-    def initialize_conversation(case_number):
-        """Initialize a new conversation with enhanced patient simulation prompt"""
+    def render_system_prompt(case_number):
+        """Enhanced patient simulation prompt of a case, rendered once per case and template version"""
+        return case_cache.system_prompt(case_number, system_template_file.version, build_system_prompt)
+
+    def build_system_prompt(patient_data):
+        """Enhanced patient simulation prompt: template, identity card, symptoms and diagnosis"""
         try:
-            patient_data = load_patient_case(case_number)
+            case_number = patient_data.get('case_number')
             system_template = load_system_template()
             
             # Create enhanced system message for realistic patient simulation
@@ -583,20 +1071,32 @@ def create_app():
                     f"⚠ Ne mentionnez JAMAIS ce diagnostic. Vous êtes un patient, vous ne connaissez pas votre diagnostic.\n"
                 )
             
-            # Create conversation with enhanced system message
-            conversation = [SystemMessage(content=enhanced_system_message)]
-            
-            logger.info(f"Initialized enhanced conversation for case {case_number}")
-            return conversation
+            logger.info(f"Rendered enhanced system prompt for case {case_number}")
+            return enhanced_system_message
                 
         except Exception as e:
-            logger.error(f"Error initializing enhanced conversation: {str(e)}")
+            logger.error(f"Error rendering system prompt: {str(e)}")
             raise
+
+    def system_prompt_version(case_number):
+        """Changes whenever render_system_prompt(case_number) would: case update time and template file"""
+        updated_at = case_cache.version(case_number)
+        return f"{updated_at.isoformat() if updated_at else ''}|{system_template_file.version:.0f}"
+
+    # Rendered once per case version and shared; conversations reference it by id
+    system_prompts = SystemPromptRegistry(render_system_prompt, system_prompt_version)
+    app.config['SYSTEM_PROMPTS'] = system_prompts
+
+    def initialize_conversation(case_number):
+        """Opening messages of a new conversation: a reference to the case's system prompt"""
+        conversation = [system_prompts.reference(case_number)]
+        logger.info(f"Initialized enhanced conversation for case {case_number}")
+        return conversation
             
     def get_case_metadata():
         cases_metadata = []
         try:
-            cases = PatientCase.query.all()
+            cases = PatientCase.list_query().all()
             for case in cases:
                 cases_metadata.append({
                     "case_number": case.case_number,
@@ -623,8 +1123,15 @@ def create_app():
             logger.error(f"Error getting unique specialties from database: {str(e)}")
             return []
     
-    def evaluate_conversation(conversation, case_number):
-        """Evaluate the conversation using the EvaluationAgent with optimizations"""
+    def evaluate_conversation(conversation, case_number, conversation_id=None, kind='practice', tier=None):
+        """Evaluate the conversation using the EvaluationAgent with optimizations.
+
+        With a `conversation_id`, verdicts established while the consultation was
+        in progress (see incremental_evaluation.py) are reused. Unless a `tier` is
+        imposed, the evaluation policy picks one for this `kind` of evaluation
+        ('practice' or 'competition'); an 'upgrade' runs at the full tier once the
+        policy allows it and raises EvaluationDeferred until then.
+        """
         try:
             # Load case data to get evaluation checklist
             case_data = load_patient_case(case_number)
@@ -693,9 +1200,40 @@ def create_app():
                     ]
                 }
             
-            # Full evaluation for normal conversations
+            # Full evaluation for normal conversations, at the tier the load allows
             try:
-                evaluation_results = evaluation_agent.evaluate_conversation(formatted_conversation, case_data)
+                if kind == 'upgrade':
+                    evaluation_policy.check_upgrade(case_data, formatted_conversation)
+                    tier = 'full'
+                decision = None
+                if tier is None:
+                    decision = evaluation_policy.choose(kind, case_data, formatted_conversation)
+                    tier = decision.tier
+
+                known_verdicts = None
+                if incremental_evaluator and conversation_id:
+                    known_verdicts = incremental_evaluator.verdicts_for(conversation_id, formatted_conversation, case_data)
+                    incremental_evaluator.discard(conversation_id)
+
+                if tier == 'single_prompt':
+                    # The legacy agent writes onto the checklist it is given and keeps per-call state
+                    legacy_case = {**case_data, 'evaluation_checklist': [dict(item) for item in case_data.get('evaluation_checklist', [])]}
+                    legacy_agent = EvaluationAgent(llm_client=client)
+                    evaluation_results = dict(legacy_agent.evaluate_conversation(formatted_conversation, legacy_case))
+                    evaluation_results.setdefault('recommendations', legacy_agent.get_recommendations())
+                else:
+                    evaluation_results = evaluation_agent.evaluate_conversation(
+                        formatted_conversation, case_data, known_verdicts=known_verdicts,
+                        strategy=None if tier == 'full' else tier
+                    )
+
+                evaluation_results = {**evaluation_results, 'evaluation_tier': tier}
+                if tier != 'full':
+                    evaluation_results['degraded'] = True
+                    if decision is not None:
+                        evaluation_results['degraded_reason'] = decision.reason
+            except EvaluationDeferred:
+                raise
             except Exception as e:
                 logger.error(f"Error in evaluation agent: {str(e)}")
                 # Return a basic evaluation on error
@@ -709,7 +1247,8 @@ def create_app():
                     'points_total': sum(item.get('points', 1) for item in checklist),
                     'points_earned': 0,
                     'percentage': 0,
-                    'recommendations': ["Veuillez réessayer ou contacter le support."]
+                    'recommendations': ["Veuillez réessayer ou contacter le support."],
+                    'evaluation_failed': True
                 }
             
             # Log completion time
@@ -722,6 +1261,8 @@ def create_app():
             
             return evaluation_results
                     
+        except EvaluationDeferred:
+            raise
         except Exception as e:
             logger.error(f"Error evaluating conversation: {str(e)}", exc_info=True)
             return {
@@ -730,7 +1271,8 @@ def create_app():
                 'points_total': 0,
                 'points_earned': 0,
                 'percentage': 0,
-                'recommendations': []
+                'recommendations': [],
+                'evaluation_failed': True
             }
 
     # Store functions in app config
@@ -740,6 +1282,46 @@ def create_app():
     app.config['INITIALIZE_CONVERSATION'] = initialize_conversation
     app.config['EVALUATE_CONVERSATION'] = evaluate_conversation
 
+    # Bulk re-scoring of stored transcripts (admin interface and rescore.py)
+    app.config['RESCORE_RUNNER'] = RescoreRunner(
+        app, evaluate_conversation, llm_client=client,
+        workers=EVALUATION_CONFIG['rescore_workers'],
+        batch_size=EVALUATION_CONFIG['rescore_batch_size'],
+        headroom_tokens=EVALUATION_CONFIG['rescore_headroom_tokens'],
+        stale_after_seconds=EVALUATION_CONFIG['rescore_stale_seconds']
+    )
+
+    # Evaluations run in the background; requests only enqueue a job
+    evaluation_jobs = EvaluationJobQueue(
+        app, evaluate_conversation,
+        max_workers=EVALUATION_CONFIG['job_workers'],
+        max_attempts=EVALUATION_CONFIG['job_max_attempts'],
+        backoff_seconds=EVALUATION_CONFIG['job_retry_backoff_seconds'],
+        lease_seconds=EVALUATION_CONFIG['job_lease_seconds'],
+        upgrade_delay_seconds=EVALUATION_CONFIG['policy_upgrade_delay_seconds']
+    )
+    app.config['EVALUATION_JOBS'] = evaluation_jobs
+
+    # Picks a cheaper evaluation tier when the queue is deep or the model budget is low
+    evaluation_policy = EvaluationPolicy(client, evaluation_jobs.depth, settings=EVALUATION_CONFIG)
+    app.config['EVALUATION_POLICY'] = evaluation_policy
+
+    # Keeps a partial evaluation of each in-progress consultation up to date,
+    # within what the evaluation policy allows
+    incremental_evaluator = None
+    if EVALUATION_CONFIG['incremental_evaluation']:
+        incremental_evaluator = IncrementalEvaluator(
+            app, evaluation_agent, load_patient_case,
+            policy=evaluation_policy,
+            max_workers=EVALUATION_CONFIG['incremental_workers'],
+            max_conversations=EVALUATION_CONFIG['incremental_max_conversations'],
+            ttl_seconds=EVALUATION_CONFIG['incremental_ttl_seconds'],
+            final_wait_seconds=EVALUATION_CONFIG['incremental_final_wait_seconds']
+        )
+    app.config['INCREMENTAL_EVALUATOR'] = incremental_evaluator
+
+    evaluation_jobs.recover()
+
     # Routes
     @app.route('/')
     def index():
@@ -760,33 +1342,17 @@ def create_app():
             case_data = load_patient_case(case_number)
             
             # Initialize conversation
-            conversation = initialize_conversation(case_number)
+            conversation = to_message_dicts(initialize_conversation(case_number))
             
-            # IMPORTANT: Store conversation as a list of dictionaries
-            # Convert LangChain messages to dict format for session storage
-            conversation_dicts = []
-            for msg in conversation:
-                if hasattr(msg, 'content') and hasattr(msg, 'type'):
-                    # LangChain message object
-                    if msg.type == 'system':
-                        conversation_dicts.append({'role': 'system', 'content': msg.content})
-                    elif msg.type == 'human':
-                        conversation_dicts.append({'role': 'human', 'content': msg.content})
-                    elif msg.type == 'ai':
-                        conversation_dicts.append({'role': 'assistant', 'content': msg.content})
-                elif isinstance(msg, dict):
-                    # Already in dict format
-                    conversation_dicts.append(msg)
-                else:
-                    # String or other format - convert to system message
-                    conversation_dicts.append({'role': 'system', 'content': str(msg)})
-            
-            # Store in session as list of dictionaries
-            session['current_conversation'] = conversation_dicts
+            # The messages go to the conversation store; the session only keeps its id
+            conversation_id = conversation_store.start(
+                case_number, conversation,
+                student_id=current_user.id if current_user.is_authenticated else None
+            )
             session['current_case'] = case_number
+            session['conversation_id'] = conversation_id
             
-            logger.info(f"Initialized conversation with {len(conversation_dicts)} messages")
-            logger.info(f"Sample conversation format: {conversation_dicts[0] if conversation_dicts else 'Empty'}")
+            logger.info(f"Initialized conversation {conversation_id} with {len(conversation)} messages")
             
             return jsonify({
                 'success': True,
@@ -801,6 +1367,22 @@ def create_app():
             return jsonify({'error': str(e)}), 500
 
 
+    def conversation_to_langchain(conversation):
+        """Convert a stored conversation's message dicts to LangChain messages, resolving the system prompt"""
+        langchain_messages = []
+        for msg in system_prompts.resolve(conversation):
+            if isinstance(msg, dict):
+                if msg['role'] == 'system':
+                    langchain_messages.append(SystemMessage(content=msg['content']))
+                elif msg['role'] == 'human':
+                    langchain_messages.append(HumanMessage(content=msg['content']))
+                elif msg['role'] == 'assistant':
+                    langchain_messages.append(AIMessage(content=msg['content']))
+            else:
+                logger.warning(f"Unexpected conversation format: {type(msg)} - {msg}")
+                langchain_messages.append(SystemMessage(content=str(msg)))
+        return langchain_messages
+
     @app.route('/chat', methods=['POST'])
     def chat():
         """Handle chat messages with enhanced patient simulation"""
@@ -811,12 +1393,13 @@ def create_app():
             if not message:
                 return jsonify({'error': 'Message is required'}), 400
             
-            # Get current conversation from session
-            conversation = session.get('current_conversation', [])
+            # Get current conversation from the store
+            conversation_id = session.get('conversation_id')
             case_number = session.get('current_case')
             
-            if not case_number:
+            if not case_number or not conversation_id:
                 return jsonify({'error': 'No active case session'}), 400
+            conversation = conversation_store.messages(conversation_id)
             
             logger.info(f"Processing message for case {case_number}: {message[:50]}...")
             
@@ -826,22 +1409,11 @@ def create_app():
             
             # Get AI response using the Groq client
             try:
-                # Convert conversation to LangChain format for AI processing
-                langchain_messages = []
-                for msg in conversation:
-                    if isinstance(msg, dict):
-                        if msg['role'] == 'system':
-                            langchain_messages.append(SystemMessage(content=msg['content']))
-                        elif msg['role'] == 'human':
-                            langchain_messages.append(HumanMessage(content=msg['content']))
-                        elif msg['role'] == 'assistant':
-                            langchain_messages.append(AIMessage(content=msg['content']))
-                    else:
-                        logger.warning(f"Unexpected conversation format: {type(msg)} - {msg}")
-                        langchain_messages.append(SystemMessage(content=str(msg)))
+                # Convert the recent turns and the summary of older ones to LangChain format
+                langchain_messages = conversation_to_langchain(context_policy.window(conversation_id, conversation))
                 
                 # Get response from Groq with enhanced parameters
-                response = client.invoke(langchain_messages)
+                response = client.invoke(langchain_messages, profile='chat')
                 ai_reply = response.content
                 
                 # Validate and enhance the response
@@ -851,8 +1423,12 @@ def create_app():
                 ai_message = {'role': 'assistant', 'content': ai_reply}
                 conversation.append(ai_message)
                 
-                # Update session
-                session['current_conversation'] = conversation
+                # Append the turn to the stored conversation
+                if not conversation_store.append(conversation_id, user_message, ai_message):
+                    return jsonify({'error': 'No active case session'}), 400
+                context_policy.observe(conversation_id, conversation)
+                if incremental_evaluator:
+                    incremental_evaluator.observe(conversation_id, case_number, conversation)
                 
                 logger.info(f"Generated patient response: {ai_reply[:50]}...")
                 
@@ -869,44 +1445,82 @@ def create_app():
             logger.error(f"Error in chat: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
-    def validate_patient_response(ai_reply, user_message):
-        """Validate and modify the AI response to ensure realistic patient simulation"""
+    @app.route('/chat/stream', methods=['POST'])
+    def chat_stream():
+        """Stream the patient's reply as Server-Sent Events.
 
-        # Phrases that break patient immersion
-        immersion_breaking = [
-            "en tant qu'ia", "je suis une intelligence artificielle",
-            "comme assistant", "en tant qu'assistant", "en tant que modèle",
-            "je ne suis pas un vrai patient", "je suis un simulateur",
-            "je suis programmé", "mon rôle est de", "dans le cadre de cet exercice",
-            "en tant que patient simulé"
-        ]
+        Events: 'token' (text to append), 'replace' (filtered reply replacing
+        everything shown so far), 'done' (final reply) and 'error'.
+        """
+        data = request.get_json(silent=True) or {}
+        message = data.get('message')
 
-        # Phrases where AI gives medical advice (patient should never do this)
-        medical_advice = [
-            "consultez un médecin", "je vous recommande de", "vous devriez",
-            "il serait préférable de", "je vous conseille", "il faut que vous",
-            "le traitement serait", "le diagnostic est", "vous avez probablement"
-        ]
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+
+        conversation_id = session.get('conversation_id')
+        case_number = session.get('current_case')
 
-        reply_lower = ai_reply.lower()
+        if not case_number or not conversation_id:
+            return jsonify({'error': 'No active case session'}), 400
 
-        for phrase in immersion_breaking:
-            if phrase in reply_lower:
-                logger.warning(f"AI broke immersion with: {phrase}")
-                return "Pardon docteur, je n'ai pas bien compris votre question."
+        logger.info(f"Streaming message for case {case_number}: {message[:50]}...")
 
-        for phrase in medical_advice:
-            if phrase in reply_lower:
-                logger.warning(f"AI gave medical advice: {phrase}")
-                return "Je ne sais pas trop, docteur. C'est vous le spécialiste."
+        conversation = conversation_store.messages(conversation_id)
+        user_message = {'role': 'human', 'content': message}
+        conversation.append(user_message)
+        langchain_messages = conversation_to_langchain(context_policy.window(conversation_id, conversation))
 
-        # Enforce brevity — max 3 sentences for patient realism
-        sentences = [s.strip() for s in ai_reply.split('.') if s.strip()]
-        if len(sentences) > 3:
-            ai_reply = '. '.join(sentences[:3]) + '.'
-            logger.info("Truncated long response for patient simulation")
+        def sse(event, payload):
+            return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
 
-        return ai_reply
+        def generate():
+            reply_filter = PatientReplyFilter()
+            try:
+                chunks = client.stream(langchain_messages, profile='chat')
+                try:
+                    for chunk in chunks:
+                        released = reply_filter.feed(chunk.content)
+                        if released:
+                            yield sse('token', {'text': released})
+                        if reply_filter.stopped:
+                            # Reply replaced whatever follows: stop generating
+                            break
+                finally:
+                    chunks.close()
+
+                released = reply_filter.finish()
+                if released:
+                    yield sse('token', {'text': released})
+                if reply_filter.reply != reply_filter.released_text:
+                    # Canned reply, or the sentence limit's normalised text
+                    yield sse('replace', {'text': reply_filter.reply})
+            except Exception as e:
+                logger.error(f"Error streaming AI response: {str(e)}")
+                yield sse('error', {'error': 'Error getting AI response'})
+                return
+
+            ai_reply = reply_filter.reply
+            ai_message = {'role': 'assistant', 'content': ai_reply}
+            conversation.append(ai_message)
+            # The session is unchanged: the turn goes to the conversation store
+            conversation_store.append(conversation_id, user_message, ai_message)
+            context_policy.observe(conversation_id, conversation)
+            if incremental_evaluator:
+                incremental_evaluator.observe(conversation_id, case_number, conversation)
+
+            logger.info(f"Streamed patient response: {ai_reply[:50]}...")
+            yield sse('done', {'reply': ai_reply})
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    def validate_patient_response(ai_reply, user_message):
+        """Validate and modify the AI response to ensure realistic patient simulation"""
+        return filter_patient_reply(ai_reply)
 
     @app.route('/end_chat', methods=['POST'])
     def end_chat():
@@ -916,63 +1530,40 @@ def create_app():
             time_elapsed_seconds = req_data.get('time_elapsed_seconds')
             consultation_duration = int(time_elapsed_seconds) if time_elapsed_seconds is not None else None
 
-            conversation = session.get('current_conversation', [])
+            conversation_id = session.get('conversation_id')
             case_number = session.get('current_case')
             
             if not case_number:
                 logger.error("No case number found in session")
                 return jsonify({'error': 'No active case session'}), 400
             
-            if not conversation:
+            # The job references the stored transcript instead of carrying a copy
+            conversation = None
+            stored = conversation_store.get(conversation_id)
+            if stored is None or not stored.message_count:
                 logger.warning("Empty conversation found")
-                conversation = [{'role': 'system', 'content': 'No conversation recorded'}]
+                conversation, conversation_id = [{'role': 'system', 'content': 'No conversation recorded'}], None
+            else:
+                conversation_store.end(conversation_id)
             
-            evaluation_results = evaluate_conversation(conversation, case_number)
-
-            pdf_url = None
-            performance_id = None
-
-            # Save performance first (if authenticated) so we can build a stable PDF URL
-            if current_user.is_authenticated:
-                try:
-                    performance = StudentPerformance(
-                        student_id=current_user.id,
-                        case_number=case_number,
-                        conversation_transcript=conversation,
-                        evaluation_results=evaluation_results,
-                        percentage_score=evaluation_results.get('percentage', 0),
-                        points_earned=evaluation_results.get('points_earned', 0),
-                        points_total=evaluation_results.get('points_total', 0),
-                        recommendations=evaluation_results.get('recommendations', []),
-                        consultation_duration=consultation_duration
-                    )
-                    db.session.add(performance)
-                    db.session.commit()
-                    performance_id = performance.id
-                    pdf_url = f'/student/download_report/{performance_id}'
-                    logger.info(f"Saved performance {performance_id} for student {current_user.id}")
-                except Exception as e:
-                    logger.error(f"Error saving performance: {str(e)}")
-
-            # Build a clean transcript (exclude system messages) to return to the client
-            transcript_for_client = [
-                {'role': m.get('role'), 'content': m.get('content', '')}
-                for m in conversation
-                if isinstance(m, dict) and m.get('role') in ('human', 'assistant')
-            ]
+            # Evaluate in the background; the client long-polls /evaluation/<job_id>
+            job_id = evaluation_jobs.enqueue(
+                'practice', case_number, conversation,
+                student_id=current_user.id if current_user.is_authenticated else None,
+                payload={'consultation_duration': consultation_duration},
+                conversation_id=conversation_id
+            )
 
             # Clear session
-            session.pop('current_conversation', None)
             session.pop('current_case', None)
+            session.pop('conversation_id', None)
 
             return jsonify({
                 'success': True,
-                'evaluation': evaluation_results,
-                'recommendations': evaluation_results.get('recommendations', []),
-                'conversation': transcript_for_client,
-                'pdf_url': pdf_url,
-                'pdf_available': pdf_url is not None
-            })
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/evaluation/{job_id}'
+            }), 202
             
         except Exception as e:
             logger.error(f"Error in end_chat: {e}", exc_info=True)
@@ -980,6 +1571,52 @@ def create_app():
 
 
 
+    def client_transcript(conversation):
+        """Clean transcript for the client (system messages excluded)"""
+        return [
+            {'role': m.get('role'), 'content': m.get('content', '')}
+            for m in conversation
+            if isinstance(m, dict) and m.get('role') in ('human', 'assistant')
+        ]
+
+    @app.route('/evaluation/<job_id>')
+    def evaluation_status(job_id):
+        """Long-poll the result of an evaluation job (?wait=<seconds>, max 55)"""
+        try:
+            wait = min(max(request.args.get('wait', 25, type=float), 0), 55)
+            job = db.session.get(EvaluationJob, job_id)
+            if job is None:
+                return jsonify({'error': 'Évaluation introuvable'}), 404
+
+            if job.student_id is not None and (
+                not current_user.is_authenticated or current_user.id != job.student_id
+            ):
+                return jsonify({'error': 'Accès non autorisé'}), 403
+
+            if not job.is_finished and wait > 0:
+                job = evaluation_jobs.wait(job_id, wait)
+
+            response = job.to_dict()
+            if job.status == 'completed':
+                results = job.result
+                pdf_url = f'/student/download_report/{job.performance_id}' if job.performance_id else None
+                response.update({
+                    'success': True,
+                    'evaluation': results,
+                    'recommendations': results.get('recommendations', []),
+                    'conversation': client_transcript(job.conversation),
+                    'pdf_url': pdf_url,
+                    'pdf_available': pdf_url is not None
+                })
+            elif job.status == 'failed':
+                response['error'] = "L'évaluation a échoué. Veuillez réessayer plus tard."
+
+            return jsonify(response)
+
+        except Exception as e:
+            logger.error(f"Error fetching evaluation job {job_id}: {e}", exc_info=True)
+            return jsonify({'error': str(e)}), 500
+
     @app.route('/download_pdf/<filename>')
     def download_pdf(filename):
         """Download generated PDF"""
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Stress check: one EnhancedEvaluationAgent shared by many threads.
+
+Every recorded consultation of benchmarks/corpus.json is first graded
+alone, on its own agent. Then --evaluations gradings of the same
+recordings, interleaved, run on --threads threads that share one agent,
+one FallbackGroqClient and the corpus's case dicts. The LLM is the
+deterministic fake of benchmarks/fake_llm.py, so each grading must give
+exactly the verdicts of the reference run.
+
+It fails (exit status 1) when
+    a result's verdicts or percentage differ from its reference,
+    get_results() on the calling thread is not that thread's last result,
+    a case dict, its checklist or a transcript was modified.
+
+tests/test_concurrent_evaluation.py runs a smaller configuration of the
+same check with the test suite.
+
+Usage:
+    python benchmarks/concurrent_evaluation.py
+    python benchmarks/concurrent_evaluation.py --evaluations 500 --threads 32 --strategy batched
+"""
+
+import os
+import sys
+import copy
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from app import FallbackGroqClient, LLAMA_MODELS
+from enhanced_evaluation_agent import EnhancedEvaluationAgent
+from evaluation_cache import EvaluationCache
+from evaluation_benchmark import load_corpus
+from fake_llm import FakeGroqService
+
+
+def make_agent(service, strategy=None):
+    client = FallbackGroqClient(
+        api_key=None,
+        http_client=None,
+        models=LLAMA_MODELS['chain'],
+        config=LLAMA_MODELS['config'],
+        breaker_config=LLAMA_MODELS['circuit_breaker'],
+        client_factory=service.client,
+    )
+    settings = {'cache_enabled': False}
+    if strategy:
+        settings['evaluation_strategy'] = strategy
+    return EnhancedEvaluationAgent(client, settings=settings, cache=EvaluationCache())
+
+
+def verdicts(results):
+    """What must not depend on concurrency: the percentage and each criterion's verdict"""
+    return (
+        results.get('percentage'),
+        [(item.get('description'), item.get('completed'), item.get('partial')) for item in results.get('checklist', [])],
+    )
+
+
+def stress(recordings, evaluations, threads, strategy=None, latency=0.005, jitter=0.01):
+    """Grade `recordings` alone, then concurrently on one shared agent; returns the problems found"""
+    snapshot = copy.deepcopy(recordings)
+
+    expected = []
+    for case_data, _, conversation in recordings:
+        agent = make_agent(FakeGroqService(latency_seconds=0), strategy)
+        expected.append(verdicts(agent.evaluate_conversation(conversation, case_data)))
+
+    agent = make_agent(FakeGroqService(latency_seconds=latency, jitter_seconds=jitter), strategy)
+
+    def grade(number):
+        index = number % len(recordings)
+        case_data, _, conversation = recordings[index]
+        results = agent.evaluate_conversation(conversation, case_data)
+        return index, results, agent.get_results() is results
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        outcomes = list(executor.map(grade, range(evaluations)))
+
+    failures = []
+    for number, (index, results, own_results) in enumerate(outcomes):
+        label = recordings[index][1]
+        if verdicts(results) != expected[index]:
+            failures.append(f"grading {number} ({label}): verdicts differ from the reference")
+        if not own_results:
+            failures.append(f"grading {number} ({label}): get_results() returned another evaluation")
+    if recordings != snapshot:
+        failures.append("a case dict, checklist or transcript was modified by the evaluations")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.path.join(BENCHMARK_DIR, 'corpus.json'), help='Recorded transcripts and checklists')
+    parser.add_argument('--evaluations', type=int, default=200, help='Concurrent gradings')
+    parser.add_argument('--threads', type=int, default=16, help='Threads sharing the agent')
+    parser.add_argument('--strategy', choices=('concurrent', 'sequential', 'batched'), help="Override the agent's evaluation_strategy")
+    parser.add_argument('--latency', type=float, default=0.005, help='Fake LLM seconds per call')
+    parser.add_argument('--jitter', type=float, default=0.01, help='Fake LLM random extra seconds per call (at most)')
+    parser.add_argument('--verbose', action='store_true', help="Keep the agent's logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    recordings = load_corpus(args.corpus)
+    if not recordings:
+        print("No transcripts in the corpus.")
+        return False
+
+    print(f"🧪 Reference grading of {len(recordings)} transcripts, then {args.evaluations} gradings "
+          f"on {args.threads} threads sharing one agent...")
+    failures = stress(recordings, args.evaluations, args.threads, args.strategy, args.latency, args.jitter)
+
+    if failures:
+        print(f"❌ {len(failures)} problem(s):")
+        for failure in failures[:20]:
+            print(f"  {failure}")
+        return False
+
+    print(f"✅ {args.evaluations} gradings matched their reference, inputs unchanged")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
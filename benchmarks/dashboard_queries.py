@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Query-count check of the dashboard endpoints.
+
+The admin, teacher and student dashboards read their per-case and
+per-student totals from a fixed number of queries (see reporting.py and
+rollups.py), not one or two per listed row. This script seeds a throwaway
+SQLite database twice, the second time --scale times larger, and counts
+the SQL statements each endpoint runs (a before_cursor_execute listener)
+on both. It needs no Groq key and no network: the app runs on the fake
+LLM of benchmarks/fake_llm.py.
+
+It exits with status 1 when an endpoint fails or runs more statements on
+the larger database, i.e. when a per-row query creeps back in.
+
+tests/test_dashboard_queries.py runs the same check with the test suite.
+
+Usage:
+    python benchmarks/dashboard_queries.py
+    python benchmarks/dashboard_queries.py --students 20 --cases 10 --performances 150 --scale 4
+"""
+
+import os
+import sys
+import random
+import logging
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from sqlalchemy import event
+
+import app as ecos
+from app import FallbackGroqClient, LLAMA_MODELS
+from models import db, Student, PatientCase, StudentPerformance
+from fake_llm import FakeGroqService
+
+ADMIN = {'user_type': 'admin', 'admin_authenticated': True}
+TEACHER = {'user_type': 'teacher', 'teacher_authenticated': True}
+
+# (name, url, session); the student session is filled in once seeded
+ENDPOINTS = (
+    ('admin_stations', '/admin/stations', ADMIN),
+    ('admin_students', '/admin/students', ADMIN),
+    ('teacher_stations', '/teacher/stations', TEACHER),
+    ('teacher_students_performance', '/teacher/students/performance', TEACHER),
+    ('student_stations', '/student/stations', None),
+)
+
+BASE_URL = 'http://localhost/ecos'
+
+
+def fake_groq_client(api_key, http_client, cache=None):
+    """create_groq_client() on the offline fake service"""
+    service = FakeGroqService(latency_seconds=0)
+    client = FallbackGroqClient(
+        api_key=None,
+        http_client=None,
+        models=LLAMA_MODELS['chain'],
+        config=LLAMA_MODELS['config'],
+        breaker_config=LLAMA_MODELS['circuit_breaker'],
+        client_factory=service.client,
+        profiles=LLAMA_MODELS['profiles'],
+    )
+    return client, client.active_model
+
+
+def seed(students, cases, performances, seed_value):
+    """Students, cases and scored performances; returns a student id with attempts"""
+    rnd = random.Random(seed_value)
+    case_rows = [
+        PatientCase(case_number=f'Q{i:04d}', specialty=rnd.choice(['Cardiologie', 'Pneumologie', 'Pédiatrie']),
+                    consultation_time=10, diagnosis='Diagnostic simulé')
+        for i in range(cases)
+    ]
+    student_rows = [Student(student_code=f'{200000 + i}', name=f'Étudiant {i}') for i in range(students)]
+    db.session.add_all(case_rows + student_rows)
+    db.session.commit()
+
+    start = datetime(2026, 1, 1)
+    for n in range(performances):
+        score = rnd.uniform(20, 100)
+        performance = StudentPerformance(
+            student_id=student_rows[n % students].id,
+            case_number=rnd.choice(case_rows).case_number,
+            percentage_score=score, points_earned=int(score / 5), points_total=20,
+            completed_at=start + timedelta(hours=n),
+        )
+        performance.evaluation_results = {'percentage': score, 'checklist': [
+            {'description': 'Critère', 'category': 'Anamnèse', 'completed': rnd.random() < 0.6}
+        ]}
+        db.session.add(performance)
+    db.session.commit()
+    return student_rows[0].id
+
+
+def count_statements(students, cases, performances, seed_value=42):
+    """{endpoint: (HTTP status, SQL statements)} on a freshly seeded database"""
+    with tempfile.TemporaryDirectory() as directory:
+        app = ecos.create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'dashboards.db')}",
+            'SESSION_FILE_DIR': os.path.join(directory, 'sessions'),
+        })
+        statements = [0]
+        with app.app_context():
+            student_id = seed(students, cases, performances, seed_value)
+
+            def counter(*_):
+                statements[0] += 1
+            event.listen(db.engine, 'before_cursor_execute', counter)
+
+        client = app.test_client()
+        counts = {}
+        for name, url, session_data in ENDPOINTS:
+            session_data = session_data or {'user_type': 'student', '_user_id': f'student_{student_id}'}
+            with client.session_transaction(base_url=BASE_URL) as session:
+                session.clear()
+                session.update(session_data)
+            statements[0] = 0
+            response = client.get(url, base_url=BASE_URL, headers={'X-Requested-With': 'XMLHttpRequest'})
+            counts[name] = (response.status_code, statements[0])
+
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', counter)
+            app.config['EVALUATION_JOBS']._executor.shutdown(wait=True)
+            db.session.remove()
+            db.engine.dispose()
+        return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=10, help='Seeded students (small database)')
+    parser.add_argument('--cases', type=int, default=6, help='Seeded cases (small database)')
+    parser.add_argument('--performances', type=int, default=60, help='Seeded performances (small database)')
+    parser.add_argument('--scale', type=int, default=5, help='Size of the large database relative to the small one')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help="Keep the app's logging")
+    args = parser.parse_args()
+
+    os.environ.setdefault('GROQ_API_KEY', 'offline')
+    ecos.create_groq_client = fake_groq_client
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    print(f"🌱 Small database: {args.students} students, {args.cases} cases, {args.performances} performances")
+    small = count_statements(args.students, args.cases, args.performances, args.seed)
+    print(f"🌱 Large database: x{args.scale}")
+    large = count_statements(args.students * args.scale, args.cases * args.scale,
+                             args.performances * args.scale, args.seed)
+
+    print()
+    print(f"{'endpoint':<30} {'small':>6} {'large':>6}")
+    failures = []
+    for name, _, _ in ENDPOINTS:
+        (small_status, small_count), (large_status, large_count) = small[name], large[name]
+        print(f"{name:<30} {small_count:>6} {large_count:>6}")
+        if small_status != 200 or large_status != 200:
+            failures.append(f"{name}: HTTP {small_status}/{large_status}")
+        elif large_count > small_count:
+            failures.append(f"{name}: {small_count} → {large_count} statements, grows with the number of rows")
+
+    print()
+    if failures:
+        print(f"❌ {len(failures)} problem(s):")
+        for failure in failures:
+            print(f"  {failure}")
+        return False
+    print("✅ Statement counts do not depend on the number of rows")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Memory and latency of the list queries with and without deferred blobs.
+
+Seeds a throwaway SQLite database (no Groq key, no network) with cases
+and performances whose evaluation, recommendations and transcript blobs
+have realistic sizes. Then runs the list views' queries twice:
+
+    eager     - every column loaded, as before the loading policy
+    policy    - StudentPerformance.list_query() / PatientCase.list_query()
+
+For each query it reports the column bytes loaded per row, the median
+latency and the peak Python memory (tracemalloc) of materialising the
+ORM objects.
+
+Usage:
+    python benchmarks/deferred_loading.py
+    python benchmarks/deferred_loading.py --performances 10000 --cases 300 --repeat 7
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from models import db, Student, PatientCase, StudentPerformance
+
+
+def create_benchmark_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(args):
+    rnd = random.Random(args.seed)
+    categories = ['Anamnèse', 'Examen clinique', 'Communication', 'Diagnostic', 'Prise en charge']
+    cases = []
+    for i in range(args.cases):
+        checklist = [{'description': f"Critère {j} " + 'x' * 80, 'points': 1,
+                      'category': categories[j % len(categories)], 'completed': False} for j in range(20)]
+        cases.append(PatientCase(
+            case_number=f'B{i:04d}',
+            specialty=rnd.choice(['Cardiologie', 'Pneumologie', 'Neurologie', 'Pédiatrie']),
+            patient_info_json=json.dumps({'age': rnd.randint(18, 90), 'gender': rnd.choice(['Homme', 'Femme']),
+                                          'history': 'y' * 400}, ensure_ascii=False),
+            symptoms_json=json.dumps([f"Symptôme {j}: douleur thoracique irradiant" for j in range(8)], ensure_ascii=False),
+            evaluation_checklist_json=json.dumps(checklist, ensure_ascii=False),
+            diagnosis='Syndrome coronarien aigu',
+            differential_diagnosis_json=json.dumps(['Péricardite', 'Dissection aortique', 'Embolie pulmonaire']),
+            directives='z' * 600,
+            lab_results='w' * 1500,
+            additional_notes='v' * 800,
+        ))
+    students = [Student(student_code=f'{100000 + i}', name=f'Étudiant {i}') for i in range(args.students)]
+    db.session.add_all(cases + students)
+    db.session.commit()
+
+    start = datetime(2026, 1, 1)
+    for n in range(args.performances):
+        case = rnd.choice(cases)
+        checklist = [{**item, 'completed': rnd.random() < 0.6, 'justification': 'Le médecin a demandé ' + 'u' * 60}
+                     for item in json.loads(case.evaluation_checklist_json)]
+        transcript = []
+        for turn in range(rnd.randint(15, 40)):
+            transcript.append({'role': 'human', 'content': 'Question du médecin ' + 'q' * rnd.randint(40, 120)})
+            transcript.append({'role': 'assistant', 'content': 'Réponse du patient ' + 'r' * rnd.randint(60, 200)})
+        score = rnd.uniform(20, 100)
+        db.session.add(StudentPerformance(
+            student_id=rnd.choice(students).id,
+            case_number=case.case_number,
+            points_earned=int(score / 5), points_total=20, percentage_score=score,
+            consultation_duration=rnd.randint(300, 900),
+            evaluation_results_json=json.dumps({'checklist': checklist, 'percentage': score, 'feedback': 'f' * 400},
+                                               ensure_ascii=False),
+            recommendations_json=json.dumps(['Recommandation ' + 'p' * 150 for _ in range(4)], ensure_ascii=False),
+            conversation_transcript_json=json.dumps(transcript, ensure_ascii=False),
+            completed_at=start + timedelta(minutes=n),
+        ))
+        if n % 1000 == 999:
+            db.session.commit()
+    db.session.commit()
+
+
+def row_bytes(query):
+    """Average size of the column values loaded per object"""
+    db.session.expunge_all()
+    objects = query.all()
+    total = sum(len(str(value).encode('utf-8'))
+                for obj in objects for key, value in vars(obj).items()
+                if not key.startswith('_') and value is not None)
+    return total / len(objects) if objects else 0
+
+
+def measure(build, repeat):
+    """Median latency (ms) and peak traced memory (KiB) of materialising build().all()"""
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.perf_counter()
+        build().all()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    objects = build().all()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return statistics.median(timings), peak / 1024
+
+
+def everything(model):
+    return model.query.options(db.undefer('*'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--performances', type=int, default=5000, help='Seeded performances')
+    parser.add_argument('--cases', type=int, default=200, help='Seeded cases')
+    parser.add_argument('--students', type=int, default=100, help='Seeded students')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_benchmark_app(os.path.join(directory, 'benchmark.db'))
+        with app.app_context():
+            db.create_all()
+            print(f"🌱 Seeding {args.cases} cases and {args.performances} performances...")
+            seed(args)
+
+            student_id = db.session.query(StudentPerformance.student_id).first()[0]
+            ordered = StudentPerformance.completed_at.desc()
+            queries = {
+                'All performances': (
+                    lambda: everything(StudentPerformance).order_by(ordered),
+                    lambda: StudentPerformance.list_query().order_by(ordered),
+                ),
+                "One student's performances": (
+                    lambda: everything(StudentPerformance).filter_by(student_id=student_id).order_by(ordered),
+                    lambda: StudentPerformance.list_query().filter_by(student_id=student_id).order_by(ordered),
+                ),
+                'Case list': (
+                    lambda: everything(PatientCase).order_by(PatientCase.case_number),
+                    lambda: PatientCase.list_query().order_by(PatientCase.case_number),
+                ),
+            }
+
+            print()
+            print("📊 Eager loading vs. loading policy")
+            for name, (eager, policy) in queries.items():
+                eager_bytes, policy_bytes = row_bytes(eager()), row_bytes(policy())
+                eager_ms, eager_kib = measure(eager, args.repeat)
+                policy_ms, policy_kib = measure(policy, args.repeat)
+                print(f"  {name} ({eager().count()} rows)")
+                print(f"    Bytes per row:   {eager_bytes:10.0f} → {policy_bytes:8.0f} "
+                      f"({1 - policy_bytes / eager_bytes:.1%} less)")
+                print(f"    Median latency:  {eager_ms:8.1f} ms → {policy_ms:6.1f} ms")
+                print(f"    Peak memory:     {eager_kib:8.0f} KiB → {policy_kib:6.0f} KiB")
+            db.session.remove()
+            db.engine.dispose()
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Offline evaluation benchmark: no network, no database, no Groq key.
+
+Runs the recorded consultations of benchmarks/corpus.json through
+    enhanced  - EnhancedEvaluationAgent.evaluate_conversation
+    legacy    - EvaluationAgent.evaluate_conversation
+    patterns  - the keyword-pattern fallback (EnhancedEvaluationAgent without an LLM)
+at several concurrency levels. The LLM is the deterministic fake of
+benchmarks/fake_llm.py behind a real FallbackGroqClient.
+
+For each target and concurrency level it reports p50/p95 latency,
+evaluations/sec, and LLM calls, prompt tokens and completion tokens per
+evaluation. The JSON report (--output) can be committed. --baseline compares
+a run with a previous report and exits with status 1 when LLM calls or
+prompt tokens per evaluation grow by more than --max-regression. These
+counts are deterministic when no errors are injected. Latencies depend on
+the machine and are only reported.
+
+Usage:
+    python benchmarks/evaluation_benchmark.py
+    python benchmarks/evaluation_benchmark.py --concurrency 1 4 8 --repeat 10
+    python benchmarks/evaluation_benchmark.py --error-rate 0.05 --jitter 0.02
+    python benchmarks/evaluation_benchmark.py --output benchmarks/evaluation_baseline.json
+    python benchmarks/evaluation_benchmark.py --baseline benchmarks/evaluation_baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from app import FallbackGroqClient, LLAMA_MODELS
+from enhanced_evaluation_agent import EnhancedEvaluationAgent, has_assessment_errors
+from evaluation_agent import EvaluationAgent
+from evaluation_cache import EvaluationCache
+from fake_llm import FakeGroqService
+
+TARGETS = ('enhanced', 'legacy', 'patterns')
+
+# Counters that do not depend on timing, checked against the baseline
+DETERMINISTIC_METRICS = ('llm_calls_per_eval', 'prompt_tokens_per_eval')
+
+
+def load_corpus(path):
+    """(case_data, label, conversation) for every recorded transcript"""
+    with open(path, encoding='utf-8') as f:
+        corpus = json.load(f)
+    recordings = []
+    for case in corpus['cases']:
+        case_data = {k: v for k, v in case.items() if k != 'transcripts'}
+        for transcript in case['transcripts']:
+            recordings.append((case_data, transcript['label'], transcript['conversation']))
+    return recordings
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    rank = max(1, int(round(fraction * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def make_client(service, args):
+    # No rate limits (the fake never throttles) and a short cooldown so injected errors do not starve the chain
+    return FallbackGroqClient(
+        api_key=None,
+        http_client=None,
+        models=LLAMA_MODELS['chain'],
+        config=LLAMA_MODELS['config'],
+        breaker_config={**LLAMA_MODELS['circuit_breaker'], 'cooldown_seconds': args.breaker_cooldown},
+        client_factory=service.client,
+    )
+
+
+def make_evaluate(target, client, args):
+    """Function evaluating one (conversation, case_data) with a cold cache"""
+    if target == 'legacy':
+        # EvaluationAgent keeps its state on the instance: one per evaluation, private cache
+        return lambda conversation, case_data: EvaluationAgent(client, cache=EvaluationCache()).evaluate_conversation(
+            conversation, case_data
+        )
+
+    settings = {'cache_enabled': False}
+    if args.strategy:
+        settings['evaluation_strategy'] = args.strategy
+    agent = EnhancedEvaluationAgent(client if target == 'enhanced' else None, settings=settings, cache=EvaluationCache())
+    return agent.evaluate_conversation
+
+
+def run_level(target, concurrency, recordings, args):
+    service = FakeGroqService(
+        latency_seconds=args.latency,
+        seconds_per_1k_tokens=args.latency_per_1k_tokens,
+        jitter_seconds=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    evaluate = make_evaluate(target, make_client(service, args), args)
+    work = [(case_data, conversation) for _ in range(args.repeat) for case_data, _, conversation in recordings]
+
+    def timed(item):
+        case_data, conversation = item
+        started = time.perf_counter()
+        results = evaluate(conversation, case_data)
+        return time.perf_counter() - started, results
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(timed, work))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in outcomes]
+    failed = sum(
+        1 for _, results in outcomes
+        if results.get('evaluation_failed') or has_assessment_errors(results)
+    )
+    usage = service.snapshot()
+    count = len(outcomes)
+    return {
+        'target': target,
+        'concurrency': concurrency,
+        'evaluations': count,
+        'failed_evaluations': failed,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95': round(percentile(latencies, 0.95) * 1000, 1),
+            'mean': round(sum(latencies) / count * 1000, 1),
+            'max': round(max(latencies) * 1000, 1),
+        },
+        'evals_per_sec': round(count / elapsed, 2) if elapsed else 0.0,
+        'llm_calls_per_eval': round(usage['calls'] / count, 2),
+        'llm_errors_per_eval': round(usage['errors'] / count, 2),
+        'prompt_tokens_per_eval': round(usage['prompt_tokens'] / count, 1),
+        'completion_tokens_per_eval': round(usage['completion_tokens'] / count, 1),
+        'mean_percentage': round(sum(r.get('percentage', 0) for _, r in outcomes) / count, 1),
+    }
+
+
+def print_table(report):
+    print()
+    print(f"{'target':<10} {'conc':>4} {'p50 ms':>8} {'p95 ms':>8} {'evals/s':>8} "
+          f"{'calls/eval':>10} {'prompt tok/eval':>15} {'score %':>8} {'failed':>6}")
+    for row in report['results']:
+        print(f"{row['target']:<10} {row['concurrency']:>4} {row['latency_ms']['p50']:>8} "
+              f"{row['latency_ms']['p95']:>8} {row['evals_per_sec']:>8} {row['llm_calls_per_eval']:>10} "
+              f"{row['prompt_tokens_per_eval']:>15} {row['mean_percentage']:>8} {row['failed_evaluations']:>6}")
+
+
+def compare_with_baseline(report, baseline_path, max_regression):
+    """Print the changes against a previous report; False if a deterministic metric regressed"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(row['target'], row['concurrency']): row for row in baseline.get('results', [])}
+
+    ok = True
+    print()
+    print(f"📊 Compared with {baseline_path}")
+    for setting in ('fake_llm', 'strategy', 'corpus'):
+        if baseline.get(setting) != report[setting]:
+            print(f"  ⚠️  {setting} differs from the baseline: {baseline.get(setting)} → {report[setting]}")
+    for row in report['results']:
+        old = previous.get((row['target'], row['concurrency']))
+        if old is None:
+            continue
+        changes = []
+        regressed = False
+        for metric in DETERMINISTIC_METRICS:
+            before, after = old[metric], row[metric]
+            if before == after:
+                continue
+            changes.append(f"{metric} {before} → {after}")
+            regressed |= after > before * (1 + max_regression)
+        before, after = old['latency_ms']['p95'], row['latency_ms']['p95']
+        if before:
+            changes.append(f"p95 {after / before - 1:+.0%}")
+        ok &= not regressed
+        print(f"  {'❌' if regressed else '✅'} {row['target']} x{row['concurrency']}: {', '.join(changes)}")
+    if not ok:
+        print(f"❌ LLM calls or prompt tokens per evaluation grew by more than {max_regression:.0%}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.path.join(BENCHMARK_DIR, 'corpus.json'), help='Recorded transcripts and checklists')
+    parser.add_argument('--targets', nargs='+', choices=TARGETS, default=list(TARGETS))
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 8], help='Concurrent evaluations')
+    parser.add_argument('--repeat', type=int, default=5, help='Passes over the corpus per level')
+    parser.add_argument('--strategy', choices=('concurrent', 'sequential', 'batched'), help="Override the enhanced agent's evaluation_strategy")
+    parser.add_argument('--latency', type=float, default=0.05, help='Fake LLM seconds per call')
+    parser.add_argument('--latency-per-1k-tokens', type=float, default=0.02, help='Fake LLM extra seconds per 1000 prompt tokens')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Fake LLM random extra seconds per call (at most)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of fake LLM calls failing with a 429')
+    parser.add_argument('--breaker-cooldown', type=float, default=1.0, help='Circuit breaker cooldown seconds')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report here')
+    parser.add_argument('--baseline', help='Previous JSON report to compare with')
+    parser.add_argument('--max-regression', type=float, default=0.05, help='Allowed growth of calls/tokens per evaluation')
+    parser.add_argument('--verbose', action='store_true', help='Keep the agents\' logging')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    recordings = load_corpus(args.corpus)
+    if not recordings:
+        print("No transcripts in the corpus.")
+        return False
+    print(f"🧪 {len(recordings)} transcripts x {args.repeat} per level, fake LLM {args.latency * 1000:.0f} ms/call, "
+          f"{args.error_rate:.0%} errors")
+
+    results = []
+    for target in args.targets:
+        for concurrency in args.concurrency:
+            row = run_level(target, concurrency, recordings, args)
+            print(f"  {target} x{concurrency}: p95 {row['latency_ms']['p95']} ms, {row['evals_per_sec']} evals/s")
+            results.append(row)
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'corpus': os.path.basename(args.corpus),
+        'transcripts': len(recordings),
+        'repeat': args.repeat,
+        'strategy': args.strategy,
+        'fake_llm': FakeGroqService(
+            latency_seconds=args.latency,
+            seconds_per_1k_tokens=args.latency_per_1k_tokens,
+            jitter_seconds=args.jitter,
+            error_rate=args.error_rate,
+        ).profile(),
+        'results': results,
+    }
+    print_table(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"\n✅ Report written to {args.output}")
+
+    if args.baseline:
+        return compare_with_baseline(report, args.baseline, args.max_regression)
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,181 @@
+"""
+Deterministic stand-in for the Groq chat models, for offline benchmarks.
+
+FakeGroqService plays the Groq API: service.client(model) returns a LangChain
+chat model for one model of the chain. It plugs into FallbackGroqClient as
+its client_factory, so fallback, circuit breakers, rate limiting and usage
+reconciliation all run exactly as in production.
+
+Answers depend only on the prompt. A criterion is judged OUI when at least
+half of its description stems occur in the transcript of the prompt,
+PARTIELLEMENT when some do and NON otherwise. Sliced and full transcripts
+can therefore grade differently, as with the real model. Single-criterion,
+batched and legacy JSON prompts are all understood.
+
+Latency is `latency_seconds` plus `seconds_per_1k_tokens` per thousand prompt
+tokens plus up to `jitter_seconds`. With probability `error_rate` a call
+raises a 429, which FallbackGroqClient treats as a fallback-class error. The
+jitter and errors come from a seeded generator, so runs at concurrency 1
+are reproducible.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import threading
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcript_slicer import estimate_tokens, tokenize
+
+_SINGLE_CRITERION = re.compile(r"À ÉVALUER :\n(.+?)\n\nTRANSCRIPTION DE LA CONSULTATION :\n(.*?)\n\n(?:Évaluez|DIAGNOSTIC)", re.S)
+_BATCHED_CRITERIA = re.compile(r"CRITÈRES À ÉVALUER \([^)]*\) :\n(.+?)\n\nTRANSCRIPTION DE LA CONSULTATION :\n(.*?)\n\n?(?:DIAGNOSTIC ATTENDU|Évaluez)", re.S)
+_LEGACY_GRID = re.compile(r"GRILLE D'ÉVALUATION:\n(.+?)\n\nTRANSCRIPTION:\n(.*?)\n\nINSTRUCTIONS:", re.S)
+_NUMBERED = re.compile(r'^\s*\d+\.\s*(.+?)\s*$', re.M)
+_POINTS_SUFFIX = re.compile(r'\s+-\s+\d+\s+points$')
+
+
+def judge(description, transcript):
+    """'OUI', 'PARTIELLEMENT' or 'NON' from the share of description stems found in the transcript"""
+    stems = set(tokenize(description))
+    if not stems:
+        return 'NON'
+    found = len(stems & set(tokenize(transcript))) / len(stems)
+    if found >= 0.5:
+        return 'OUI'
+    return 'PARTIELLEMENT' if found > 0 else 'NON'
+
+
+def _verdict_line(description, transcript):
+    verdict = judge(description, transcript)
+    return f"{verdict} - Réponse simulée pour « {description[:60]} »."
+
+
+def answer(prompt):
+    """The fake model's reply to `prompt`"""
+    match = _SINGLE_CRITERION.search(prompt)
+    if match:
+        return _verdict_line(match.group(1).strip(), match.group(2))
+
+    match = _BATCHED_CRITERIA.search(prompt)
+    if match:
+        criteria = _NUMBERED.findall(match.group(1))
+        return "\n".join(
+            f"{number}. {_verdict_line(description, match.group(2))}"
+            for number, description in enumerate(criteria, 1)
+        )
+
+    match = _LEGACY_GRID.search(prompt)
+    if match:
+        evaluation = []
+        for line in _NUMBERED.findall(match.group(1)):
+            description = _POINTS_SUFFIX.sub('', line)
+            evaluation.append({
+                'description': description,
+                'completed': judge(description, match.group(2)) == 'OUI',
+                'justification': "Réponse simulée",
+            })
+        return json.dumps({'evaluation': evaluation, 'feedback': "Évaluation simulée."}, ensure_ascii=False)
+
+    if 'conseils' in prompt:
+        return "1. Présentez-vous au patient.\n2. Explorez les antécédents.\n3. Concluez la consultation."
+
+    return "OUI - Réponse simulée."
+
+
+class FakeGroqService:
+    """Shared latency/error profile and usage counters for every fake model client"""
+
+    def __init__(self, latency_seconds=0.05, seconds_per_1k_tokens=0.0, jitter_seconds=0.0,
+                 error_rate=0.0, seed=0):
+        self.latency_seconds = latency_seconds
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.jitter_seconds = jitter_seconds
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.errors = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+            }
+
+    def profile(self):
+        return {
+            'latency_seconds': self.latency_seconds,
+            'seconds_per_1k_tokens': self.seconds_per_1k_tokens,
+            'jitter_seconds': self.jitter_seconds,
+            'error_rate': self.error_rate,
+        }
+
+    def client(self, model):
+        """Chat model for one model of the chain; pass as FallbackGroqClient(client_factory=...)"""
+        return FakeChatModel(service=self, model_name=model)
+
+    def complete(self, model, prompt, max_tokens):
+        """Reply text and token usage for one call, after the simulated latency"""
+        prompt_tokens = estimate_tokens(prompt)
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.error_rate
+            jitter = self._random.random() * self.jitter_seconds
+            if failed:
+                self.errors += 1
+            else:
+                self.prompt_tokens += prompt_tokens
+
+        time.sleep(self.latency_seconds + jitter + self.seconds_per_1k_tokens * prompt_tokens / 1000)
+        if failed:
+            raise RuntimeError(f"Error code: 429 - rate limit reached for model '{model}' (injected)")
+
+        text = answer(prompt)
+        if max_tokens:
+            text = text[:max_tokens * 4]
+        completion_tokens = estimate_tokens(text)
+        with self._lock:
+            self.completion_tokens += completion_tokens
+        return text, {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+
+
+class FakeChatModel(BaseChatModel):
+    """LangChain chat model answering from a FakeGroqService"""
+
+    service: Any
+    model_name: str = 'fake'
+    max_tokens: Optional[int] = None
+
+    @property
+    def _llm_type(self):
+        return 'fake-groq'
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        prompt = "\n".join(str(message.content) for message in messages)
+        text, usage = self.service.complete(self.model_name, prompt, kwargs.get('max_tokens') or self.max_tokens)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))],
+            llm_output={'token_usage': usage, 'model_name': self.model_name},
+        )
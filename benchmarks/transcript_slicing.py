@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Accuracy and token comparison: sliced vs. full-transcript criterion grading.
+
+Grades recorded consultations twice with the configured LLM client: once
+with transcript slicing and once without. It reports how often the two
+agree per criterion, the score differences and the transcript tokens saved.
+
+Usage:
+    python benchmarks/transcript_slicing.py                   # last 20 recorded performances
+    python benchmarks/transcript_slicing.py --limit 50
+    python benchmarks/transcript_slicing.py --file transcripts.json
+
+A --file holds a JSON list of {"case_number": ..., "conversation": [...]}.
+"""
+
+import os
+import sys
+import json
+import argparse
+
+from sqlalchemy.orm import undefer_group
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models import StudentPerformance
+from enhanced_evaluation_agent import EnhancedEvaluationAgent
+from evaluation_cache import EvaluationCache
+
+
+def load_recordings(args):
+    if args.file:
+        with open(args.file, encoding='utf-8') as f:
+            return [(str(r['case_number']), r['conversation']) for r in json.load(f)]
+    performances = (
+        StudentPerformance.query
+        .options(undefer_group('transcript'))
+        .order_by(StudentPerformance.completed_at.desc())
+        .limit(args.limit)
+        .all()
+    )
+    return [(p.case_number, p.conversation_transcript) for p in performances if p.conversation_transcript]
+
+
+def make_agent(app, slicing, args):
+    settings = {
+        **app.config['EVALUATION_CONFIG'],
+        'transcript_slicing': slicing,
+        'slice_top_k': args.top_k,
+        'slice_token_budget': args.token_budget,
+        'evaluation_strategy': 'concurrent',
+    }
+    # Private caches so neither run is answered from the other's (or production) results
+    return EnhancedEvaluationAgent(app.config['GROQ_CLIENT'], settings=settings, cache=EvaluationCache())
+
+
+def compare(app, recordings, args):
+    full_agent = make_agent(app, False, args)
+    sliced_agent = make_agent(app, True, args)
+    load_case = app.config['LOAD_PATIENT_CASE']
+
+    items = agreements = 0
+    score_deltas = []
+    for number, (case_number, conversation) in enumerate(recordings, 1):
+        try:
+            case_data = load_case(case_number)
+        except Exception as e:
+            print(f"  ⚠️  case {case_number}: {e}")
+            continue
+
+        full = full_agent.evaluate_conversation(conversation, case_data)
+        sliced = sliced_agent.evaluate_conversation(conversation, case_data)
+
+        disagreements = []
+        for full_item, sliced_item in zip(full.get('checklist', []), sliced.get('checklist', [])):
+            items += 1
+            same = (full_item.get('completed'), full_item.get('partial', False)) == \
+                   (sliced_item.get('completed'), sliced_item.get('partial', False))
+            agreements += same
+            if not same:
+                disagreements.append(full_item.get('description', ''))
+
+        delta = sliced.get('percentage', 0) - full.get('percentage', 0)
+        score_deltas.append(delta)
+        print(f"[{number}/{len(recordings)}] case {case_number}: full {full.get('percentage', 0)}% "
+              f"| sliced {sliced.get('percentage', 0)}% | Δ {delta:+}")
+        for description in disagreements:
+            print(f"      ≠ {description}")
+
+    tokens = sliced_agent.slicing_stats()
+    print()
+    print("📊 Transcript slicing vs. full transcript")
+    print(f"  Consultations:        {len(score_deltas)}")
+    if items:
+        print(f"  Criterion agreement:  {agreements}/{items} ({agreements / items:.1%})")
+    if score_deltas:
+        print(f"  Mean |Δ score|:       {sum(abs(d) for d in score_deltas) / len(score_deltas):.1f} points")
+        print(f"  Max |Δ score|:        {max(abs(d) for d in score_deltas)} points")
+    print(f"  Sliced prompts:       {tokens['sliced_prompts']}/{tokens['prompts']}")
+    print(f"  Transcript tokens:    {tokens['sent_tokens']} sent of {tokens['full_tokens']} "
+          f"({tokens['saved_ratio']:.1%} saved)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--file', help='JSON file of recorded transcripts instead of the database')
+    parser.add_argument('--limit', type=int, default=20, help='Recorded performances to compare')
+    parser.add_argument('--top-k', type=int, default=4, help='Relevant turns kept per criterion')
+    parser.add_argument('--token-budget', type=int, default=1200, help='Transcript token budget per prompt')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        recordings = load_recordings(args)
+        if not recordings:
+            print("No recorded transcripts found.")
+            return False
+        compare(app, recordings, args)
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
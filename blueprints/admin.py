@@ -7,11 +7,14 @@ import tempfile
 import json
 import io
 from simple_pdf_generator import create_simple_consultation_pdf
+import reporting
+from rollups import mark_stale
+from rescore import RescoreRunBusyError
 from models import (
     db, Student, Teacher, AdminAccess, OSCESession, SessionParticipant,
     SessionStationAssignment, PatientCase, StudentPerformance,
     CompetitionSession, CompetitionParticipant, CompetitionStationBank,
-    StudentCompetitionSession, StudentStationAssignment
+    StudentCompetitionSession, StudentStationAssignment, RescoreRun
 )
 
 admin_bp = Blueprint('admin', __name__)
@@ -464,7 +467,7 @@ def admin_stations():
         search_query = request.args.get('search', '').strip()
         
         # Base query
-        query = PatientCase.query
+        query = PatientCase.list_query()
         
         # Apply search filter if provided
         if search_query:
@@ -476,14 +479,16 @@ def admin_stations():
             )
         
         cases = query.order_by(PatientCase.case_number).all()
+        rollups = reporting.case_rollups()
         
         stations = []
         total_usage = 0
         specialty_count = {}
         
         for case in cases:
-            usage_count = case.get_completion_count()
-            avg_score = case.get_average_score()
+            rollup = rollups.get(case.case_number, reporting.EMPTY_ROLLUP)
+            usage_count = rollup['count']
+            avg_score = round(rollup['average'], 1)
             
             total_usage += usage_count
             
@@ -543,6 +548,7 @@ def admin_students():
             )
         
         students = query.order_by(Student.name).all()
+        rollups = reporting.student_rollups()
         
         student_data = []
         active_count = 0
@@ -550,8 +556,9 @@ def admin_students():
         students_with_scores = 0
         
         for student in students:
-            total_consultations = student.get_total_workouts()
-            avg_score = student.get_average_score()
+            rollup = rollups.get(student.id, reporting.EMPTY_ROLLUP)
+            total_consultations = rollup['count']
+            avg_score = round(rollup['average'], 1)
             
             if total_consultations > 0:
                 active_count += 1
@@ -591,7 +598,7 @@ def admin_student_details(student_id):
         student = Student.query.get_or_404(student_id)
         
         # Get student performances
-        performances = StudentPerformance.query.filter_by(student_id=student_id)\
+        performances = StudentPerformance.list_query().filter_by(student_id=student_id)\
             .order_by(StudentPerformance.completed_at.desc()).all()
         
         performance_data = []
@@ -683,7 +690,7 @@ def admin_available_students():
 def admin_available_stations():
     """Get list of stations available for session assignment"""
     try:
-        cases = PatientCase.query.order_by(PatientCase.case_number).all()
+        cases = PatientCase.list_query().order_by(PatientCase.case_number).all()
         
         station_data = []
         for case in cases:
@@ -833,13 +840,13 @@ def admin_create_session():
 def admin_download_student_report(performance_id):
     """Download student performance report (admin version)"""
     try:
-        performance = db.session.get(StudentPerformance, performance_id)
+        performance = db.session.get(StudentPerformance, performance_id, options=StudentPerformance.report_options())
         
         if not performance:
             logger.error(f"Performance record not found for ID: {performance_id}")
             return jsonify({"error": "Rapport de performance non trouvé"}), 404
 
-        conversation_for_pdf = performance.conversation_transcript 
+        conversation_for_pdf = current_app.config['SYSTEM_PROMPTS'].resolve(performance.conversation_transcript)
         
         if not conversation_for_pdf:
             logger.error(f"No conversation transcript found for performance ID: {performance_id}")
@@ -1443,9 +1450,16 @@ def delete_student(student_id):
 
         # Manually delete records that lack cascade on the Student side
         CompetitionParticipant.query.filter_by(student_id=student_id).delete()
+        stale_cases = set()
         for scs in StudentCompetitionSession.query.filter_by(student_id=student_id).all():
+            stale_cases.update(case_number for case_number, in db.session.query(StudentStationAssignment.case_number)
+                               .filter_by(student_session_id=scs.id, status='completed'))
             StudentStationAssignment.query.filter_by(student_session_id=scs.id).delete()
         StudentCompetitionSession.query.filter_by(student_id=student_id).delete()
+        # The bulk deletes above skip the stats hook
+        mark_stale(case_numbers=stale_cases)
+        # Transcripts reference the student: remove them with the performances and jobs using them
+        current_app.config['CONVERSATION_STORE'].delete_for_student(student_id)
 
         db.session.delete(student)
         db.session.commit()
@@ -1659,4 +1673,91 @@ def import_users():
     except Exception as e:
         logger.error(f"Error importing users: {str(e)}")
         db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@admin_bp.route('/rescore', methods=['POST'])
+@admin_required
+def start_rescore():
+    """Re-score stored consultations of a case, a competition and/or a date range"""
+    try:
+        data = request.get_json(silent=True) or {}
+        case_number = data.get('case_number')
+        competition_id = data.get('competition_id')
+        since = data.get('since')
+        until = data.get('until')
+
+        if not (case_number or competition_id or since or until):
+            return jsonify({"error": "Précisez un cas, une compétition ou une période"}), 400
+
+        runner = current_app.config['RESCORE_RUNNER']
+        run = runner.create_run(case_number, competition_id, since, until, created_by='admin')
+        if run.total_items:
+            runner.start(run.id)
+
+        return jsonify({
+            "success": True,
+            "run": run.to_dict(),
+            "message": f"{run.total_items} consultation(s) à réévaluer"
+        })
+
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": f"Date invalide: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Error starting rescore run: {str(e)}")
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+@admin_bp.route('/rescore/<int:run_id>')
+@admin_required
+def rescore_status(run_id):
+    """Progress, throughput and score changes of a re-scoring run"""
+    try:
+        summary = current_app.config['RESCORE_RUNNER'].summary(run_id)
+        if summary is None:
+            return jsonify({"error": "Réévaluation introuvable"}), 404
+        return jsonify(summary)
+
+    except Exception as e:
+        logger.error(f"Error getting rescore run {run_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@admin_bp.route('/rescore/<int:run_id>/resume', methods=['POST'])
+@admin_required
+def resume_rescore(run_id):
+    """Resume an interrupted re-scoring run from its checkpoint"""
+    try:
+        run = RescoreRun.query.get_or_404(run_id)
+        if run.status == 'completed':
+            return jsonify({"error": "Cette réévaluation est déjà terminée"}), 400
+
+        current_app.config['RESCORE_RUNNER'].start(run_id)
+        db.session.refresh(run)
+        return jsonify({"success": True, "run": run.to_dict()})
+
+    except RescoreRunBusyError:
+        return jsonify({"error": "Cette réévaluation est déjà en cours"}), 409
+    except Exception as e:
+        logger.error(f"Error resuming rescore run {run_id}: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@admin_bp.route('/cache-stats')
+@admin_required
+def cache_stats():
+    """Hit rates of the in-process caches (cases, LLM responses, evaluations)"""
+    try:
+        client = current_app.config.get('GROQ_CLIENT')
+        evaluation_agent = current_app.config.get('EVALUATION_AGENT')
+        return jsonify({
+            "cases": current_app.config['CASE_CACHE'].stats(),
+            "llm_responses": client.cache_stats() if hasattr(client, 'cache_stats') else None,
+            "evaluations": evaluation_agent.cache_stats() if evaluation_agent else None
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting cache stats: {str(e)}")
+        return jsonify({"error": str(e)}), 500
@@ -8,6 +8,7 @@ import time
 import random
 import json, tempfile, os
 from simple_pdf_generator import create_competition_pdf_report, create_simple_consultation_pdf
+import reporting
 
 student_bp = Blueprint('student', __name__)
 logger = logging.getLogger(__name__)
@@ -260,9 +261,12 @@ def start_competition_station(session_id):
         initialize_conversation = current_app.config.get('INITIALIZE_CONVERSATION')
         if initialize_conversation:
             conversation = initialize_conversation(case.case_number)
-            session['current_conversation'] = [msg.content if hasattr(msg, 'content') else str(msg) for msg in conversation]
+            conversation_id = current_app.config['CONVERSATION_STORE'].start(
+                case.case_number, conversation, student_id=current_user.id, kind='competition'
+            )
             session['current_case'] = case.case_number
             session['current_competition_session'] = student_session.id
+            session['conversation_id'] = conversation_id
         
         response_data = {
             'success': True,
@@ -291,8 +295,10 @@ def start_competition_station(session_id):
 def complete_competition_station():
     """Complete the current station in competition"""
     try:
-        # Get current conversation and case from session
-        conversation = session.get('current_conversation', [])
+        # Get current case from session and the conversation from the store
+        conversation_store = current_app.config['CONVERSATION_STORE']
+        conversation_id = session.get('conversation_id')
+        conversation = conversation_store.messages(conversation_id)
         case_number = session.get('current_case')
         student_session_id = session.get('current_competition_session')
         
@@ -308,23 +314,49 @@ def complete_competition_station():
         if not student_session or student_session.student_id != current_user.id:
             return jsonify({"error": "Invalid competition session"}), 400
 
-        # Evaluate the conversation
-        evaluate_conversation = current_app.config.get('EVALUATE_CONVERSATION')
-        if evaluate_conversation:
-            evaluation_results = evaluate_conversation(conversation, case_number)
+        current_station = student_session.get_current_station_assignment()
+        evaluation_jobs = current_app.config.get('EVALUATION_JOBS')
+        job_id = None
+
+        if evaluation_jobs and current_station:
+            # Record the station as completed now; the background job fills in the score
+            evaluation_results = {
+                'status': 'pending',
+                'percentage': 0,
+                'checklist': [],
+                'feedback': 'Évaluation en cours...',
+                'recommendations': []
+            }
+            success = student_session.complete_current_station(evaluation_results, conversation)
+            if success:
+                job_id = evaluation_jobs.enqueue(
+                    'competition', case_number, None if conversation else [],
+                    student_id=current_user.id,
+                    payload={'assignment_id': current_station.id},
+                    conversation_id=conversation_id if conversation else None
+                )
         else:
-            evaluation_results = {'percentage': 0, 'checklist': [], 'feedback': 'Evaluation not available'}
+            # Evaluate the conversation
+            evaluate_conversation = current_app.config.get('EVALUATE_CONVERSATION')
+            if evaluate_conversation:
+                evaluation_results = evaluate_conversation(
+                    conversation, case_number, conversation_id=conversation_id, kind='competition'
+                )
+            else:
+                evaluation_results = {'percentage': 0, 'checklist': [], 'feedback': 'Evaluation not available'}
 
-        # Complete the station - PASS the conversation as parameter
-        success = student_session.complete_current_station(evaluation_results, conversation)
+            # Complete the station - PASS the conversation as parameter
+            success = student_session.complete_current_station(evaluation_results, conversation)
 
         if not success:
             return jsonify({"error": "Failed to complete station"}), 500
 
         # Clear session data
-        session.pop('current_conversation', None)
+        if conversation_id:
+            conversation_store.end(conversation_id)
         session.pop('current_case', None)
         session.pop('current_competition_session', None)
+        session.pop('conversation_id', None)
 
         # Prepare response
         is_finished = student_session.status == 'completed'
@@ -335,6 +367,8 @@ def complete_competition_station():
             'current_station': student_session.current_station_order - 1,  # Previous station
             'evaluation': evaluation_results,
             'recommendations': evaluation_results.get('recommendations', []),
+            'job_id': job_id,
+            'evaluation_pending': job_id is not None,
             'is_finished': is_finished,
             'next_station_delay': competition_session.time_between_stations * 60 if not is_finished else 0
         }
@@ -379,8 +413,10 @@ def download_competition_report(session_id):
         if not competition_session:
             return jsonify({"error": "Session de compétition non trouvée"}), 404
         
-        # Get all station assignments for this student
-        station_assignments = StudentStationAssignment.query.filter_by(
+        # Get all station assignments for this student, with their transcripts
+        station_assignments = StudentStationAssignment.query.options(
+            db.undefer(StudentStationAssignment.performance_data)
+        ).filter_by(
             student_session_id=student_session.id
         ).order_by(StudentStationAssignment.station_order).all()
         
@@ -402,7 +438,7 @@ def download_competition_report(session_id):
                     case = PatientCase.query.filter_by(case_number=assignment.case_number).first()
                     
                     # Extract conversation and evaluation
-                    conversation = perf_data.get('conversation_transcript', [])
+                    conversation = current_app.config['SYSTEM_PROMPTS'].resolve(perf_data.get('conversation_transcript', []))
                     evaluation_results = perf_data.get('evaluation_results', {})
                     
                     # Add to conversations data
@@ -412,7 +448,7 @@ def download_competition_report(session_id):
                         'specialty': case.specialty if case else 'Unknown',
                         'conversation': conversation,
                         'evaluation': evaluation_results,
-                        'score': perf_data.get('percentage_score', 0),
+                        'score': perf_data.get('percentage_score') or 0,
                         'points_earned': perf_data.get('points_earned', 0),
                         'points_total': perf_data.get('points_total', 0)
                     })
@@ -474,7 +510,7 @@ def student_stats():
     """Get student statistics"""
     try:
         # Get student performances
-        performances = StudentPerformance.query.filter_by(student_id=current_user.id)\
+        performances = StudentPerformance.list_query().filter_by(student_id=current_user.id)\
             .order_by(StudentPerformance.completed_at.desc()).all()
         
         # Calculate stats
@@ -518,7 +554,7 @@ def student_stations():
         search_query = request.args.get('search', '').strip()
         
         # Get all cases
-        query = PatientCase.query
+        query = PatientCase.list_query()
         if search_query:
             query = query.filter(
                 db.or_(
@@ -528,18 +564,16 @@ def student_stations():
             )
         
         cases = query.order_by(PatientCase.case_number).all()
+        rollups = reporting.student_case_rollups(current_user.id)
         
         stations = []
         for case in cases:
-            # Get student's performance for this case
-            student_performances = StudentPerformance.query.filter_by(
-                student_id=current_user.id,
-                case_number=case.case_number
-            ).all()
+            # Student's performance for this case, computed for all cases in one query
+            rollup = rollups.get(case.case_number, reporting.EMPTY_ROLLUP)
             
-            attempts = len(student_performances)
-            best_score = max(perf.percentage_score for perf in student_performances) if student_performances else 0
-            last_attempt = student_performances[-1].completed_at.strftime('%d/%m/%Y') if student_performances else None
+            attempts = rollup['count']
+            best_score = rollup['best']
+            last_attempt = rollup['last_attempt'].strftime('%d/%m/%Y') if rollup['last_attempt'] else None
             
             stations.append({
                 'case_number': case.case_number,
@@ -618,23 +652,19 @@ def generate_competition_report(student_session, competition_session):
         
         # Add individual station results
         for assignment in station_assignments:
-            if assignment.performance_data:
-                try:
-                    performance_data = json.loads(assignment.performance_data)
-                    case = PatientCase.query.filter_by(case_number=assignment.case_number).first()
-                    
-                    station_result = {
-                        'station_order': assignment.station_order,
-                        'case_number': assignment.case_number,
-                        'specialty': case.specialty if case else 'Unknown',
-                        'score': performance_data.get('percentage_score', 0),
-                        'status': assignment.status,
-                        'started_at': assignment.started_at,
-                        'completed_at': assignment.completed_at
-                    }
-                    report_data['station_results'].append(station_result)
-                except json.JSONDecodeError:
-                    continue
+            if assignment.percentage_score is not None:
+                case = PatientCase.query.filter_by(case_number=assignment.case_number).first()
+                
+                station_result = {
+                    'station_order': assignment.station_order,
+                    'case_number': assignment.case_number,
+                    'specialty': case.specialty if case else 'Unknown',
+                    'score': assignment.percentage_score,
+                    'status': assignment.status,
+                    'started_at': assignment.started_at,
+                    'completed_at': assignment.completed_at
+                }
+                report_data['station_results'].append(station_result)
         
         # Generate PDF
         filename = create_competition_report_pdf(report_data)
@@ -697,7 +727,7 @@ def debug_competition_status():
     """Debug endpoint to check competition status"""
     try:
         # Get current session data
-        conversation = session.get('current_conversation', [])
+        conversation = current_app.config['CONVERSATION_STORE'].messages(session.get('conversation_id'))
         case_number = session.get('current_case')
         
         # Get student's competition session
@@ -739,7 +769,7 @@ def debug_competition_status():
 def student_download_report(performance_id):
     """Download consultation PDF report for a specific performance record (regenerated on demand)"""
     try:
-        performance = db.session.get(StudentPerformance, performance_id)
+        performance = db.session.get(StudentPerformance, performance_id, options=StudentPerformance.report_options())
 
         if not performance:
             return jsonify({"error": "Rapport non trouvé"}), 404
@@ -748,7 +778,7 @@ def student_download_report(performance_id):
         if performance.student_id != current_user.id:
             return jsonify({"error": "Accès non autorisé"}), 403
 
-        conversation_for_pdf = performance.conversation_transcript
+        conversation_for_pdf = current_app.config['SYSTEM_PROMPTS'].resolve(performance.conversation_transcript)
         if not conversation_for_pdf:
             return jsonify({"error": "Aucun historique de conversation trouvé"}), 404
 
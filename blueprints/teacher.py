@@ -8,12 +8,20 @@ from werkzeug.utils import secure_filename
 import json
 import tempfile
 from simple_pdf_generator import create_simple_consultation_pdf
+import reporting
 from datetime import datetime
 
 # CREATE THE BLUEPRINT - This must be at the top level
 teacher_bp = Blueprint('teacher', __name__)
 logger = logging.getLogger(__name__)
 
+
+def invalidate_case(case_number):
+    """Drop a case from the in-process case cache after it was edited or deleted"""
+    case_cache = current_app.config.get('CASE_CACHE')
+    if case_cache:
+        case_cache.invalidate(case_number)
+
 @teacher_bp.route('/')
 @teacher_required
 def teacher_interface():
@@ -360,6 +368,7 @@ def save_edited_case():
             existing_case.consultation_time = edited_data.get('consultation_time', existing_case.consultation_time)
             existing_case.additional_notes = edited_data.get('additional_notes', existing_case.additional_notes)
             existing_case.custom_sections = edited_data.get('custom_sections', existing_case.custom_sections)
+            existing_case.evaluation_strategy = edited_data.get('evaluation_strategy', existing_case.evaluation_strategy)
             existing_case.updated_at = datetime.utcnow()
             
             # Handle images - remove old ones and add new ones
@@ -387,6 +396,7 @@ def save_edited_case():
                 db.session.add(case_image)
             
             db.session.commit()
+            invalidate_case(case_number)
             logger.info(f"Successfully updated existing case: {case_number}")
             return jsonify({"status": "success", "case_number": case_number, "action": "updated"})
         
@@ -426,6 +436,7 @@ def save_edited_case():
                 db.session.add(case_image)
             
             db.session.commit()
+            invalidate_case(case_number)
             logger.info(f"Successfully created new case: {case_number}")
             return jsonify({"status": "success", "case_number": case_number, "action": "created"})
         
@@ -461,9 +472,11 @@ def edit_case(case_number):
         existing_case.consultation_time = edited_data.get('consultation_time', existing_case.consultation_time)
         existing_case.additional_notes = edited_data.get('additional_notes', existing_case.additional_notes)
         existing_case.custom_sections = edited_data.get('custom_sections', existing_case.custom_sections)
+        existing_case.evaluation_strategy = edited_data.get('evaluation_strategy', existing_case.evaluation_strategy)
         existing_case.updated_at = datetime.utcnow()
         
         db.session.commit()
+        invalidate_case(case_number)
         
         logger.info(f"Successfully updated case: {case_number}")
         return jsonify({"status": "success", "case_number": case_number})
@@ -496,6 +509,7 @@ def delete_case(case_number):
         # Delete case
         db.session.delete(existing_case)
         db.session.commit()
+        invalidate_case(case_number)
         
         logger.info(f"Successfully deleted case: {case_number}")
         return jsonify({"success": True, "message": f"Case {case_number} deleted successfully"})
@@ -513,7 +527,7 @@ def teacher_stations():
         search_query = request.args.get('search', '').strip()
         
         # Base query
-        query = PatientCase.query
+        query = PatientCase.list_query()
         
         # Apply search filter if provided
         if search_query:
@@ -525,13 +539,14 @@ def teacher_stations():
             )
         
         cases = query.order_by(PatientCase.case_number).all()
+        rollups = reporting.case_rollups()
         
         stations = []
         for case in cases:
-            # Get completion count and average score
-            performances = StudentPerformance.query.filter_by(case_number=case.case_number).all()
-            completion_count = len(performances)
-            average_score = sum(perf.percentage_score for perf in performances) / len(performances) if performances else 0
+            # Completion count and average score, computed for all cases in one query
+            rollup = rollups.get(case.case_number, reporting.EMPTY_ROLLUP)
+            completion_count = rollup['count']
+            average_score = rollup['average']
             
             stations.append({
                 'case_number': case.case_number,
@@ -573,15 +588,16 @@ def teacher_students_performance():
             )
         
         students = query.order_by(Student.name).all()
+        rollups = reporting.student_rollups()
         
         student_data = []
         for student in students:
-            # Get student performances
-            performances = StudentPerformance.query.filter_by(student_id=student.id).all()
+            # Performance rollup, computed for all students in one query
+            rollup = rollups.get(student.id, reporting.EMPTY_ROLLUP)
             
-            total_workouts = len(performances)
-            unique_stations = len(set(perf.case_number for perf in performances))
-            average_score = sum(perf.percentage_score for perf in performances) / len(performances) if performances else 0
+            total_workouts = rollup['count']
+            unique_stations = rollup['unique_stations']
+            average_score = rollup['average']
             
             student_data.append({
                 'student_id': student.id,
@@ -610,7 +626,7 @@ def teacher_student_detailed_performance(student_id):
         student = Student.query.get_or_404(student_id)
         
         # Get student performances
-        performances = StudentPerformance.query.filter_by(student_id=student_id)\
+        performances = StudentPerformance.list_query().filter_by(student_id=student_id)\
             .order_by(StudentPerformance.completed_at.desc()).all()
         
         # Calculate summary stats
@@ -652,13 +668,13 @@ def teacher_student_detailed_performance(student_id):
 def teacher_download_student_report(performance_id):
     """Download student performance report (teacher version)"""
     try:
-        performance = db.session.get(StudentPerformance, performance_id)
+        performance = db.session.get(StudentPerformance, performance_id, options=StudentPerformance.report_options())
         
         if not performance:
             logger.error(f"Performance record not found for ID: {performance_id}")
             return jsonify({"error": "Rapport de performance non trouvé"}), 404
 
-        conversation_for_pdf = performance.conversation_transcript 
+        conversation_for_pdf = current_app.config['SYSTEM_PROMPTS'].resolve(performance.conversation_transcript)
         
         if not conversation_for_pdf:
             logger.error(f"No conversation transcript found for performance ID: {performance_id}")
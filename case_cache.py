@@ -0,0 +1,163 @@
+"""
+In-process cache of parsed patient cases and their rendered system prompts.
+
+Loading a case means a query, five JSON decodes and a query for its images,
+and a single consultation used to do it three or four times (start, system
+prompt, evaluation). CaseCache keeps the parsed case dict, images included,
+with the case's `updated_at` as its version, plus the system prompts
+rendered from it.
+
+An entry is re-validated against `updated_at` (one scalar query) at most
+every `revalidate_seconds`, so edits made by another process are picked up
+within that delay. The teacher routes that edit or delete a case call
+`invalidate` so this process sees the change immediately.
+
+TemplateFile does the same for response_template.json, re-read only when
+its modification time changes.
+"""
+
+import os
+import copy
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateFile:
+    """A JSON file parsed once and re-read when its modification time changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._content = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        """Modification time of the file (0 if it is missing)"""
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return 0
+
+    def load(self):
+        """Parsed content of the file; raises FileNotFoundError if it is missing"""
+        mtime = self.version
+        if not mtime:
+            raise FileNotFoundError(f"{self.path} not found")
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._content = json.load(f)
+                self._mtime = mtime
+                logger.info(f"Loaded {self.path}")
+            return self._content
+
+
+class CaseCache:
+    """Parsed cases keyed by case_number, versioned by updated_at, with hit-rate counters"""
+
+    def __init__(self, load, version, revalidate_seconds=5, max_entries=256, clock=time.monotonic):
+        """
+        `load(case_number)` returns the parsed case dict (raising if it does not exist).
+        `version(case_number)` returns its updated_at, or None if it does not exist.
+        """
+        self.load = load
+        self.version_of = version
+        self.revalidate_seconds = revalidate_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = {}  # case_number -> {'version', 'checked_at', 'data', 'prompts'}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.invalidations = 0
+
+    def get(self, case_number):
+        """A copy of the parsed case (callers may modify it)"""
+        return copy.deepcopy(self._entry(case_number)['data'])
+
+    def version(self, case_number):
+        """The cached case's updated_at"""
+        return self._entry(case_number)['version']
+
+    def system_prompt(self, case_number, template_version, render):
+        """System prompt of the case for a template version; `render(case_data)` builds it on a miss"""
+        entry = self._entry(case_number)
+        with self._lock:
+            prompt = entry['prompts'].get(template_version)
+        if prompt is None:
+            prompt = render(copy.deepcopy(entry['data']))
+            with self._lock:
+                # Only the latest template version is worth keeping
+                entry['prompts'] = {template_version: prompt}
+        return prompt
+
+    def invalidate(self, case_number=None):
+        """Forget one case (or every case) so the next read reloads it"""
+        with self._lock:
+            if case_number is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(case_number), None)
+            self.invalidations += 1
+
+    def stats(self):
+        """Hit/miss counters since startup and the number of cached cases"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'reloads': self.reloads,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+            }
+
+    def _entry(self, case_number):
+        case_number = str(case_number)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(case_number)
+        if entry is not None and now - entry['checked_at'] < self.revalidate_seconds:
+            with self._lock:
+                self.hits += 1
+            return entry
+
+        if entry is not None:
+            version = self.version_of(case_number)
+            if version is not None and version == entry['version']:
+                with self._lock:
+                    entry['checked_at'] = now
+                    self.hits += 1
+                return entry
+            with self._lock:
+                self.reloads += 1
+
+        # Version first: an edit made while loading shows up as stale at the next check
+        version = self.version_of(case_number)
+        try:
+            data = self.load(case_number)
+        except Exception:
+            with self._lock:
+                self._entries.pop(case_number, None)
+            raise
+        entry = {
+            'version': version,
+            'checked_at': now,
+            'data': data,
+            'prompts': {},
+        }
+        with self._lock:
+            self.misses += 1
+            if case_number not in self._entries and len(self._entries) >= self.max_entries:
+                # Drop the least recently validated case
+                oldest = min(self._entries, key=lambda key: self._entries[key]['checked_at'])
+                del self._entries[oldest]
+            self._entries[case_number] = entry
+        return entry
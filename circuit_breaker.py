@@ -0,0 +1,166 @@
+"""
+Per-model circuit breakers for the Groq model chain.
+
+A model whose calls fail with a fallback-class error (429, 503, quota...)
+has its circuit opened for a cooldown, honouring the server's Retry-After
+when one is given. Once the cooldown expires the circuit goes half-open:
+exactly one probe request is let through, and its outcome closes the
+circuit again (the model is back in rotation) or re-opens it with a longer
+cooldown.
+
+Time comes from an injectable clock so the state machine can be exercised
+offline with ManualClock.
+"""
+
+import re
+import time
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# "Please try again in 7m12.5s" / "try again in 1h2m3s" / "try again in 850ms"
+_TRY_AGAIN_PATTERN = re.compile(
+    r'try again in\s+(?:(\d+)h)?(?:(\d+)m(?!s))?(?:([\d.]+)s)?(?:([\d.]+)ms)?',
+    re.IGNORECASE
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised when every model in the chain has an open circuit"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ManualClock:
+    """Deterministic clock for offline checks: time only moves when advance() is called"""
+
+    def __init__(self, start=0.0):
+        self.now = float(start)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        return self.now
+
+
+def parse_retry_after(error):
+    """
+    Seconds to wait before retrying, taken from the error's HTTP Retry-After
+    header or from Groq's "try again in ..." message; None if neither is present.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    value = headers.get('retry-after') if headers is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(value)
+                return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    match = _TRY_AGAIN_PATTERN.search(str(error))
+    if match and any(match.groups()):
+        hours, minutes, seconds, millis = match.groups()
+        return (
+            int(hours or 0) * 3600
+            + int(minutes or 0) * 60
+            + float(seconds or 0)
+            + float(millis or 0) / 1000
+        )
+    return None
+
+
+class CircuitBreaker:
+    """
+    closed → open after `failure_threshold` consecutive failures;
+    open → half_open once the cooldown has elapsed;
+    half_open → closed on a successful probe, or open again (cooldown doubled,
+    up to `max_cooldown_seconds`) on a failed one.
+    """
+
+    def __init__(self, name, failure_threshold=1, cooldown_seconds=60,
+                 max_cooldown_seconds=900, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = float(cooldown_seconds)
+        self.max_cooldown = float(max_cooldown_seconds)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = self.base_cooldown
+        self.open_until = 0.0
+        self._probe_in_flight = False
+
+    def _transition(self, state):
+        if state != self.state:
+            logger.info(f"[Circuit] '{self.name}': {self.state} → {state}")
+            self.state = state
+
+    def allow_request(self):
+        """True if a call may be sent now; in half-open state only one probe is allowed"""
+        with self._lock:
+            if self.state == OPEN and self.clock() >= self.open_until:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Hand back a probe slot granted by allow_request() that was never used"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"[Circuit] '{self.name}' recovered")
+            self._transition(CLOSED)
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+            self._probe_in_flight = False
+
+    def record_failure(self, retry_after=None):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                # Failed probe: back off harder before the next one
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif self.failures < self.failure_threshold:
+                return
+            wait = retry_after if retry_after is not None else self.cooldown
+            self.open_until = self.clock() + wait
+            self._probe_in_flight = False
+            self._transition(OPEN)
+            logger.warning(f"[Circuit] '{self.name}' open for {wait:.0f}s")
+
+    def seconds_until_probe(self):
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.open_until - self.clock())
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'open_for': max(0.0, self.open_until - self.clock()) if self.state == OPEN else 0.0,
+            }
@@ -0,0 +1,144 @@
+"""
+Bounded chat context for long consultations.
+
+/chat used to send the whole history to the patient model on every turn, so
+prompt size, latency and cost grew with each question. ContextPolicy sends:
+
+    the system prompt
+    a "facts already disclosed" summary of the older turns (once there is one)
+    the turns not folded into the summary yet, always at least the last `keep_turns`
+
+After each turn, observe() checks whether `summarize_every` turns beyond
+the kept window have accumulated. If so, a background worker folds them into the
+summary with a small model. The summary and the number of messages it covers
+are stored on the Conversation row. The prompt therefore oscillates between
+`keep_turns` and `keep_turns + summarize_every` turns plus a short summary,
+whatever the length of the consultation.
+
+Only the prompt is shortened. conversation_turns keeps the full transcript
+for evaluation and PDF reports. When summarising fails, the next turns
+simply send more history.
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage
+
+from models import db, Conversation
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADER = "=== FAITS DÉJÀ ÉVOQUÉS DANS CETTE CONSULTATION ==="
+
+SUMMARY_PROMPT = """Vous tenez le fil d'une consultation médicale simulée entre un étudiant (médecin) et un patient.
+
+RÉSUMÉ ACTUEL :
+{summary}
+
+NOUVEAUX ÉCHANGES :
+{exchanges}
+
+Mettez à jour le résumé en intégrant les nouveaux échanges. Listez en phrases courtes :
+- les questions déjà posées par le médecin ;
+- les informations que le patient a déjà révélées (symptômes, antécédents, mode de vie, inquiétudes) ;
+- les examens ou gestes déjà annoncés.
+N'inventez rien, n'ajoutez aucune interprétation ni diagnostic. 150 mots maximum.
+
+RÉSUMÉ MIS À JOUR :"""
+
+
+def _dialogue(conversation):
+    """Non-system messages of a conversation"""
+    return [msg for msg in conversation if isinstance(msg, dict) and msg.get('role') != 'system']
+
+
+class ContextPolicy:
+    """Chooses the messages sent to the patient model and maintains the rolling summary"""
+
+    def __init__(self, app, llm_client, settings=None, max_workers=1):
+        settings = settings or {}
+        self.app = app
+        self.llm_client = llm_client
+        self.enabled = settings.get('enabled', True)
+        self.keep_turns = settings.get('keep_turns', 6)
+        self.summarize_every = settings.get('summarize_every', 4)
+        self.summary_profile = settings.get('summary_profile', 'summary')
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='context-summary')
+        self._running = set()
+        self._lock = threading.Lock()
+        self.summaries = 0
+        self.failures = 0
+
+    def window(self, conversation_id, conversation):
+        """Messages to send for the next reply: system prompt, summary and recent turns"""
+        if not self.enabled:
+            return conversation
+        stored = db.session.get(Conversation, conversation_id) if conversation_id else None
+        if stored is None or not stored.summary:
+            return conversation
+
+        system = [msg for msg in conversation if isinstance(msg, dict) and msg.get('role') == 'system']
+        dialogue = _dialogue(conversation)
+        summary = {'role': 'system', 'content': f"{SUMMARY_HEADER}\n{stored.summary}\n"
+                   "Restez cohérent avec ces informations déjà données ; ne les répétez que si le médecin le redemande."}
+        return system + [summary] + dialogue[stored.summary_message_count:]
+
+    def observe(self, conversation_id, conversation):
+        """Schedule folding older turns into the summary if enough have accumulated"""
+        if not (self.enabled and self.llm_client and conversation_id):
+            return
+        stored = db.session.get(Conversation, conversation_id)
+        folded = (stored.summary_message_count or 0) if stored else 0
+        if len(_dialogue(conversation)) - folded < 2 * (self.keep_turns + self.summarize_every):
+            return
+        with self._lock:
+            if conversation_id in self._running:
+                return
+            self._running.add(conversation_id)
+        self._executor.submit(self._fold, conversation_id)
+
+    def stats(self):
+        with self._lock:
+            return {'summaries': self.summaries, 'failures': self.failures, 'running': len(self._running)}
+
+    def _fold(self, conversation_id):
+        try:
+            with self.app.app_context():
+                stored = db.session.get(Conversation, conversation_id)
+                if stored is None:
+                    return
+                dialogue = [msg for msg in stored.messages if msg.get('role') != 'system']
+                folded = stored.summary_message_count or 0
+                # Keep the last keep_turns exchanges verbatim
+                until = len(dialogue) - 2 * self.keep_turns
+                if until <= folded:
+                    return
+
+                exchanges = "\n".join(
+                    f"{'Médecin' if msg['role'] == 'human' else 'Patient'}: {msg.get('content', '')}"
+                    for msg in dialogue[folded:until]
+                )
+                prompt = SUMMARY_PROMPT.format(summary=stored.summary or "(aucun)", exchanges=exchanges)
+                response = self.llm_client.invoke([HumanMessage(content=prompt)], profile=self.summary_profile)
+                summary = response.content.strip()
+                if not summary:
+                    raise ValueError("empty summary")
+
+                # Only apply it if no other fold moved the summary in the meantime
+                updated = Conversation.query.filter_by(id=conversation_id, summary_message_count=folded).update(
+                    {'summary': summary, 'summary_message_count': until}, synchronize_session=False
+                )
+                db.session.commit()
+                if updated:
+                    with self._lock:
+                        self.summaries += 1
+                    logger.info(f"Folded messages {folded}-{until} of {conversation_id} into its summary")
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logger.warning(f"Could not summarise conversation {conversation_id}: {str(e)}")
+        finally:
+            with self._lock:
+                self._running.discard(conversation_id)
@@ -0,0 +1,158 @@
+"""
+Append-only storage of in-progress consultations.
+
+The session used to carry the whole conversation: the multi-kilobyte system
+prompt and every message. Each /chat turn then read the whole list and
+rewrote the session file. Now the session holds only `conversation_id`. The
+messages are rows of conversation_turns, and a turn is an INSERT plus a
+counter update, whatever the length of the conversation. A finished
+consultation is attached to its StudentPerformance or EvaluationJob by
+conversation id instead of being copied as JSON.
+
+On SQLite the database runs in WAL mode, so these small appends don't block
+the readers (evaluation workers, dashboards) and don't rewrite the file.
+"""
+
+import uuid
+import logging
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models import db, Conversation, ConversationTurn, EvaluationJob, StudentPerformance, conversation_messages
+
+logger = logging.getLogger(__name__)
+
+
+def enable_sqlite_wal(engine):
+    """Switch SQLite connections of `engine` to WAL journaling (no-op for other databases)"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        # Durable at checkpoints; a crash can only lose the last commits, never corrupt the file
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.close()
+
+
+def to_message_dicts(messages):
+    """LangChain messages, dicts or strings as {'role', 'content'} dicts"""
+    roles = {'system': 'system', 'human': 'human', 'ai': 'assistant'}
+    result = []
+    for msg in messages:
+        if isinstance(msg, dict):
+            result.append(msg)
+        elif hasattr(msg, 'content') and hasattr(msg, 'type'):
+            if msg.type in roles:
+                result.append({'role': roles[msg.type], 'content': msg.content})
+        else:
+            result.append({'role': 'system', 'content': str(msg)})
+    return result
+
+
+class ConversationStore:
+    """Creates conversations and appends their turns, one row per message"""
+
+    def start(self, case_number, messages, student_id=None, kind='practice'):
+        """Store a new conversation with its opening messages; returns its id.
+
+        A system prompt reference (see system_prompts.py) is kept on the
+        conversation rather than stored as a turn.
+        """
+        messages = to_message_dicts(messages)
+        prompt_ids = [msg['prompt_id'] for msg in messages if msg.get('prompt_id')]
+        turns = [msg for msg in messages if not msg.get('prompt_id')]
+        conversation = Conversation(
+            id=uuid.uuid4().hex,
+            student_id=student_id,
+            case_number=str(case_number),
+            kind=kind,
+            system_prompt_id=prompt_ids[0] if prompt_ids else None,
+            message_count=len(turns)
+        )
+        db.session.add(conversation)
+        db.session.add_all(self._turns(conversation.id, turns))
+        db.session.commit()
+        return conversation.id
+
+    def append(self, conversation_id, *messages):
+        """Append messages to an active conversation; False if there is none with this id"""
+        updated = Conversation.query.filter_by(id=conversation_id, status='active').update({
+            'message_count': Conversation.message_count + len(messages),
+            'updated_at': datetime.utcnow()
+        }, synchronize_session=False)
+        if not updated:
+            db.session.rollback()
+            return False
+        db.session.add_all(self._turns(conversation_id, messages))
+        db.session.commit()
+        return True
+
+    def messages(self, conversation_id):
+        """The conversation's messages in order ([] if unknown)"""
+        return conversation_messages(conversation_id)
+
+    def get(self, conversation_id):
+        return db.session.get(Conversation, conversation_id) if conversation_id else None
+
+    def end(self, conversation_id):
+        """Mark a conversation as finished; its turns are kept as the transcript"""
+        Conversation.query.filter_by(id=conversation_id, status='active').update({
+            'status': 'ended',
+            'ended_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+
+    def purge_abandoned(self, max_age):
+        """Delete active conversations untouched for `max_age` (a timedelta); returns how many"""
+        cutoff = datetime.utcnow() - max_age
+        stale = db.session.query(Conversation.id).filter(
+            Conversation.status == 'active',
+            Conversation.updated_at < cutoff
+        )
+        ConversationTurn.query.filter(
+            ConversationTurn.conversation_id.in_(stale.scalar_subquery())
+        ).delete(synchronize_session=False)
+        purged = Conversation.query.filter(
+            Conversation.status == 'active',
+            Conversation.updated_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if purged:
+            logger.info(f"Purged {purged} abandoned conversations")
+        return purged
+
+    def delete_for_student(self, student_id):
+        """Delete a student's conversations, their turns and the rows pointing at them; the caller commits.
+
+        Their performances and evaluation jobs go first, since they reference
+        both the conversations and the student. Returns how many conversations
+        were deleted.
+        """
+        for performance in StudentPerformance.query.filter_by(student_id=student_id):
+            db.session.delete(performance)  # through the session, so the stats hook sees it
+        db.session.flush()
+        EvaluationJob.query.filter_by(student_id=student_id).delete(synchronize_session=False)
+
+        owned = db.session.query(Conversation.id).filter(Conversation.student_id == student_id)
+        ConversationTurn.query.filter(
+            ConversationTurn.conversation_id.in_(owned.scalar_subquery())
+        ).delete(synchronize_session=False)
+        deleted = Conversation.query.filter(
+            Conversation.student_id == student_id
+        ).delete(synchronize_session=False)
+        if deleted:
+            logger.info(f"Deleted {deleted} conversations of student {student_id}")
+        return deleted
+
+    @staticmethod
+    def _turns(conversation_id, messages):
+        return [
+            ConversationTurn(conversation_id=conversation_id, role=msg.get('role', 'system'), content=msg.get('content', ''))
+            for msg in messages
+        ]
+
@@ -236,7 +236,7 @@ class DocumentExtractionAgent:
         raw_llm_response_content = "" # Initialize to store raw LLM output
 
         try:
-            response = self.llm_client.invoke([HumanMessage(content=prompt)])
+            response = self.llm_client.invoke([HumanMessage(content=prompt)], profile='extraction', cache=True)
             raw_llm_response_content = response.content # Store raw response
             
             # Attempt to extract JSON from the response
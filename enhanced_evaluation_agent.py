@@ -1,13 +1,21 @@
 import os
 import re
 import json
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
 import tempfile
 from langchain_core.messages import HumanMessage
 import asyncio
 from typing import List, Dict, Any
 
+from evaluation_config import EVALUATION_SETTINGS, FALLBACK_KEYWORDS
+from evaluation_cache import get_shared_evaluation_cache, make_evaluation_key, evaluation_model
+from keyword_matcher import KeywordMatcher, description_keywords, description_stems
+from transcript_slicer import TranscriptIndex, SliceStats
+
 # Setup logging
 logging.basicConfig(
     level=logging.DEBUG,
@@ -15,13 +23,112 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Checklist evaluation strategies, selectable in EVALUATION_SETTINGS or per case
+EVALUATION_STRATEGIES = ('concurrent', 'sequential', 'batched')
+
+# Justification prefixes of criteria that could not be assessed (LLM error, timeout)
+ASSESSMENT_ERROR_PREFIXES = ("Évaluation impossible", "Erreur lors de l'évaluation")
+
+
+def has_assessment_errors(results):
+    """True if the evaluation failed or any criterion could not be assessed"""
+    if results.get('evaluation_failed'):
+        return True
+    return any(
+        str(item.get('justification', '')).startswith(ASSESSMENT_ERROR_PREFIXES)
+        for item in results.get('checklist', [])
+    )
+
+# One line of a batched verdict: "3. OUI - justification" (markdown bold tolerated)
+_BATCH_VERDICT_LINE = re.compile(
+    r'^\s*\**\s*(\d+)\s*[.):\-]?\s*\**\s*(OUI|NON|PARTIELLEMENT|YES|NO|PARTIALLY)\b\**\s*[-–—:]?\s*(.*)$',
+    re.IGNORECASE
+)
+
+# Cues looked for in each doctor message by _analyze_conversation_structure
+_STRUCTURE_CUES = {
+    'open_question': ['comment', 'décrivez', 'parlez-moi', 'racontez', 'expliquez'],
+    'greeting': ['bonjour', 'bonsoir', 'salut'],
+    'presentation': ['je suis', 'je m\'appelle', 'docteur', 'dr ', 'interne', 'médecin'],
+    'empathy': ['je comprends', 'ne vous inquiétez', 'rassurez', 'je vois', 'ça doit être'],
+    'closing': ['au revoir', 'bonne journée', 'prenez soin', 'bon rétablissement', 'n\'hésitez pas'],
+    'physical_exam': ['examiner', 'ausculter', 'palper', 'inspecter', 'tension', 'température', 'pouls'],
+    'diagnosis': ['diagnostic', 'vous avez', 'il s\'agit', 'je pense que', 'hypothèse'],
+    'treatment': ['traitement', 'médicament', 'prescription', 'prescrire', 'suivi', 'contrôle'],
+}
+_STRUCTURE_MATCHER = KeywordMatcher.from_groups(_STRUCTURE_CUES)
+
+# Category keywords for the pre-screen that skips LLM calls for clearly absent criteria
+_CATEGORY_MATCHER = KeywordMatcher.from_groups(FALLBACK_KEYWORDS)
+
+class EvaluationContext:
+    """State of a single evaluation, so one agent instance can serve concurrent calls"""
+
+    def __init__(self, conversation, case_data, known_verdicts=None, strategy=None):
+        self.conversation = conversation
+        self.case_data = case_data
+        # Strategy imposed by the caller (see evaluation_policy.py), over the configured one
+        self.strategy = strategy
+        # Scores are written onto copies, never onto the caller's checklist dicts
+        self.checklist = [dict(item) for item in case_data.get('evaluation_checklist', [])]
+        self.transcript = ""
+        self.transcript_index = None
+        self.conversation_analysis = {}
+        self.results = {}
+        self.recommendations = []
+        self.evaluation_complete = False
+        self.evaluation_failed = False
+        # Verdicts already established for this transcript (checklist index -> verdict)
+        self.known_verdicts = known_verdicts or {}
+
+
+class _TimedTask:
+    """A task on the shared worker pool whose timeout starts when a worker picks it up.
+
+    The pool serves every evaluation in flight, so time spent queued behind
+    other evaluations must not count against a criterion's timeout.
+    """
+
+    def __init__(self, executor, fn, *args):
+        self._started = threading.Event()
+        self._started_at = None
+        self.future = executor.submit(self._run, fn, args)
+
+    def _run(self, fn, args):
+        self._started_at = time.monotonic()
+        self._started.set()
+        return fn(*args)
+
+    def result(self, timeout, queue_timeout):
+        """Result of the task, or FutureTimeoutError if it ran longer than `timeout`
+        or was still queued after `queue_timeout` seconds"""
+        if not self._started.wait(queue_timeout) and self.future.cancel():
+            raise FutureTimeoutError()
+        self._started.wait()
+        remaining = self._started_at + timeout - time.monotonic()
+        try:
+            return self.future.result(timeout=max(0.0, remaining))
+        except FutureTimeoutError:
+            self.future.cancel()
+            raise
+
+
 class EnhancedEvaluationAgent:
     """Enhanced agent-based evaluation processor with LLM-based analysis for each checklist item"""
 
-    def __init__(self, llm_client=None):
+    def __init__(self, llm_client=None, settings=None, cache=None):
         self.llm_client = llm_client
-        self.state = {}
-        self._cache = {}
+        self.settings = {**EVALUATION_SETTINGS, **(settings or {})}
+        # Last evaluation of the calling thread, for get_results()/get_recommendations()
+        self._local = threading.local()
+        # Bounded results cache, shared with EvaluationAgent unless one is injected
+        self._cache = cache if cache is not None else get_shared_evaluation_cache()
+        # Transcript tokens available vs. sent across all evaluations (see transcript_slicer.py)
+        self._slice_stats = SliceStats()
+
+        # Worker pool shared by all evaluations, bounding LLM calls in flight
+        self._executor = None
+        self._executor_lock = threading.Lock()
 
         # Enhanced prompts for different types of evaluation criteria
         self.evaluation_prompts = {
@@ -33,6 +140,16 @@ class EnhancedEvaluationAgent:
             'general': self._get_general_prompt()
         }
 
+        # Label and key instruction per category for batched (one prompt per category) evaluation
+        self.batch_guidance = {
+            'communication': ("COMMUNICATION", "Évaluez uniquement ce qui est explicitement présent dans la conversation. Ne supposez rien."),
+            'anamnese': ("ANAMNÈSE", "Chaque point doit être explicitement abordé par une question de l'étudiant. Une réponse spontanée du patient ne compte pas."),
+            'examen_physique': ("EXAMEN PHYSIQUE", "Dans un ECOS simulé par chat, l'étudiant doit VERBALISER ses intentions d'examen. Évaluez ce qu'il a dit vouloir examiner."),
+            'diagnostic': ("RAISONNEMENT DIAGNOSTIQUE", "Comparez le diagnostic proposé par l'étudiant au diagnostic attendu. Un diagnostic approchant ou un synonyme acceptable compte comme correct."),
+            'traitement': ("PRISE EN CHARGE THÉRAPEUTIQUE", "Évaluez uniquement ce qui a été explicitement dit dans la conversation."),
+            'general': ("GÉNÉRAL", "Ne supposez rien. Ne donnez pas le bénéfice du doute. Évaluez factuellement.")
+        }
+
     def _get_communication_prompt(self):
         return """Vous êtes un évaluateur ECOS/OSCE expérimenté. Analysez cette consultation médicale simulée.
 
@@ -172,80 +289,128 @@ Ne supposez rien. Ne donnez pas le bénéfice du doute. Évaluez factuellement.
 Répondez STRICTEMENT au format suivant :
 OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élément concret ou son absence]"""
 
-    def evaluate_conversation(self, conversation, case_data):
-        """Main entry point to evaluate a conversation with enhanced LLM analysis"""
+    def _get_batch_prompt(self):
+        return """Vous êtes un évaluateur ECOS/OSCE expérimenté. Analysez cette consultation médicale simulée.
+
+CRITÈRES À ÉVALUER ({category_label}) :
+{numbered_criteria}
+
+TRANSCRIPTION DE LA CONSULTATION :
+{conversation_text}
+{diagnosis_section}
+Évaluez STRICTEMENT et séparément chaque critère numéroté, en vous basant uniquement sur ce qui est explicitement présent dans la conversation.
+
+IMPORTANT : {category_guidance}
+
+Répondez avec exactement une ligne par critère, dans l'ordre de la liste, STRICTEMENT au format suivant :
+1. OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase]
+2. OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase]
+..."""
+
+    def evaluate_conversation(self, conversation, case_data, known_verdicts=None, strategy=None):
+        """Main entry point to evaluate a conversation with enhanced LLM analysis.
+
+        `known_verdicts` ({checklist index: verdict}, see incremental_evaluation.py)
+        are reused as-is; only the other items are sent to the LLM. `strategy`
+        (one of EVALUATION_STRATEGIES or 'patterns') overrides the configured one.
+        """
         logger.info(f"Enhanced evaluation for case {case_data.get('case_number')}")
 
-        # Create a cache key based on the conversation
-        cache_key = self._create_cache_key(conversation)
+        # Cache key covers the case, its checklist version, the model and the transcript
+        cache_enabled = self.settings.get('cache_enabled', self.settings.get('enable_cache', True))
+        cache_key = self._create_cache_key(conversation, case_data, strategy)
 
         # Check if we have a cached result
-        if cache_key in self._cache:
-            logger.info("Using cached evaluation results")
-            return self._cache[cache_key]
-
-        # Initialize state for this evaluation
-        self.state = {
-            "conversation": conversation,
-            "case_data": case_data,
-            "checklist": case_data.get('evaluation_checklist', []),
-            "results": {},
-            "evaluation_complete": False
-        }
+        if cache_enabled:
+            cached_results = self._cache.get(cache_key)
+            if cached_results is not None:
+                logger.info("Using cached evaluation results")
+                return cached_results
 
-        # Run the enhanced evaluation
-        self._run_enhanced_evaluation()
+        # Per-call state: nothing about this evaluation is stored on the agent
+        ctx = EvaluationContext(conversation, case_data, known_verdicts, strategy)
 
-        # Cache the results
-        self._cache[cache_key] = self.state["results"]
+        # Run the enhanced evaluation
+        self._run_enhanced_evaluation(ctx)
+        ctx.results.setdefault('recommendations', ctx.recommendations)
+        self._local.context = ctx
+
+        # Cache the results (not when criteria errored, so a retry can succeed, nor
+        # when the evaluation model fell back midway, so the key names the grader)
+        if cache_enabled and not ctx.evaluation_failed and not has_assessment_errors(ctx.results) \
+                and cache_key == self._create_cache_key(conversation, case_data, strategy):
+            self._cache.put(cache_key, ctx.results)
+
+        return ctx.results
+
+    def assess_criteria(self, conversation, case_data, indexes):
+        """Verdicts {checklist index: verdict} of some items of the case's checklist.
+
+        Scores only the items at `indexes` against `conversation`, on the shared
+        worker pool, without caching (see incremental_evaluation.py). Items that
+        could not be assessed get an ASSESSMENT_ERROR_PREFIXES justification.
+        Returns {} without an LLM client or when the conversation is too short
+        for LLM evaluation.
+        """
+        if not self.llm_client or not indexes:
+            return {}
+        ctx = EvaluationContext(conversation, case_data)
+        self._prepare_transcript(ctx)
+        if not self._has_substantial_conversation(ctx):
+            return {}
+
+        items = [ctx.checklist[index] for index in indexes]
+        self._evaluate_criteria_concurrently(items, ctx.transcript_index, case_data)
+        return {
+            index: {'completed': item['completed'], 'partial': item.get('partial', False),
+                    'justification': item['justification']}
+            for index, item in zip(indexes, items)
+        }
 
-        return self.state["results"]
+    def criterion_category(self, item):
+        """Prompt template key of a checklist item's category ('general' if unknown)"""
+        return self._category_key(item.get('category', 'general').lower())
 
-    def _create_cache_key(self, conversation):
-        """Create a unique key for caching based on conversation content"""
-        doctor_messages = [msg.get('content', '') for msg in conversation if msg.get('role') == 'human']
-        return hash(tuple(doctor_messages))
+    def _create_cache_key(self, conversation, case_data, strategy=None):
+        """Create a unique key for caching based on case, checklist, model, transcript and imposed strategy"""
+        model = evaluation_model(self.llm_client)
+        namespace = f'enhanced:{strategy}' if strategy else 'enhanced'
+        return make_evaluation_key(namespace, case_data, conversation, model)
 
-    def _run_enhanced_evaluation(self):
+    def _run_enhanced_evaluation(self, ctx):
         """Enhanced evaluation loop with LLM-based analysis"""
         try:
             # Step 1: Prepare conversation transcript
-            self._prepare_transcript()
+            self._prepare_transcript(ctx)
 
             # Step 2: Enhanced LLM evaluation for each checklist item
-            if self.llm_client and self._has_substantial_conversation():
-                self._evaluate_with_enhanced_llm()
+            if ctx.strategy != 'patterns' and self.llm_client and self._has_substantial_conversation(ctx):
+                self._evaluate_with_enhanced_llm(ctx)
             else:
-                self._evaluate_with_patterns()
+                self._evaluate_with_patterns(ctx)
 
             # Step 3: Generate smart recommendations
-            self._generate_enhanced_recommendations()
+            self._generate_enhanced_recommendations(ctx)
 
             # Step 4: Generate comprehensive feedback
-            self._generate_enhanced_feedback()
+            self._generate_enhanced_feedback(ctx)
 
-            self.state["evaluation_complete"] = True
+            ctx.evaluation_complete = True
             logger.info("Enhanced evaluation completed successfully")
 
         except Exception as e:
             logger.error(f"Error during enhanced evaluation: {str(e)}")
-            self._fallback_evaluation()
+            self._fallback_evaluation(ctx)
 
-    def _prepare_transcript(self):
+    def _prepare_transcript(self, ctx):
         """Prepare conversation transcript for analysis"""
-        transcript = []
-        for msg in self.state.get("conversation", []):
-            if msg.get('role') != 'system':
-                role = "Étudiant (médecin)" if msg.get('role') == 'human' else "Patient"
-                content = msg.get('content', '')
-                transcript.append(f"{role}: {content}")
-
-        self.state["transcript"] = "\n\n".join(transcript)
-        self.state["conversation_analysis"] = self._analyze_conversation_structure()
+        # The index splits the transcript into turns for per-criterion slices
+        ctx.transcript_index = TranscriptIndex(ctx.conversation)
+        ctx.transcript = ctx.transcript_index.text
+        ctx.conversation_analysis = self._analyze_conversation_structure(ctx.conversation)
 
-    def _analyze_conversation_structure(self):
+    def _analyze_conversation_structure(self, conversation):
         """Analyze conversation structure for patterns"""
-        conversation = self.state.get("conversation", [])
         doctor_messages = [msg for msg in conversation if msg.get('role') == 'human']
 
         analysis = {
@@ -268,40 +433,20 @@ OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élém
             analysis["avg_message_length"] = analysis["total_words"] / len(doctor_messages)
 
             for msg in doctor_messages:
-                content = msg.get('content', '').lower()
+                content = msg.get('content', '')
+                cues = _STRUCTURE_MATCHER.labels(content)
                 analysis["question_count"] += content.count('?')
 
-                # Check for open-ended questions
-                if any(q in content for q in ['comment', 'décrivez', 'parlez-moi', 'racontez', 'expliquez']):
+                # Open-ended questions are counted per message, the other cues just need to appear once
+                if 'open_question' in cues:
                     analysis["open_question_count"] += 1
-
-                # Check for greeting
-                if any(word in content for word in ['bonjour', 'bonsoir', 'salut']):
-                    analysis["has_greeting"] = True
-
-                # Check for self-presentation
-                if any(phrase in content for phrase in ['je suis', 'je m\'appelle', 'docteur', 'dr ', 'interne', 'médecin']):
-                    analysis["has_presentation"] = True
-
-                # Check for empathy
-                if any(phrase in content for phrase in ['je comprends', 'ne vous inquiétez', 'rassurez', 'je vois', 'ça doit être']):
-                    analysis["has_empathy"] = True
-
-                # Check for closing
-                if any(word in content for word in ['au revoir', 'bonne journée', 'prenez soin', 'bon rétablissement', 'n\'hésitez pas']):
-                    analysis["has_closing"] = True
-
-                # Check for physical exam mentions
-                if any(word in content for word in ['examiner', 'ausculter', 'palper', 'inspecter', 'tension', 'température', 'pouls']):
-                    analysis["has_physical_exam"] = True
-
-                # Check for diagnosis
-                if any(word in content for word in ['diagnostic', 'vous avez', 'il s\'agit', 'je pense que', 'hypothèse']):
-                    analysis["has_diagnosis"] = True
-
-                # Check for treatment
-                if any(word in content for word in ['traitement', 'médicament', 'prescription', 'prescrire', 'suivi', 'contrôle']):
-                    analysis["has_treatment"] = True
+                analysis["has_greeting"] |= 'greeting' in cues
+                analysis["has_presentation"] |= 'presentation' in cues
+                analysis["has_empathy"] |= 'empathy' in cues
+                analysis["has_closing"] |= 'closing' in cues
+                analysis["has_physical_exam"] |= 'physical_exam' in cues
+                analysis["has_diagnosis"] |= 'diagnosis' in cues
+                analysis["has_treatment"] |= 'treatment' in cues
 
             # Assess communication quality
             score = 0
@@ -321,38 +466,268 @@ OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élém
 
         return analysis
 
-    def _has_substantial_conversation(self):
+    def _has_substantial_conversation(self, ctx):
         """Check if conversation is substantial enough for LLM evaluation"""
-        analysis = self.state.get("conversation_analysis", {})
+        analysis = ctx.conversation_analysis
         return (analysis.get("message_count", 0) >= 3 and
                 analysis.get("total_words", 0) >= 20)
 
-    def _evaluate_with_enhanced_llm(self):
+    def _evaluate_with_enhanced_llm(self, ctx):
         """Enhanced LLM evaluation with specific prompts for each checklist item"""
         logger.info("Starting enhanced LLM evaluation")
 
-        transcript = self.state.get("transcript", "")
-        checklist = self.state.get("checklist", [])
-        case_data = self.state.get("case_data", {})
+        transcript = ctx.transcript_index
+        checklist = ctx.checklist
+        case_data = ctx.case_data
 
         if not checklist:
-            self._set_empty_results()
+            self._set_empty_results(ctx)
             return
 
-        # Evaluate each checklist item individually
-        for item in checklist:
+        # Reuse verdicts established earlier (incremental evaluation); evaluate the rest
+        for index, verdict in ctx.known_verdicts.items():
+            if index < len(checklist):
+                self._apply_criterion_result(checklist[index], verdict)
+        pending = [item for index, item in enumerate(checklist) if index not in ctx.known_verdicts]
+        if len(pending) < len(checklist):
+            logger.info(f"Reusing {len(checklist) - len(pending)} known verdicts, evaluating {len(pending)} criteria")
+
+        pending = self._prescreen_criteria(pending, ctx.conversation)
+
+        strategy = self._resolve_strategy(case_data, ctx.strategy)
+        logger.info(f"Evaluation strategy: {strategy}")
+
+        if strategy == 'batched':
+            self._evaluate_criteria_batched(pending, transcript, case_data)
+        elif strategy == 'concurrent' and len(pending) > 1:
+            self._evaluate_criteria_concurrently(pending, transcript, case_data)
+        else:
+            # Evaluate each checklist item individually
+            for item in pending:
+                try:
+                    self._evaluate_single_criterion(item, transcript, case_data)
+                except Exception as e:
+                    logger.error(f"Error evaluating criterion '{item.get('description', 'Unknown')}': {str(e)}")
+                    item['completed'] = False
+                    item['justification'] = f"Erreur lors de l'évaluation: {str(e)}"
+
+        savings = transcript.stats.snapshot()
+        if savings['sliced_prompts']:
+            logger.info(f"Transcript slicing: sent {savings['sent_tokens']}/{savings['full_tokens']} transcript tokens "
+                        f"({savings['saved_ratio']:.0%} saved over {savings['prompts']} prompts)")
+        self._slice_stats.merge(transcript.stats)
+
+        # Calculate final scores
+        ctx.results = self._calculate_final_scores(checklist)
+
+    def _prescreen_criteria(self, items, conversation):
+        """Mark NON, without an LLM call, the items nothing in the conversation relates to.
+
+        An item is skipped only if neither its category's keywords nor any of its own
+        description words occur anywhere in the conversation. Returns the items
+        that still need the LLM.
+        """
+        if not items or not self.settings.get('keyword_prescreen', True):
+            return items
+
+        text = " ".join(msg.get('content', '') for msg in conversation if msg.get('role') in ('human', 'assistant'))
+        categories_found = _CATEGORY_MATCHER.labels(text)
+        items_found = KeywordMatcher(
+            (stem, index)
+            for index, item in enumerate(items)
+            for stem in description_stems(item.get('description', ''))
+        ).labels(text)
+
+        remaining = []
+        for index, item in enumerate(items):
+            category = self._category_key(item.get('category', 'general').lower())
+            if category == 'general' or category in categories_found or index in items_found:
+                remaining.append(item)
+            else:
+                self._apply_criterion_result(item, {
+                    'completed': False,
+                    'partial': False,
+                    'justification': "Aucun élément de la conversation ne se rapporte à ce critère."
+                })
+
+        if len(remaining) < len(items):
+            logger.info(f"Keyword pre-screen: {len(items) - len(remaining)} criteria marked NON without LLM call")
+        return remaining
+
+    def _resolve_strategy(self, case_data, imposed=None):
+        """Pick the evaluation strategy: an imposed one, else the case's own setting, else the global one"""
+        for strategy in (imposed, case_data.get('evaluation_strategy'), self.settings.get('evaluation_strategy')):
+            if strategy in EVALUATION_STRATEGIES:
+                return strategy
+        return 'sequential'
+
+    def _get_executor(self):
+        """Lazily create the worker pool used for concurrent criterion evaluation"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_concurrent_criteria(),
+                    thread_name_prefix='criterion-eval'
+                )
+            return self._executor
+
+    def _max_concurrent_criteria(self):
+        return max(1, int(self.settings.get('max_concurrent_criteria', 5)))
+
+    def _evaluate_criteria_concurrently(self, checklist, transcript, case_data):
+        """Evaluate all checklist items over the worker pool, keeping checklist order"""
+        executor = self._get_executor()
+        timeout, queue_timeout = self._criterion_timeouts()
+
+        logger.info(f"Evaluating {len(checklist)} criteria concurrently (max {self._max_concurrent_criteria()} in flight)")
+        started_at = time.monotonic()
+        tasks = [
+            _TimedTask(executor, self._assess_criterion, item, transcript, case_data)
+            for item in checklist
+        ]
+
+        # Results are collected in submission order so the checklist keeps its order.
+        # Each item's timeout runs from when a worker starts it (see _TimedTask).
+        for item, task in zip(checklist, tasks):
             try:
-                self._evaluate_single_criterion(item, transcript, case_data)
+                result = task.result(timeout, queue_timeout)
+            except FutureTimeoutError:
+                logger.error(f"Timed out evaluating criterion '{item.get('description', 'Unknown')}' after {timeout:.0f}s")
+                result = {
+                    'completed': False,
+                    'partial': False,
+                    'justification': "Évaluation impossible: délai dépassé"
+                }
             except Exception as e:
                 logger.error(f"Error evaluating criterion '{item.get('description', 'Unknown')}': {str(e)}")
-                item['completed'] = False
-                item['justification'] = f"Erreur lors de l'évaluation: {str(e)}"
+                result = {
+                    'completed': False,
+                    'partial': False,
+                    'justification': f"Erreur lors de l'évaluation: {str(e)}"
+                }
+            self._apply_criterion_result(item, result)
+
+        logger.info(f"Concurrent criterion evaluation finished in {time.monotonic() - started_at:.2f}s")
+
+    def _criterion_timeouts(self):
+        """(seconds a criterion may run, seconds it may wait for a worker)"""
+        return (float(self.settings.get('criterion_timeout_seconds', 45)),
+                float(self.settings.get('criterion_queue_timeout_seconds', 300)))
+
+    def _evaluate_criteria_batched(self, checklist, transcript, case_data):
+        """Evaluate the checklist with one prompt per category instead of one per item.
+
+        Items whose verdict is missing from a group response are re-asked individually.
+        """
+        groups = {}
+        for index, item in enumerate(checklist):
+            template_key = self._category_key(item.get('category', 'general').lower())
+            groups.setdefault(template_key, []).append(index)
+
+        executor = self._get_executor()
+        timeout, queue_timeout = self._criterion_timeouts()
+
+        logger.info(f"Evaluating {len(checklist)} criteria in {len(groups)} batched prompts")
+        started_at = time.monotonic()
+        tasks = {
+            template_key: _TimedTask(
+                executor, self._assess_criteria_group, template_key,
+                [checklist[i] for i in indexes], transcript, case_data
+            )
+            for template_key, indexes in groups.items()
+        }
 
-        # Calculate final scores
-        self._calculate_final_scores(checklist)
+        missing = []
+        for template_key, indexes in groups.items():
+            try:
+                verdicts = tasks[template_key].result(timeout, queue_timeout)
+            except FutureTimeoutError:
+                logger.error(f"Timed out evaluating '{template_key}' criteria group after {timeout:.0f}s")
+                verdicts = {}
+            except Exception as e:
+                logger.error(f"Error evaluating '{template_key}' criteria group: {str(e)}")
+                verdicts = {}
+
+            for position, index in enumerate(indexes):
+                if position in verdicts:
+                    self._apply_criterion_result(checklist[index], verdicts[position])
+                else:
+                    missing.append(checklist[index])
+
+        if missing:
+            logger.warning(f"{len(missing)} criteria missing from batched responses, re-asking individually")
+            self._evaluate_criteria_concurrently(missing, transcript, case_data)
+
+        logger.info(f"Batched criterion evaluation finished in {time.monotonic() - started_at:.2f}s")
+
+    def _assess_criteria_group(self, template_key, items, transcript, case_data):
+        """Ask for the verdicts of several same-category criteria in a single prompt.
+
+        Returns a dict mapping each item's position in `items` to its verdict; positions
+        the response did not cover are absent.
+        """
+        if len(items) == 1:
+            return {0: self._assess_criterion(items[0], transcript, case_data)}
+
+        category_label, category_guidance = self.batch_guidance[template_key]
+        diagnosis_section = ""
+        if template_key == 'diagnostic':
+            diagnosis_section = f"\nDIAGNOSTIC ATTENDU : {case_data.get('diagnosis', 'Non spécifié')}\n"
+
+        prompt = self._get_batch_prompt().format(
+            category_label=category_label,
+            numbered_criteria="\n".join(f"{i}. {item.get('description', '')}" for i, item in enumerate(items, 1)),
+            conversation_text=str(transcript),
+            diagnosis_section=diagnosis_section,
+            category_guidance=category_guidance
+        )
+
+        tokens_per_item = int(self.settings.get('batch_tokens_per_criterion', 80))
+        try:
+            response = self.llm_client.invoke(
+                [HumanMessage(content=prompt)],
+                profile='evaluation',
+                max_tokens=tokens_per_item * len(items),
+                cache=self.settings.get('cache_enabled', True)
+            )
+        except Exception as e:
+            logger.error(f"Batched LLM evaluation failed for '{template_key}': {str(e)}")
+            return {}
+
+        verdicts = self._parse_batch_response(response.content, len(items))
+        logger.info(f"Batched '{template_key}': {len(verdicts)}/{len(items)} verdicts parsed")
+        return verdicts
+
+    def _parse_batch_response(self, response_text, item_count):
+        """Parse numbered OUI/NON/PARTIELLEMENT lines into {position: verdict}"""
+        verdicts = {}
+        for line in response_text.splitlines():
+            match = _BATCH_VERDICT_LINE.match(line)
+            if not match:
+                continue
+            position = int(match.group(1)) - 1
+            if position < 0 or position >= item_count or position in verdicts:
+                continue
+            justification = match.group(3).strip().strip('*').strip() or "Aucune justification fournie"
+            verdicts[position] = self._parse_evaluation_response(f"{match.group(2).upper()} - {justification}")
+        return verdicts
 
     def _evaluate_single_criterion(self, item, transcript, case_data):
         """Evaluate a single checklist criterion using targeted LLM prompts"""
+        result = self._assess_criterion(item, transcript, case_data)
+        self._apply_criterion_result(item, result)
+
+    def _apply_criterion_result(self, item, result):
+        """Copy a criterion verdict onto its checklist item"""
+        item['completed'] = result['completed']
+        item['partial'] = result.get('partial', False)
+        item['justification'] = result['justification']
+
+    def _assess_criterion(self, item, transcript, case_data):
+        """Ask the LLM for a verdict on one criterion without touching the item.
+
+        Safe to run from worker threads: the verdict is returned, never written back.
+        """
         criterion_description = item.get('description', '')
         category = item.get('category', 'general').lower()
 
@@ -362,7 +737,7 @@ OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élém
         # Prepare the prompt
         prompt = prompt_template.format(
             criterion_description=criterion_description,
-            conversation_text=transcript,
+            conversation_text=self._criterion_transcript(item, transcript),
             expected_diagnosis=case_data.get('diagnosis', 'Non spécifié')
         )
 
@@ -370,26 +745,48 @@ OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élém
             # Get LLM response
             response = self.llm_client.invoke(
                 [HumanMessage(content=prompt)],
-                {"max_tokens": 150, "temperature": 0.1}
+                profile='evaluation',
+                max_tokens=self.settings.get('max_tokens_per_evaluation', 150),
+                temperature=self.settings.get('evaluation_temperature', 0.1),
+                cache=self.settings.get('cache_enabled', True)
             )
 
             # Parse the response
             result = self._parse_evaluation_response(response.content)
 
-            # Update the item
-            item['completed'] = result['completed']
-            item['partial'] = result.get('partial', False)
-            item['justification'] = result['justification']
-
             logger.info(f"Evaluated '{criterion_description}': completed={result['completed']}, partial={result.get('partial', False)}")
+            return result
 
         except Exception as e:
             logger.error(f"LLM evaluation failed for '{criterion_description}': {str(e)}")
-            item['completed'] = False
-            item['justification'] = f"Évaluation impossible: {str(e)}"
+            return {
+                'completed': False,
+                'partial': False,
+                'justification': f"Évaluation impossible: {str(e)}"
+            }
+
+    def _criterion_transcript(self, item, transcript):
+        """The transcript text to send for one criterion: a relevance slice when enabled"""
+        if not isinstance(transcript, TranscriptIndex) or not self.settings.get('transcript_slicing', True):
+            return str(transcript)
+
+        category_key = self._category_key(item.get('category', 'general').lower())
+        if category_key in self.settings.get('slice_full_categories', ()):
+            return transcript.full()
+
+        return transcript.slice(
+            item.get('description', ''),
+            boost_keywords=FALLBACK_KEYWORDS.get(category_key, ()),
+            top_k=int(self.settings.get('slice_top_k', 4)),
+            token_budget=int(self.settings.get('slice_token_budget', 1200))
+        )
 
     def _select_prompt_template(self, category):
         """Select the appropriate prompt template based on category"""
+        return self.evaluation_prompts[self._category_key(category)]
+
+    def _category_key(self, category):
+        """Map a checklist category to its prompt template key"""
         category_mapping = {
             'communication': 'communication',
             'anamnèse': 'anamnese',
@@ -404,9 +801,9 @@ OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élém
 
         for key, template_key in category_mapping.items():
             if key in category:
-                return self.evaluation_prompts[template_key]
+                return template_key
 
-        return self.evaluation_prompts['general']
+        return 'general'
 
     def _parse_evaluation_response(self, response_text):
         """Parse LLM response to extract completion status and justification"""
@@ -473,40 +870,43 @@ OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élém
         earned_points = round(earned_points, 1)
         percentage = round((earned_points / total_points) * 100) if total_points > 0 else 0
 
-        self.state["results"] = {
+        return {
             'checklist': checklist,
             'points_total': total_points,
             'points_earned': earned_points,
             'percentage': percentage
         }
 
-    def _evaluate_with_patterns(self):
+    def _evaluate_with_patterns(self, ctx):
         """Fallback pattern-based evaluation"""
         logger.info("Using pattern-based fallback evaluation")
 
-        conversation = self.state.get("conversation", [])
-        checklist = self.state.get("checklist", [])
+        conversation = ctx.conversation
+        checklist = ctx.checklist
 
-        # Simple keyword matching for fallback
+        # Simple keyword matching for fallback: all item keywords in one pass over the student's text
         user_text = " ".join([msg.get('content', '') for msg in conversation if msg.get('role') == 'human'])
+        matcher = KeywordMatcher(
+            (keyword, index)
+            for index, item in enumerate(checklist)
+            for keyword in description_keywords(item.get('description', ''))
+        )
+        matched = matcher.labels(user_text)
 
-        for item in checklist:
-            description = item.get('description', '').lower()
-            keywords = [w for w in re.findall(r'\b\w{3,}\b', description) if len(w) > 3]
-
-            if keywords and any(kw.lower() in user_text.lower() for kw in keywords):
+        for index, item in enumerate(checklist):
+            if index in matched:
                 item['completed'] = True
                 item['justification'] = "Critère détecté par analyse de mots-clés"
             else:
                 item['completed'] = False
                 item['justification'] = "Critère non détecté dans la conversation"
 
-        self._calculate_final_scores(checklist)
+        ctx.results = self._calculate_final_scores(checklist)
 
-    def _generate_enhanced_recommendations(self):
+    def _generate_enhanced_recommendations(self, ctx):
         """Generate targeted OSCE recommendations based on evaluation results"""
-        checklist = self.state.get("results", {}).get('checklist', [])
-        conversation_analysis = self.state.get("conversation_analysis", {})
+        checklist = ctx.results.get('checklist', [])
+        conversation_analysis = ctx.conversation_analysis
         missed_items = [item for item in checklist if not item.get('completed', False)]
         partial_items = [item for item in checklist if item.get('partial', False)]
 
@@ -566,14 +966,14 @@ OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élém
             )
 
         # Limit to 4 most important recommendations
-        self.state["recommendations"] = recommendations[:4] if recommendations else [
+        ctx.recommendations = recommendations[:4] if recommendations else [
             "Très bonne performance ! Continuez à vous entraîner pour maintenir ce niveau en conditions d'examen."
         ]
 
-    def _generate_enhanced_feedback(self):
+    def _generate_enhanced_feedback(self, ctx):
         """Generate comprehensive OSCE feedback"""
-        results = self.state.get("results", {})
-        conversation_analysis = self.state.get("conversation_analysis", {})
+        results = ctx.results
+        conversation_analysis = ctx.conversation_analysis
         percentage = results.get('percentage', 0)
         checklist = results.get('checklist', [])
 
@@ -642,14 +1042,11 @@ OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élém
 
         feedback = base_feedback + category_feedback + comm_feedback + depth_feedback
 
-        if 'results' not in self.state:
-            self.state['results'] = {}
+        ctx.results['feedback'] = feedback
 
-        self.state['results']['feedback'] = feedback
-
-    def _set_empty_results(self):
+    def _set_empty_results(self, ctx):
         """Set empty results when no checklist is available"""
-        self.state["results"] = {
+        ctx.results = {
             'checklist': [],
             'feedback': "Pas de grille d'évaluation disponible pour ce cas.",
             'points_total': 0,
@@ -657,10 +1054,10 @@ OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élém
             'percentage': 0
         }
 
-    def _fallback_evaluation(self):
+    def _fallback_evaluation(self, ctx):
         """Fallback evaluation in case of errors"""
-        checklist = self.state.get("checklist", [])
-        self.state["results"] = {
+        checklist = ctx.checklist
+        ctx.results = {
             'checklist': [
                 {**item, 'completed': False, 'justification': "Erreur lors de l'évaluation automatique."}
                 for item in checklist
@@ -668,19 +1065,34 @@ OUI/NON/PARTIELLEMENT - [justification factuelle en une phrase, citant un élém
             'feedback': "Une erreur est survenue lors de l'évaluation. Veuillez réessayer.",
             'points_total': sum(item.get('points', 1) for item in checklist),
             'points_earned': 0,
-            'percentage': 0
+            'percentage': 0,
+            'evaluation_failed': True
         }
-        self.state["recommendations"] = ["Contactez le support technique pour résoudre le problème d'évaluation."]
+        ctx.evaluation_failed = True
+        ctx.recommendations = ["Contactez le support technique pour résoudre le problème d'évaluation."]
+
+    def _last_context(self):
+        return getattr(self._local, 'context', None)
 
     def get_recommendations(self):
-        """Get the recommendations generated during evaluation"""
-        return self.state.get("recommendations", [])
+        """Get the recommendations generated by this thread's last evaluation"""
+        ctx = self._last_context()
+        return ctx.recommendations if ctx else []
 
     def get_results(self):
-        """Get full evaluation results"""
-        return self.state.get("results", {})
+        """Get full results of this thread's last evaluation"""
+        ctx = self._last_context()
+        return ctx.results if ctx else {}
 
     def clear_cache(self):
         """Clear the evaluation cache"""
-        self._cache = {}
+        self._cache.clear()
         logger.info("Enhanced evaluation cache cleared")
+
+    def slicing_stats(self):
+        """Transcript tokens available vs. sent in criterion prompts since startup"""
+        return self._slice_stats.snapshot()
+
+    def cache_stats(self):
+        """Entries, memory and hit/miss counters of the evaluation cache"""
+        return self._cache.stats()
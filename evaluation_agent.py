@@ -5,6 +5,8 @@ import logging
 from datetime import datetime
 import tempfile
 from langchain_core.messages import HumanMessage
+from evaluation_config import EVALUATION_SETTINGS
+from evaluation_cache import get_shared_evaluation_cache, make_evaluation_key, evaluation_model
 
 # Setup logging
 logging.basicConfig(
@@ -16,24 +18,27 @@ logger = logging.getLogger(__name__)
 class EvaluationAgent:
     """Agent-based evaluation processor that assesses medical student performance in OSCE simulations"""
     
-    def __init__(self, llm_client=None):
+    def __init__(self, llm_client=None, cache=None):
         self.llm_client = llm_client
         # Initialize state
         self.state = {}
-        # Add caching
-        self._cache = {}
+        # Bounded results cache, shared with EnhancedEvaluationAgent unless one is injected
+        self._cache = cache if cache is not None else get_shared_evaluation_cache()
         
     def evaluate_conversation(self, conversation, case_data):
         """Main entry point to evaluate a conversation"""
         logger.info(f"Agent evaluating conversation for case {case_data.get('case_number')}")
         
-        # Create a cache key based on the conversation
-        cache_key = self._create_cache_key(conversation)
+        # Cache key covers the case, its checklist version, the model and the transcript
+        cache_enabled = EVALUATION_SETTINGS.get('enable_cache', True)
+        cache_key = self._create_cache_key(conversation, case_data)
         
         # Check if we have a cached result
-        if cache_key in self._cache:
-            logger.info("Using cached evaluation results")
-            return self._cache[cache_key]
+        if cache_enabled:
+            cached_results = self._cache.get(cache_key)
+            if cached_results is not None:
+                logger.info("Using cached evaluation results")
+                return cached_results
         
         # Initialize state for this evaluation
         self.state = {
@@ -49,18 +54,16 @@ class EvaluationAgent:
         # Run the agent's main evaluation loop
         self._run_evaluation_loop()
         
-        # Cache the results for future use
-        self._cache[cache_key] = self.state["results"]
+        # Cache the results for future use, unless the evaluation model fell back midway
+        if cache_enabled and cache_key == self._create_cache_key(conversation, case_data):
+            self._cache.put(cache_key, self.state["results"])
         
         # Return the final evaluation results
         return self.state["results"]
     
-    def _create_cache_key(self, conversation):
-        """Create a unique key for caching based on conversation content"""
-        # Extract the actual content for doctor messages
-        doctor_messages = [msg['content'] for msg in conversation if msg['role'] == 'human']
-        # Create a hash of the combined content
-        return hash(tuple(doctor_messages))
+    def _create_cache_key(self, conversation, case_data):
+        """Create a unique key for caching based on case, checklist, model and transcript"""
+        return make_evaluation_key('legacy', case_data, conversation, evaluation_model(self.llm_client))
     
     def _run_evaluation_loop(self):
         """Main agent loop that coordinates the evaluation process"""
@@ -269,10 +272,11 @@ Réponds au format JSON:
 """
         
         try:
-            # Using a shorter max token limit for faster response
+            # Enough output for one JSON entry per graded item (at most 15) plus the feedback
             response = self.llm_client.invoke(
                 [HumanMessage(content=prompt)],
-                {"max_tokens": 400}  # Limit token output
+                profile='evaluation',
+                max_tokens=max(400, 80 * min(len(checklist), 15) + 150)
             )
             
             # Parse JSON response
@@ -445,7 +449,8 @@ Réponds au format JSON:
             # Set a lower token limit for faster response
             response = self.llm_client.invoke(
                 [HumanMessage(content=recommendations_prompt)],
-                {"max_tokens": 250}  # Limit token output
+                profile='evaluation',
+                max_tokens=250  # Limit token output
             )
             
             # Extract recommendations from response
@@ -508,5 +513,5 @@ Réponds au format JSON:
         
     def clear_cache(self):
         """Clear the evaluation cache"""
-        self._cache = {}
+        self._cache.clear()
         logger.info("Evaluation cache cleared")
\ No newline at end of file
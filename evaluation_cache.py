@@ -0,0 +1,147 @@
+"""
+Bounded cache of evaluation results, shared by the evaluation agents.
+
+Entries are keyed by the case, a hash of its checklist (so editing the grid
+invalidates old results), the model and the full transcript. They are evicted
+least-recently-used first once `max_entries` or `max_bytes` is exceeded, and
+expire after `ttl_seconds`.
+"""
+
+import copy
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from evaluation_config import EVALUATION_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Keys the agents write onto checklist items while scoring; not part of the grid itself
+_RESULT_KEYS = frozenset({'completed', 'partial', 'justification'})
+
+
+def checklist_version(checklist):
+    """Short hash of a checklist's content, ignoring per-evaluation result fields"""
+    grid = [
+        {k: v for k, v in item.items() if k not in _RESULT_KEYS} if isinstance(item, dict) else item
+        for item in (checklist or [])
+    ]
+    payload = json.dumps(grid, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def evaluation_model(llm_client):
+    """Model grading evaluations for `llm_client`, for the cache key"""
+    if hasattr(llm_client, 'model_for'):
+        return llm_client.model_for('evaluation')
+    return getattr(llm_client, 'active_model', None) or getattr(llm_client, 'model_name', None)
+
+
+def make_evaluation_key(namespace, case_data, conversation, model=None):
+    """Cache key from the evaluator, case number, checklist version, model and transcript"""
+    transcript = [
+        [msg.get('role', ''), msg.get('content', '')] if isinstance(msg, dict) else ['', str(msg)]
+        for msg in conversation
+    ]
+    payload = json.dumps({
+        'namespace': namespace,
+        'case_number': str(case_data.get('case_number', '')),
+        'checklist': checklist_version(case_data.get('evaluation_checklist', [])),
+        'model': model,
+        'transcript': transcript,
+    }, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class EvaluationCache:
+    """Thread-safe LRU + TTL cache with approximate memory accounting"""
+
+    def __init__(self, max_entries=100, ttl_seconds=3600, max_bytes=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (results, stored_at, size)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _sizeof(results):
+        return len(json.dumps(results, ensure_ascii=False, default=str).encode('utf-8'))
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        """A copy of the cached results for `key`, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[1] > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            results = entry[0]
+        return copy.deepcopy(results)
+
+    def put(self, key, results):
+        results = copy.deepcopy(results)
+        size = self._sizeof(results)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (results, self.clock(), size)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_evaluation_cache():
+    """Process-wide cache used by EvaluationAgent and EnhancedEvaluationAgent"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = EvaluationCache(
+                max_entries=EVALUATION_SETTINGS.get('cache_size_limit', 100),
+                ttl_seconds=EVALUATION_SETTINGS.get('cache_ttl_seconds', 3600),
+                max_bytes=EVALUATION_SETTINGS.get('cache_max_bytes')
+            )
+        return _shared_cache
@@ -11,9 +11,31 @@ EVALUATION_SETTINGS = {
     'temperature': 0.1,
     'timeout_seconds': 30,
     
-    # Caching
+    # Strategy: 'concurrent' fans checklist items out over a worker pool,
+    # 'sequential' evaluates them one after the other, 'batched' sends one
+    # prompt per category. A case's own evaluation_strategy takes precedence.
+    'evaluation_strategy': 'concurrent',
+    'max_concurrent_criteria': 5,
+    'criterion_timeout_seconds': 45,
+    # Time a criterion may wait for a free worker while other evaluations use the pool
+    'criterion_queue_timeout_seconds': 300,
+    'batch_tokens_per_criterion': 80,
+    
+    # Caching (shared LRU cache of evaluation results, see evaluation_cache.py)
     'enable_cache': True,
     'cache_size_limit': 100,
+    'cache_ttl_seconds': 3600,
+    'cache_max_bytes': 20 * 1024 * 1024,
+    
+    # Skip the LLM for criteria whose keywords appear nowhere in the conversation
+    'keyword_prescreen': True,
+    
+    # Per-criterion prompts carry only the relevant turns of long transcripts
+    # (see transcript_slicer.py); communication is judged on the whole exchange
+    'transcript_slicing': True,
+    'slice_top_k': 4,
+    'slice_token_budget': 1200,
+    'slice_full_categories': ('communication',),
     
     # Fallback settings
     'use_pattern_fallback': True,
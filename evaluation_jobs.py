@@ -0,0 +1,366 @@
+"""
+Background evaluation of finished consultations.
+
+/end_chat and /student/competition/complete-station enqueue an EvaluationJob
+and return immediately; a small in-process worker pool runs the (multi-call)
+LLM evaluation and writes the outcome where the synchronous code used to:
+a StudentPerformance for practice consultations, the station assignment's
+performance_data for competitions. Clients fetch the result with a
+long-poll on /evaluation/<job_id>.
+
+Jobs are persisted, so they survive a restart: on startup, queued jobs are
+rescheduled and running jobs whose worker process is gone (or whose lease
+expired) are requeued. Claiming a job is an atomic status update, so several
+processes can share the table without running a job twice.
+
+An evaluation that failed, or in which some criteria could not be
+assessed (LLM error, timeout), is retried with backoff. Once out of
+attempts, partial results are kept and flagged 'incomplete'.
+
+Practice evaluations that the evaluation policy degraded to a cheaper tier
+(see evaluation_policy.py), or that ended incomplete, get an 'upgrade' job.
+It re-scores the stored performance at the full tier once the load allows
+it. These jobs do not count towards the queue depth the policy looks at.
+"""
+
+import os
+import uuid
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from models import db, EvaluationJob, StudentPerformance, StudentStationAssignment
+from evaluation_policy import EvaluationDeferred
+from enhanced_evaluation_agent import ASSESSMENT_ERROR_PREFIXES, has_assessment_errors
+
+logger = logging.getLogger(__name__)
+
+
+def _worker_id():
+    # Computed on demand: a forking server gives each worker its own pid
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class EvaluationJobQueue:
+    """Persistent evaluation job queue backed by the evaluation_jobs table"""
+
+    def __init__(self, app, evaluate, max_workers=2, max_attempts=3,
+                 backoff_seconds=10, lease_seconds=600, upgrade_delay_seconds=None):
+        self.app = app
+        self.evaluate = evaluate
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.lease_seconds = lease_seconds
+        # None disables the re-scoring of degraded practice evaluations
+        self.upgrade_delay_seconds = upgrade_delay_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='evaluation-job')
+        self._events = {}
+        self._events_lock = threading.Lock()
+
+    # ------------------------------------------------------------------ #
+    # Producer side
+    # ------------------------------------------------------------------ #
+
+    def enqueue(self, kind, case_number, conversation, student_id=None, payload=None, delay_seconds=0,
+                conversation_id=None):
+        """Persist a job and schedule it (after `delay_seconds`); returns the job id.
+
+        Pass a stored `conversation_id` with `conversation=None` to reference the
+        transcript in the conversation store instead of copying it.
+        """
+        job = EvaluationJob(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            status='queued',
+            student_id=student_id,
+            case_number=str(case_number),
+            max_attempts=self.max_attempts,
+            conversation_id=conversation_id
+        )
+        if delay_seconds:
+            job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay_seconds)
+        if conversation is not None:
+            job.conversation = conversation
+        job.payload = payload
+        db.session.add(job)
+        db.session.commit()
+
+        logger.info(f"Enqueued {kind} evaluation job {job.id} for case {case_number}")
+        self._schedule(job.id, delay_seconds)
+        return job.id
+
+    def depth(self):
+        """Evaluations waiting or running, upgrades excluded (read by the evaluation policy)"""
+        return EvaluationJob.query.filter(
+            EvaluationJob.status.in_(('queued', 'running')),
+            EvaluationJob.kind != 'upgrade'
+        ).count()
+
+    def wait(self, job_id, timeout):
+        """Long-poll: return the job once it is finished or `timeout` seconds have passed"""
+        deadline = datetime.utcnow() + timedelta(seconds=timeout)
+        event = None
+        try:
+            while True:
+                db.session.expire_all()
+                job = db.session.get(EvaluationJob, job_id)
+                if job is None or job.is_finished:
+                    return job
+                remaining = (deadline - datetime.utcnow()).total_seconds()
+                if remaining <= 0:
+                    return job
+                if event is None:
+                    # Registered only for unfinished jobs, then re-checked in case
+                    # the job finished in between
+                    event = self._event(job_id)
+                    continue
+                # Woken early when this process finishes the job; the re-check
+                # every second covers jobs run by another process
+                event.wait(min(remaining, 1.0))
+        finally:
+            if event is not None:
+                self._release_event(job_id)
+
+    def recover(self):
+        """Reschedule persisted jobs after a (re)start"""
+        with self.app.app_context():
+            now = datetime.utcnow()
+            requeued = 0
+            for job in EvaluationJob.query.filter_by(status='running').all():
+                if self._is_orphaned(job, now):
+                    job.status = 'queued'
+                    job.worker_id = None
+                    requeued += 1
+            db.session.commit()
+
+            queued = EvaluationJob.query.filter_by(status='queued').all()
+            for job in queued:
+                delay = (job.next_attempt_at - now).total_seconds() if job.next_attempt_at else 0
+                self._schedule(job.id, max(0.0, delay))
+
+            if queued:
+                logger.info(f"Recovered {len(queued)} evaluation jobs ({requeued} interrupted while running)")
+
+    # ------------------------------------------------------------------ #
+    # Worker side
+    # ------------------------------------------------------------------ #
+
+    def _event(self, job_id):
+        """Event set when job_id finishes; each caller must _release_event() it"""
+        with self._events_lock:
+            entry = self._events.setdefault(job_id, [threading.Event(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _release_event(self, job_id):
+        """Drop a waiter; the event is forgotten with its last waiter"""
+        with self._events_lock:
+            entry = self._events.get(job_id)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self._events[job_id]
+
+    def _notify(self, job_id):
+        with self._events_lock:
+            entry = self._events.get(job_id)
+        if entry is not None:
+            entry[0].set()
+
+    def _schedule(self, job_id, delay=0.0):
+        if delay > 0:
+            timer = threading.Timer(delay, self._schedule, args=(job_id,))
+            timer.daemon = True
+            timer.start()
+            return
+        self._executor.submit(self._run, job_id)
+
+    def _is_orphaned(self, job, now):
+        """A running job is orphaned if its process is gone or its lease has expired"""
+        host, _, pid = (job.worker_id or '').rpartition(':')
+        if host == socket.gethostname() and pid.isdigit():
+            # Our own pid at startup means a previous process reused it (e.g. pid 1 in a container)
+            if int(pid) == os.getpid() or not _pid_alive(int(pid)):
+                return True
+        started_at = job.started_at or job.created_at or now
+        return (now - started_at).total_seconds() > self.lease_seconds
+
+    def _claim(self, job_id):
+        """Atomically move a queued job to running; False if someone else got it"""
+        claimed = EvaluationJob.query.filter(
+            EvaluationJob.id == job_id,
+            EvaluationJob.status == 'queued'
+        ).update({
+            'status': 'running',
+            'attempts': EvaluationJob.attempts + 1,
+            'started_at': datetime.utcnow(),
+            'worker_id': _worker_id()
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                if not self._claim(job_id):
+                    return
+                job = db.session.get(EvaluationJob, job_id)
+                logger.info(f"Running evaluation job {job_id} (attempt {job.attempts}/{job.max_attempts})")
+
+                results = self.evaluate(
+                    job.conversation, job.case_number,
+                    conversation_id=job.conversation_id,
+                    kind=job.kind
+                )
+                if has_assessment_errors(results):
+                    if job.attempts < job.max_attempts:
+                        raise RuntimeError(self._assessment_error(results))
+                    if not results.get('evaluation_failed'):
+                        # Out of attempts: keep the verdicts obtained, flagged as incomplete
+                        results = {**results, 'incomplete': True}
+
+                self._complete(job, results)
+            except EvaluationDeferred as e:
+                db.session.rollback()
+                self._defer(job_id, e)
+            except Exception as e:
+                db.session.rollback()
+                self._handle_failure(job_id, e)
+            finally:
+                db.session.remove()
+
+    def _complete(self, job, results):
+        """Write the results where the synchronous flow used to, then mark the job completed"""
+        payload = job.payload
+
+        if job.kind == 'practice' and job.student_id:
+            performance = StudentPerformance(
+                student_id=job.student_id,
+                case_number=job.case_number,
+                evaluation_results=results,
+                percentage_score=results.get('percentage', 0),
+                points_earned=results.get('points_earned', 0),
+                points_total=results.get('points_total', 0),
+                recommendations=results.get('recommendations', []),
+                consultation_duration=payload.get('consultation_duration')
+            )
+            if job.conversation_id:
+                performance.conversation_id = job.conversation_id
+            else:
+                performance.conversation_transcript = job.conversation
+            db.session.add(performance)
+            db.session.flush()
+            job.performance_id = performance.id
+        elif job.kind == 'competition':
+            self._write_station_results(payload.get('assignment_id'), job.conversation, results)
+        elif job.kind == 'upgrade':
+            self._apply_upgrade(payload.get('performance_id'), results)
+
+        job.result = results
+        job.status = 'completed'
+        job.error = self._assessment_error(results) if results.get('incomplete') else None
+        job.completed_at = datetime.utcnow()
+        db.session.commit()
+        self._notify(job.id)
+        if results.get('incomplete'):
+            logger.warning(f"Evaluation job {job.id} completed with unassessed criteria after {job.attempts} attempts")
+        else:
+            logger.info(f"Evaluation job {job.id} completed ({results.get('percentage', 0)}%)")
+
+        # Degraded or incomplete practice evaluations are re-scored later at the full tier
+        if job.kind == 'practice' and job.performance_id \
+                and (results.get('degraded') or results.get('incomplete')) \
+                and self.upgrade_delay_seconds is not None:
+            self.enqueue(
+                'upgrade', job.case_number, None if job.conversation_id else job.conversation,
+                student_id=job.student_id,
+                payload={'performance_id': job.performance_id, 'degraded_tier': results.get('evaluation_tier')},
+                delay_seconds=self.upgrade_delay_seconds,
+                conversation_id=job.conversation_id
+            )
+
+    @staticmethod
+    def _assessment_error(results):
+        if results.get('evaluation_failed'):
+            return results.get('feedback', "Échec de l'évaluation")
+        unassessed = sum(
+            1 for item in results.get('checklist', [])
+            if str(item.get('justification', '')).startswith(ASSESSMENT_ERROR_PREFIXES)
+        )
+        return f"{unassessed} critère(s) non évalué(s) (erreur ou délai dépassé)"
+
+    def _apply_upgrade(self, performance_id, results):
+        """Replace a degraded practice evaluation, unless the full-tier run did not fully succeed"""
+        if results.get('evaluation_failed') or has_assessment_errors(results):
+            logger.warning(f"Upgrade of performance {performance_id} incomplete; keeping the degraded evaluation")
+            return
+        performance = db.session.get(StudentPerformance, performance_id) if performance_id else None
+        if performance is None:
+            logger.error(f"Performance {performance_id} not found for upgraded evaluation")
+            return
+        performance.apply_evaluation(results)
+
+    def _defer(self, job_id, deferral):
+        """Put a claimed job back in the queue without counting the attempt"""
+        job = db.session.get(EvaluationJob, job_id)
+        if job is None:
+            return
+        delay = deferral.retry_after or self.backoff_seconds
+        job.status = 'queued'
+        job.attempts = max(0, job.attempts - 1)
+        job.worker_id = None
+        job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.session.commit()
+        logger.info(f"Evaluation job {job_id} deferred for {delay:.0f}s: {deferral}")
+        self._schedule(job_id, delay)
+
+    def _write_station_results(self, assignment_id, conversation, results):
+        assignment = db.session.get(StudentStationAssignment, assignment_id) if assignment_id else None
+        if assignment is None:
+            logger.error(f"Station assignment {assignment_id} not found for evaluation results")
+            return
+        assignment.record_evaluation(results, conversation)
+
+    def _handle_failure(self, job_id, error):
+        job = db.session.get(EvaluationJob, job_id)
+        if job is None:
+            return
+        job.error = str(error)[:1000]
+
+        if job.attempts < job.max_attempts:
+            delay = self.backoff_seconds * (2 ** max(0, job.attempts - 1))
+            job.status = 'queued'
+            job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            db.session.commit()
+            logger.warning(f"Evaluation job {job_id} failed (attempt {job.attempts}), retrying in {delay}s: {error}")
+            self._schedule(job_id, delay)
+            return
+
+        if job.kind == 'competition':
+            # Don't leave the station stuck as pending: record a zero score with the error
+            self._write_station_results(job.payload.get('assignment_id'), job.conversation, {
+                'checklist': [],
+                'feedback': "Une erreur est survenue lors de l'évaluation. Veuillez contacter l'administrateur.",
+                'points_total': 0,
+                'points_earned': 0,
+                'percentage': 0,
+                'recommendations': [],
+                'evaluation_failed': True
+            })
+        job.status = 'failed'
+        job.completed_at = datetime.utcnow()
+        db.session.commit()
+        self._notify(job_id)
+        logger.error(f"Evaluation job {job_id} failed after {job.attempts} attempts: {error}")
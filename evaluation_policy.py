@@ -0,0 +1,201 @@
+"""
+Load-adaptive choice of how thoroughly a finished consultation is evaluated.
+
+When a competition station ends, dozens of evaluations arrive within the same
+minute. Sending every one of them down the most expensive path (one LLM call
+per checklist item) drains the Groq budget and lets the queue grow. For each
+evaluation, EvaluationPolicy picks one of these tiers, from most to least
+expensive:
+
+    full           the configured strategy of EnhancedEvaluationAgent
+    batched        one prompt per checklist category
+    single_prompt  the single JSON prompt of the legacy EvaluationAgent
+    patterns       keyword matching only, no LLM call
+
+The choice depends on three things. The first is the depth of the
+evaluation queue. The second is the token budget the model chain has left,
+compared with an estimate of what each tier would cost. The third is the
+kind of evaluation: competitions tolerate a deeper queue before they are
+degraded, and they never drop below `competition_floor`.
+
+The same signals gate the background re-checks of consultations still in
+progress (see incremental_evaluation.py): incremental_allowance() says how
+many criteria a conversation may re-check now. It grants none while the
+policy would degrade a practice evaluation, and otherwise caps them per
+update and per conversation. The evaluator also waits
+`incremental_debounce_seconds` between two re-checks of a conversation.
+
+Degraded results are marked `degraded`. The job queue re-scores degraded
+practice evaluations later with an 'upgrade' job. That job runs only once
+the policy would grant the full tier again, and until then it is deferred
+with EvaluationDeferred.
+"""
+
+import logging
+import math
+
+from transcript_slicer import estimate_tokens, split_turns
+
+logger = logging.getLogger(__name__)
+
+# Most to least expensive
+TIERS = ('full', 'batched', 'single_prompt', 'patterns')
+
+# Rough prompt-template sizes (tokens) used to estimate what a tier would cost
+_CRITERION_PROMPT_TOKENS = 350
+_BATCH_PROMPT_TOKENS = 400
+_LEGACY_PROMPT_TOKENS = 600
+_LEGACY_COMPLETION_TOKENS = 650  # JSON verdicts plus the recommendations call
+
+
+class EvaluationDeferred(Exception):
+    """Raised to postpone an evaluation (an upgrade while the system is busy)"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TierDecision:
+    """The tier chosen for one evaluation and why"""
+
+    def __init__(self, tier, reason, queue_depth=None, available_tokens=None):
+        self.tier = tier
+        self.reason = reason
+        self.queue_depth = queue_depth
+        self.available_tokens = available_tokens
+
+    @property
+    def degraded(self):
+        return self.tier != 'full'
+
+    def __repr__(self):
+        return f"TierDecision({self.tier!r}, {self.reason!r})"
+
+
+class EvaluationPolicy:
+    """Picks an evaluation tier per request from queue depth, model budget and kind"""
+
+    def __init__(self, llm_client, queue_depth, settings=None):
+        """
+        `queue_depth()` returns the number of evaluations waiting or running.
+        `settings` holds the policy_* keys of EVALUATION_CONFIG.
+        """
+        settings = settings or {}
+        self.llm_client = llm_client
+        self.queue_depth = queue_depth
+        self.enabled = settings.get('policy_enabled', True)
+        # Queue depth from which each tier is used instead of the one above it
+        self.depth_thresholds = {
+            'practice': settings.get('policy_practice_depth', {'batched': 3, 'single_prompt': 8, 'patterns': 20}),
+            'competition': settings.get('policy_competition_depth', {'batched': 6, 'single_prompt': 15}),
+        }
+        self.competition_floor = settings.get('policy_competition_floor', 'single_prompt')
+        self.budget_headroom = settings.get('policy_budget_headroom', 1.2)
+        self.slice_token_budget = settings.get('slice_token_budget', 1200)
+        self.upgrade_retry_seconds = settings.get('policy_upgrade_retry_seconds', 300)
+        self.incremental_per_update = settings.get('policy_incremental_per_update', 3)
+        self.incremental_per_conversation = settings.get('policy_incremental_per_conversation', 20)
+        self.incremental_debounce_seconds = settings.get('policy_incremental_debounce_seconds', 15)
+
+    def choose(self, kind, case_data, conversation):
+        """TierDecision for a 'practice' or 'competition' evaluation"""
+        if self.llm_client is None:
+            return TierDecision('patterns', "no LLM client")
+        if not self.enabled:
+            return TierDecision('full', "policy disabled")
+
+        depth = self._current_depth()
+        floor = self.competition_floor if kind == 'competition' else 'patterns'
+        preferred = min(self._tier_for_depth(kind, depth), floor, key=TIERS.index)
+        available = self.available_tokens()
+        costs = self.estimate_costs(case_data, conversation)
+
+        for tier in TIERS[TIERS.index(preferred):]:
+            fits = tier == 'patterns' or costs[tier] * self.budget_headroom <= available
+            if fits or tier == floor:
+                reason = f"queue depth {depth}, ~{available if math.isfinite(available) else 'unlimited'} tokens available"
+                if not fits:
+                    reason += f", {floor} is the floor for this kind"
+                elif tier != preferred:
+                    reason += f", {preferred} would exceed the budget (~{costs[preferred]} tokens)"
+                decision = TierDecision(tier, reason, queue_depth=depth, available_tokens=available)
+                if decision.degraded:
+                    logger.info(f"Evaluation policy: {kind} evaluation degraded to '{tier}' ({reason})")
+                return decision
+
+    def check_upgrade(self, case_data, conversation):
+        """Raise EvaluationDeferred unless a degraded evaluation can now be re-run at the full tier"""
+        decision = self.choose('practice', case_data, conversation)
+        if decision.tier != 'full':
+            raise EvaluationDeferred(
+                f"Upgrade postponed: the policy currently grants '{decision.tier}' ({decision.reason})",
+                retry_after=self.upgrade_retry_seconds
+            )
+
+    def incremental_allowance(self, case_data, conversation, checked_so_far):
+        """How many criteria an in-progress conversation may re-check now (0: none).
+
+        `checked_so_far` is the number of criteria already re-checked for it.
+        """
+        if self.llm_client is None:
+            return 0
+        allowance = min(self.incremental_per_update, self.incremental_per_conversation - checked_so_far)
+        if allowance <= 0 or not self.enabled:
+            return max(0, allowance)
+
+        # The final evaluations come first: nothing while they would be degraded
+        if self._tier_for_depth('practice', self._current_depth()) != 'full':
+            return 0
+        # ... and only out of the budget left once the final full evaluation is paid for
+        full_cost = self.estimate_costs(case_data, conversation)['full'] * self.budget_headroom
+        per_criterion = full_cost / max(1, len(case_data.get('evaluation_checklist', [])))
+        affordable = (self.available_tokens() - full_cost) / (per_criterion or 1)
+        return max(0, int(min(allowance, affordable)))
+
+    def _current_depth(self):
+        try:
+            return self.queue_depth()
+        except Exception as e:
+            logger.warning(f"Evaluation policy: could not read the queue depth: {str(e)}")
+            return 0
+
+    def _tier_for_depth(self, kind, depth):
+        thresholds = self.depth_thresholds.get(kind, self.depth_thresholds['practice'])
+        tier = 'full'
+        for candidate in TIERS[1:]:
+            threshold = thresholds.get(candidate)
+            if threshold is not None and depth >= threshold:
+                tier = candidate
+        return tier
+
+    def available_tokens(self):
+        """Tokens the model chain can take right now: per model the tighter of tpm/tpd, summed
+        over the models whose circuit is not open (unlimited models count as infinite)"""
+        client = self.llm_client
+        if not hasattr(client, 'remaining_budget'):
+            return math.inf
+        circuits = client.circuit_states() if hasattr(client, 'circuit_states') else {}
+        total = 0
+        for model in getattr(client, 'models', []):
+            if circuits.get(model, {}).get('state') == 'open':
+                continue
+            budget = client.remaining_budget(model)
+            limits = [budget[name] for name in ('tpm', 'tpd') if name in budget]
+            if not limits:
+                return math.inf
+            total += min(limits)
+        return total
+
+    def estimate_costs(self, case_data, conversation):
+        """Estimated tokens (prompts plus completions) of each tier for this evaluation"""
+        checklist = case_data.get('evaluation_checklist', [])
+        transcript_tokens = estimate_tokens("\n\n".join(split_turns(conversation)))
+        criterion_transcript = min(transcript_tokens, self.slice_token_budget)
+        categories = len({str(item.get('category', 'general')).lower() for item in checklist}) or 1
+        return {
+            'full': len(checklist) * (criterion_transcript + _CRITERION_PROMPT_TOKENS + 150),
+            'batched': categories * (transcript_tokens + _BATCH_PROMPT_TOKENS) + len(checklist) * 80,
+            'single_prompt': transcript_tokens + _LEGACY_PROMPT_TOKENS + _LEGACY_COMPLETION_TOKENS,
+            'patterns': 0,
+        }
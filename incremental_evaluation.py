@@ -0,0 +1,284 @@
+"""
+Incremental evaluation of a consultation while it is still in progress.
+
+After each /chat turn, observe() schedules a background re-check of the
+checklist. Only items that are still unsatisfied and that the student's new
+turns could affect are re-checked: a word of those turns must start with one
+of the item's description stems or one of its category's cue words. Verdicts
+are kept per conversation id. When the station ends, verdicts_for() gives the
+verdicts that are still valid, and the agent's final pass only evaluates the
+remaining items against the full transcript.
+
+Re-checks spend the same Groq budget and worker pool as the final
+evaluations, so the evaluation policy gates them (see
+EvaluationPolicy.incremental_allowance): a few criteria per update, a budget
+per conversation, none under load, and at most one update per conversation
+every `incremental_debounce_seconds` (turns arriving meanwhile are folded into
+the next update).
+
+A satisfied item stays satisfied as the conversation grows. An unsatisfied
+verdict is reused only if no later turn is relevant to the item.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from enhanced_evaluation_agent import ASSESSMENT_ERROR_PREFIXES
+from evaluation_cache import checklist_version
+from keyword_matcher import description_stems
+
+logger = logging.getLogger(__name__)
+
+# Words that make a student turn relevant to a category even without keyword
+# overlap. Matched at the start of a word; prefixes match inflected forms.
+_CATEGORY_CUES = {
+    'communication': ('bonjour', 'bonsoir', "je m'appelle", 'interne', 'je comprends',
+                      'inquiét', 'rassur', 'au revoir', "n'hésitez"),
+    'anamnese': ('depuis quand', 'antécédent', 'allergi', 'famille', 'familia', 'tabac', 'fumez',
+                 'alcool', 'fièvre', 'opéré', 'chirurgi'),
+    'examen_physique': ('examiner', 'examen', 'ausculter', 'auscult', 'palper', 'palpat', 'inspect',
+                        'tension', 'température', 'pouls', 'saturation', 'allonger'),
+    'diagnostic': ('diagnostic', "il s'agit", 'hypothèse', 'probablement', 'bilan',
+                   'radio', 'scanner', 'échographie'),
+    'traitement': ('traitement', 'médicament', 'prescri', 'ordonnance', 'suivi',
+                   'repos', 'hospitalis'),
+}
+
+
+def _word_start_pattern(words):
+    """Regex finding any of `words` at the start of a word"""
+    return re.compile(r'(?<!\w)(?:' + '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True)) + ')')
+
+
+_CUE_PATTERNS = {category: _word_start_pattern(cues) for category, cues in _CATEGORY_CUES.items()}
+
+
+def _normalize(conversation):
+    """(role, content) pairs for the non-system messages of a conversation"""
+    return [
+        (msg.get('role'), msg.get('content', ''))
+        for msg in conversation
+        if isinstance(msg, dict) and msg.get('role') in ('human', 'assistant')
+    ]
+
+
+def _is_satisfied(verdict):
+    return bool(verdict) and verdict['completed'] and not verdict.get('partial', False)
+
+
+class _ConversationState:
+    def __init__(self, case_number):
+        self.case_number = case_number
+        self.version = None
+        self.messages = []  # normalized messages the verdicts were computed on
+        self.verdicts = {}  # checklist index -> verdict + 'checked_at' (message count)
+        self.pending = None  # latest conversation snapshot not processed yet
+        self.running = False
+        self.timer = None  # debounced update not started yet
+        self.checked = 0  # criteria re-checked so far, against the policy's per-conversation budget
+        self.checked_at = None  # clock time of the last re-check, for the debounce
+        self.touched_at = 0.0
+        self.idle = threading.Condition()
+
+
+class IncrementalEvaluator:
+    """Keeps an up-to-date partial evaluation per in-progress conversation"""
+
+    def __init__(self, app, agent, load_case, policy=None, max_workers=2, max_conversations=500,
+                 ttl_seconds=7200, final_wait_seconds=10, clock=time.monotonic):
+        self.app = app
+        self.agent = agent
+        self.load_case = load_case
+        # EvaluationPolicy gating the re-checks; None re-checks every affected item at once
+        self.policy = policy
+        self.max_conversations = max_conversations
+        self.ttl_seconds = ttl_seconds
+        self.final_wait_seconds = final_wait_seconds
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='incremental-eval')
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.reused = 0
+
+    # ------------------------------------------------------------------ #
+    # Called from the request handlers
+    # ------------------------------------------------------------------ #
+
+    def observe(self, conversation_id, case_number, conversation):
+        """Schedule a background re-check after a new turn; returns immediately"""
+        if not conversation_id:
+            return
+        state = self._get_state(conversation_id, case_number, create=True)
+        with state.idle:
+            state.pending = list(conversation)
+            if state.running:
+                return  # the running or debounced update picks up the newest snapshot
+            state.running = True
+        self._executor.submit(self._drain, conversation_id, state)
+
+    def verdicts_for(self, conversation_id, conversation, case_data):
+        """
+        Verdicts still valid for the final `conversation`, as {checklist index: verdict}.
+        Waits briefly for an in-flight update so its verdicts are not wasted.
+        """
+        state = self._get_state(conversation_id, str(case_data.get('case_number', '')))
+        if state is None:
+            return {}
+
+        with state.idle:
+            if state.timer is not None:
+                # A debounced update that has not started would only delay the final pass
+                state.timer.cancel()
+                state.timer = None
+                state.pending = None
+                state.running = False
+            state.idle.wait_for(lambda: not state.running, timeout=self.final_wait_seconds)
+            checklist = case_data.get('evaluation_checklist', [])
+            messages = _normalize(conversation)
+            if state.version != checklist_version(checklist) or messages[:len(state.messages)] != state.messages:
+                return {}
+
+            reusable = {}
+            for index, verdict in state.verdicts.items():
+                if index >= len(checklist):
+                    continue
+                tail = messages[verdict['checked_at']:]
+                if _is_satisfied(verdict) or not self._is_affected(checklist[index], tail):
+                    reusable[index] = {k: verdict[k] for k in ('completed', 'partial', 'justification')}
+
+        with self._lock:
+            self.reused += len(reusable)
+        logger.info(f"Incremental evaluation: reusing {len(reusable)}/{len(checklist)} verdicts for {conversation_id}")
+        return reusable
+
+    def discard(self, conversation_id):
+        with self._lock:
+            self._states.pop(conversation_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'conversations': len(self._states),
+                'criteria_checked': self.checks,
+                'verdicts_reused': self.reused,
+            }
+
+    # ------------------------------------------------------------------ #
+    # Background work
+    # ------------------------------------------------------------------ #
+
+    def _get_state(self, conversation_id, case_number, create=False):
+        case_number = str(case_number)
+        now = self.clock()
+        with self._lock:
+            for key in [k for k, s in self._states.items() if now - s.touched_at > self.ttl_seconds]:
+                del self._states[key]
+
+            state = self._states.get(conversation_id)
+            if state is not None and state.case_number != case_number:
+                state = None
+                del self._states[conversation_id]
+            if state is None:
+                if not create:
+                    return None
+                state = self._states[conversation_id] = _ConversationState(case_number)
+                while len(self._states) > self.max_conversations:
+                    self._states.popitem(last=False)
+            self._states.move_to_end(conversation_id)
+            state.touched_at = now
+            return state
+
+    def _debounce_delay(self, state):
+        """Seconds to wait before re-checking `state` again"""
+        if self.policy is None or state.checked_at is None:
+            return 0
+        return self.policy.incremental_debounce_seconds - (self.clock() - state.checked_at)
+
+    def _start_debounced(self, conversation_id, state):
+        with state.idle:
+            if state.timer is not threading.current_thread():
+                return  # cancelled by verdicts_for
+            state.timer = None
+        self._executor.submit(self._drain, conversation_id, state)
+
+    def _drain(self, conversation_id, state):
+        while True:
+            with state.idle:
+                if state.pending is None:
+                    state.running = False
+                    state.idle.notify_all()
+                    return
+                delay = self._debounce_delay(state)
+                if delay > 0:
+                    # Still running as far as observe() is concerned: later turns join this update
+                    state.timer = threading.Timer(delay, self._start_debounced, args=(conversation_id, state))
+                    state.timer.daemon = True
+                    state.timer.start()
+                    return
+                conversation, state.pending = state.pending, None
+            try:
+                with self.app.app_context():
+                    self._update(state, conversation)
+            except Exception as e:
+                logger.error(f"Incremental evaluation failed for {conversation_id}: {str(e)}")
+
+    def _update(self, state, conversation):
+        case_data = self.load_case(state.case_number)
+        checklist = case_data.get('evaluation_checklist', [])
+        messages = _normalize(conversation)
+
+        # Only this worker writes the state; readers see it swapped in under the lock
+        version = checklist_version(checklist)
+        verdicts = dict(state.verdicts)
+        if state.version != version or messages[:len(state.messages)] != state.messages:
+            # Checklist edited or conversation rewritten: start over
+            verdicts = {}
+
+        candidates = [
+            index for index, item in enumerate(checklist)
+            if not _is_satisfied(verdicts.get(index))
+            and self._is_affected(item, messages[verdicts.get(index, {}).get('checked_at', 0):])
+        ]
+        if candidates and self.policy is not None:
+            allowance = self.policy.incremental_allowance(case_data, conversation, state.checked)
+            # Longest-unchecked first, so a capped update still makes progress
+            candidates.sort(key=lambda index: verdicts.get(index, {}).get('checked_at', -1))
+            candidates = sorted(candidates[:allowance])
+
+        assessed = self.agent.assess_criteria(conversation, case_data, candidates) if candidates else {}
+        if assessed:
+            for index, verdict in assessed.items():
+                if verdict['justification'].startswith(ASSESSMENT_ERROR_PREFIXES):
+                    continue  # leave it to the final pass
+                verdicts[index] = {**verdict, 'checked_at': len(messages)}
+            with self._lock:
+                self.checks += len(assessed)
+            satisfied = sum(1 for v in verdicts.values() if _is_satisfied(v))
+            logger.info(f"Incremental evaluation: checked {len(assessed)} criteria, {satisfied}/{len(checklist)} satisfied")
+
+        with state.idle:
+            state.version = version
+            state.verdicts = verdicts
+            state.messages = messages
+            if assessed:
+                state.checked += len(assessed)
+                state.checked_at = self.clock()
+
+    def _is_affected(self, item, new_messages):
+        """Could the student's turns among `new_messages` change the verdict of `item`?"""
+        text = ' '.join(content for role, content in new_messages if role == 'human').lower()
+        if not text:
+            return False
+        category = self.agent.criterion_category(item)
+        if category == 'general':
+            return True
+
+        stems = description_stems(item.get('description', ''))
+        if stems and _word_start_pattern(stems).search(text):
+            return True
+        return bool(_CUE_PATTERNS[category].search(text))
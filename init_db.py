@@ -192,6 +192,49 @@ def check_database():
             print(f"❌ Error checking database: {e}")
             return False
 
+def rebuild_stats():
+    """Recompute the student_stats / case_stats rollups from the raw tables"""
+    print("🔄 Rebuilding student and case statistics...")
+    
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            from rollups import rebuild
+            counts = rebuild()
+            print(f"✅ Rebuilt statistics of {counts['students']} students and {counts['cases']} cases")
+            return True
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error rebuilding statistics: {e}")
+            return False
+
+def check_stats():
+    """Compare the student_stats / case_stats rollups with the raw tables"""
+    print("🔍 Checking student and case statistics...")
+    
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            from rollups import check
+            problems = check()
+            if not problems:
+                print("✅ Statistics are consistent with the performances and competition stations")
+                return True
+            
+            print(f"❌ {len(problems)} differences found:")
+            for problem in problems[:50]:
+                field = problem['field'] or 'row present'
+                print(f"  - {problem['table']} {problem['key']} {field}: stored {problem['stored']!r}, expected {problem['expected']!r}")
+            print("Run 'python init_db.py rebuild-stats' to fix them")
+            return False
+            
+        except Exception as e:
+            print(f"❌ Error checking statistics: {e}")
+            return False
+
 def main():
     """Main function"""
     print("OSCE Competition Database Manager")
@@ -206,18 +249,24 @@ def main():
             return reset_database()
         elif command == 'check':
             return check_database()
+        elif command == 'rebuild-stats':
+            return rebuild_stats()
+        elif command == 'check-stats':
+            return check_stats()
         else:
             print(f"Unknown command: {command}")
-            print("Available commands: init, reset, check")
+            print("Available commands: init, reset, check, rebuild-stats, check-stats")
             return False
     else:
         print("Available commands:")
         print("  python init_db.py init   - Initialize database")
         print("  python init_db.py reset  - Reset database (delete all data)")
         print("  python init_db.py check  - Check database status")
+        print("  python init_db.py rebuild-stats - Recompute student/case statistics")
+        print("  python init_db.py check-stats   - Compare statistics with the raw data")
         print()
         
-        response = input("What would you like to do? (init/reset/check): ").lower()
+        response = input("What would you like to do? (init/reset/check/rebuild-stats/check-stats): ").lower()
         
         if response == 'init':
             return init_database()
@@ -225,6 +274,10 @@ def main():
             return reset_database()
         elif response == 'check':
             return check_database()
+        elif response == 'rebuild-stats':
+            return rebuild_stats()
+        elif response == 'check-stats':
+            return check_stats()
         else:
             print("Invalid option.")
             return False
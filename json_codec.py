@@ -0,0 +1,87 @@
+"""
+JSON decoding for the model's *_json Text columns.
+
+The model properties (PatientCase.patient_info, StudentPerformance.evaluation_results...)
+used to run json.loads on every access. get_summary() alone decodes two
+columns for every case of every list. CachedJSON decodes a column once per
+instance and keeps the value until the raw column changes: it remembers
+the string it decoded and compares it by identity, so the setter, a direct
+write to the *_json column and a refresh after expire all invalidate it.
+
+The value is shared between accesses: treat it as read-only. A caller that
+needs to modify it copies it first (see PatientCase.to_json_data), and
+assigning to the property is the way to persist a change.
+
+When orjson is installed, loads() uses it and falls back to the standard
+library for the inputs orjson rejects (e.g. NaN written by json.dumps).
+dumps() stays json.dumps(ensure_ascii=False), so the stored text is
+unchanged.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+DECODE_ERRORS = (json.JSONDecodeError, TypeError, ValueError)
+
+
+def loads(text):
+    """Decode a JSON document (str or bytes)"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+def dumps(value):
+    """Encode a value as stored in the *_json columns"""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _encode_or_none(value):
+    return None if value is None else dumps(value)
+
+
+class CachedJSON:
+    """Property decoding the JSON Text column `column` once per instance.
+
+    `default` builds the value returned when the column is empty or
+    invalid. The decoded value is shared and must not be mutated. `encode`
+    turns an assigned value into the column's text (default: None stays
+    NULL, anything else is dumped).
+    """
+
+    def __init__(self, column, default=dict, encode=_encode_or_none):
+        self.column = column
+        self.default = default
+        self.encode = encode
+        self.cache_key = None
+
+    def __set_name__(self, owner, name):
+        self.cache_key = f'_cached_json_{name}'
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        raw = getattr(instance, self.column)
+        cached = instance.__dict__.get(self.cache_key)
+        if cached is not None and cached[0] is raw:
+            return cached[1]
+
+        value = self.default()
+        if raw:
+            try:
+                value = loads(raw)
+            except DECODE_ERRORS:
+                pass
+        instance.__dict__[self.cache_key] = (raw, value)
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.column, self.encode(value))
+        instance.__dict__.pop(self.cache_key, None)
@@ -0,0 +1,91 @@
+"""
+Multi-keyword matching in a single pass over the text.
+
+KeywordMatcher compiles any number of keywords, each tagged with a label,
+into an Aho-Corasick automaton. labels(text) then returns the labels of
+every keyword that occurs in the text. It scans the text once, however
+many keywords there are, instead of running one `keyword in text` test per
+keyword. Matching is on lower-cased substrings, the same as the `in` tests
+it replaces.
+"""
+
+import re
+from collections import deque
+
+# Description words too common to tell checklist items apart
+STOPWORDS = frozenset({
+    'avec', 'dans', 'pour', 'sans', 'sont', 'leur', 'cette', 'tout', 'tous', 'plus',
+    'mais', 'elle', 'vous', 'votre', 'patient', 'patiente', 'étudiant', 'demande',
+    'demander', 'rechercher', 'préciser', 'évaluer', 'faire'
+})
+
+_WORD = re.compile(r'\b\w{4,}\b')
+
+
+def description_keywords(description):
+    """Words of more than three letters in a checklist item description"""
+    return _WORD.findall(description.lower())
+
+
+def description_stems(description, length=5):
+    """Prefixes of a description's distinctive words, to match inflected forms too"""
+    return {word[:length] for word in description_keywords(description) if word not in STOPWORDS}
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over (keyword, label) pairs"""
+
+    def __init__(self, keywords):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [set()]
+        for keyword, label in keywords:
+            self._add(keyword.lower(), label)
+        self._build()
+
+    @classmethod
+    def from_groups(cls, groups):
+        """Matcher from {label: [keywords]}"""
+        return cls((keyword, label) for label, keywords in groups.items() for keyword in keywords)
+
+    def _add(self, keyword, label):
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(set())
+            state = next_state
+        self._output[state].add(label)
+
+    def _build(self):
+        """Breadth-first pass setting failure links and merging outputs along them"""
+        # Depth-1 states fail back to the root (already 0)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+    def labels(self, text):
+        """Set of labels whose keywords occur in `text`"""
+        found = set()
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
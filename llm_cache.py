@@ -0,0 +1,146 @@
+"""
+Persistent, content-addressed cache of LLM responses.
+
+Low-temperature evaluation and extraction prompts are fully determined by
+(model, messages, generation params), so identical calls (re-scoring a
+transcript, a double-submitted /end_chat, regenerating a report) can be
+answered from disk instead of paying for another Groq request.
+
+Entries live in a small SQLite table keyed by the SHA-256 of the call and
+are evicted by age (TTL) and, past `max_entries`, least recently used first.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """SQLite-backed response cache, safe to share between threads"""
+
+    def __init__(self, path, max_entries=5000, ttl_seconds=7 * 86400, clock=time.time):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_response_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_llm_response_cache_last_used "
+                "ON llm_response_cache (last_used_at)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:  # commit on success, roll back on error
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(model, messages, params):
+        """SHA-256 over the model, the (role, content) of each message and the generation params"""
+        payload = json.dumps({
+            'model': model,
+            'messages': [
+                [getattr(m, 'type', 'human'), str(getattr(m, 'content', m))]
+                for m in messages
+            ],
+            'params': params,
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, keys):
+        """
+        First live entry among `keys` (in order) as (key, content), or None.
+        Expired entries count as misses; one lookup counts one hit or miss.
+        """
+        keys = list(keys)
+        now = self.clock()
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    f"SELECT key, content, created_at FROM llm_response_cache "
+                    f"WHERE key IN ({', '.join('?' * len(keys))})", keys
+                ).fetchall()
+                live = {key: content for key, content, created_at in rows
+                        if now - created_at <= self.ttl_seconds}
+                for key in keys:
+                    if key in live:
+                        conn.execute(
+                            "UPDATE llm_response_cache SET last_used_at = ? WHERE key = ?", (now, key)
+                        )
+                        with self._lock:
+                            self.hits += 1
+                        return key, live[key]
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {e}")
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, model, content):
+        now = self.clock()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_response_cache "
+                    "(key, model, content, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, model, content, now, now)
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def _evict(self, conn, now):
+        conn.execute(
+            "DELETE FROM llm_response_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        conn.execute("""
+            DELETE FROM llm_response_cache WHERE key IN (
+                SELECT key FROM llm_response_cache
+                ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_response_cache")
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Hit/miss counters (this process) and the number of stored entries"""
+        try:
+            with self._connect() as conn:
+                entries = conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': entries,
+            }
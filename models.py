@@ -4,6 +4,8 @@ from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 import json
 import random
+import json_codec
+from json_codec import CachedJSON
 import logging
 
 logger = logging.getLogger(__name__)
@@ -54,25 +56,28 @@ class Student(db.Model, UserMixin):
     def get_id(self):
         return f"student_{self.id}"
     
+    def get_stats(self):
+        """The student's StudentStats row (None before the first attempt)"""
+        return db.session.get(StudentStats, self.id)
+
     def get_total_workouts(self):
         """Get total number of completed consultations"""
-        return StudentPerformance.query.filter_by(student_id=self.id).count()
+        stats = self.get_stats()
+        return stats.attempts if stats else 0
     
     def get_unique_stations_played(self):
         """Get number of unique stations/cases played"""
-        return db.session.query(StudentPerformance.case_number).filter_by(student_id=self.id).distinct().count()
+        stats = self.get_stats()
+        return stats.unique_stations if stats else 0
     
     def get_average_score(self):
         """Get average percentage score across all performances"""
-        performances = StudentPerformance.query.filter_by(student_id=self.id).all()
-        if not performances:
-            return 0
-        total_score = sum(p.percentage_score for p in performances)
-        return round(total_score / len(performances), 1)
+        stats = self.get_stats()
+        return round(stats.average_score, 1) if stats and stats.attempts else 0
     
     def get_recent_performances(self, limit=5):
         """Get recent performances"""
-        return StudentPerformance.query.filter_by(student_id=self.id)\
+        return StudentPerformance.list_query().filter_by(student_id=self.id)\
             .order_by(StudentPerformance.completed_at.desc()).limit(limit).all()
     
     def get_competition_history(self):
@@ -228,22 +233,35 @@ class CaseImage(db.Model):
     def __repr__(self):
         return f'<CaseImage {self.filename} for Case {self.case_number}>'
 
+def _differential_diagnosis_json(value):
+    """A list, or a comma-separated string, as the differential_diagnosis_json text"""
+    if isinstance(value, list):
+        return json_codec.dumps(value)
+    if isinstance(value, str) and value.strip():
+        # If it's a string, split by commas and create a list
+        diff_list = [item.strip() for item in value.split(',') if item.strip()]
+        return json_codec.dumps(diff_list) if diff_list else None
+    return None
+
+
 class PatientCase(db.Model):
     __tablename__ = 'patient_case1'
     
     id = db.Column(db.Integer, primary_key=True)
     case_number = db.Column(db.String(50), unique=True, nullable=False)
     specialty = db.Column(db.String(100))
-    patient_info_json = db.Column(db.Text)
-    symptoms_json = db.Column(db.Text)
-    evaluation_checklist_json = db.Column(db.Text)
-    diagnosis = db.Column(db.Text)
-    differential_diagnosis_json = db.Column(db.Text)
-    directives = db.Column(db.Text)
+    # Case content: deferred as one group, loaded together on first access (or undefer_group('case_content'))
+    patient_info_json = db.deferred(db.Column(db.Text), group='case_content')
+    symptoms_json = db.deferred(db.Column(db.Text), group='case_content')
+    evaluation_checklist_json = db.deferred(db.Column(db.Text), group='case_content')
+    diagnosis = db.deferred(db.Column(db.Text), group='case_content')
+    differential_diagnosis_json = db.deferred(db.Column(db.Text), group='case_content')
+    directives = db.deferred(db.Column(db.Text), group='case_content')
     consultation_time = db.Column(db.Integer, default=10)
-    additional_notes = db.Column(db.Text)
-    lab_results = db.Column(db.Text)
-    custom_sections_json = db.Column(db.Text)
+    additional_notes = db.deferred(db.Column(db.Text), group='case_content')
+    lab_results = db.deferred(db.Column(db.Text), group='case_content')
+    custom_sections_json = db.deferred(db.Column(db.Text), group='case_content')
+    evaluation_strategy = db.Column(db.String(20))  # None → EVALUATION_CONFIG default
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -251,108 +269,39 @@ class PatientCase(db.Model):
     performances = db.relationship('StudentPerformance', backref='case', lazy=True)
     images = db.relationship('CaseImage', backref='case', lazy=True, cascade='all, delete-orphan')
     session_assignments = db.relationship('SessionStationAssignment', backref='case', lazy=True, cascade='all, delete-orphan')
+
+    # Columns of the case lists: the metadata plus what get_summary reads
+    LIST_COLUMNS = ('id', 'case_number', 'specialty', 'consultation_time', 'evaluation_strategy',
+                    'created_at', 'updated_at', 'patient_info_json', 'symptoms_json', 'diagnosis')
+
+    @classmethod
+    def list_query(cls):
+        """Query for case lists, loading only LIST_COLUMNS"""
+        return cls.query.options(db.load_only(*(getattr(cls, name) for name in cls.LIST_COLUMNS)))
     
-    @property
-    def patient_info(self):
-        if self.patient_info_json:
-            try:
-                return json.loads(self.patient_info_json)
-            except (json.JSONDecodeError, TypeError, ValueError):
-                return {}
-        return {}
-    
-    @patient_info.setter
-    def patient_info(self, value):
-        if value is None:
-            self.patient_info_json = None
-        else:
-            self.patient_info_json = json.dumps(value, ensure_ascii=False)
-    
-    @property
-    def symptoms(self):
-        if self.symptoms_json:
-            try:
-                return json.loads(self.symptoms_json)
-            except (json.JSONDecodeError, TypeError, ValueError):
-                return []
-        return []
-    
-    @symptoms.setter
-    def symptoms(self, value):
-        if value is None:
-            self.symptoms_json = None
-        else:
-            self.symptoms_json = json.dumps(value, ensure_ascii=False)
-    
-    @property
-    def evaluation_checklist(self):
-        if self.evaluation_checklist_json:
-            try:
-                return json.loads(self.evaluation_checklist_json)
-            except (json.JSONDecodeError, TypeError, ValueError):
-                return []
-        return []
-    
-    @evaluation_checklist.setter
-    def evaluation_checklist(self, value):
-        if value is None:
-            self.evaluation_checklist_json = None
-        else:
-            self.evaluation_checklist_json = json.dumps(value, ensure_ascii=False)
-    
-    @property
-    def differential_diagnosis(self):
-        if self.differential_diagnosis_json:
-            try:
-                return json.loads(self.differential_diagnosis_json)
-            except (json.JSONDecodeError, TypeError, ValueError):
-                return []
-        return []
-    
-    @differential_diagnosis.setter
-    def differential_diagnosis(self, value):
-        if value is None:
-            self.differential_diagnosis_json = None
-        else:
-            if isinstance(value, list):
-                self.differential_diagnosis_json = json.dumps(value, ensure_ascii=False)
-            elif isinstance(value, str) and value.strip():
-                # If it's a string, split by commas and create a list
-                diff_list = [item.strip() for item in value.split(',') if item.strip()]
-                self.differential_diagnosis_json = json.dumps(diff_list, ensure_ascii=False) if diff_list else None
-            else:
-                self.differential_diagnosis_json = None
-    
-    @property
-    def custom_sections(self):
-        if self.custom_sections_json:
-            try:
-                return json.loads(self.custom_sections_json)
-            except (json.JSONDecodeError, TypeError, ValueError):
-                return []
-        return []
-    
-    @custom_sections.setter
-    def custom_sections(self, value):
-        if value is None:
-            self.custom_sections_json = None
-        else:
-            self.custom_sections_json = json.dumps(value, ensure_ascii=False)
+    # Decoded once per instance (see json_codec.CachedJSON)
+    patient_info = CachedJSON('patient_info_json', default=dict)
+    symptoms = CachedJSON('symptoms_json', default=list)
+    evaluation_checklist = CachedJSON('evaluation_checklist_json', default=list)
+    differential_diagnosis = CachedJSON('differential_diagnosis_json', default=list, encode=_differential_diagnosis_json)
+    custom_sections = CachedJSON('custom_sections_json', default=list)
     
     def __repr__(self):
         return f'<PatientCase {self.case_number}>'
     
+    def get_stats(self):
+        """The case's CaseStats row (None before the first attempt)"""
+        return db.session.get(CaseStats, self.case_number)
+
     def get_average_score(self):
         """Get average score for this case across all students"""
-        performances = StudentPerformance.query.filter_by(case_number=self.case_number).all()
-        if not performances:
-            return 0
-        total_score = sum(p.percentage_score for p in performances)
-        return round(total_score / len(performances), 1)
+        stats = self.get_stats()
+        return round(stats.average_score, 1) if stats and stats.attempts else 0
     
     def get_completion_count(self):
         """Get number of times this case has been completed"""
-        return StudentPerformance.query.filter_by(case_number=self.case_number).count()
+        stats = self.get_stats()
+        return stats.attempts if stats else 0
 
     def get_summary(self):
         """Generate a short descriptive sentence: 'Un homme de 58 ans consulte pour...'"""
@@ -411,7 +360,8 @@ class PatientCase(db.Model):
             consultation_time=case_data.get('consultation_time', 10),
             additional_notes=case_data.get('additional_notes', ''),
             lab_results=patient_info.get('lab_results', ''),
-            custom_sections_json=json.dumps(case_data.get('custom_sections', []), ensure_ascii=False)
+            custom_sections_json=json.dumps(case_data.get('custom_sections', []), ensure_ascii=False),
+            evaluation_strategy=case_data.get('evaluation_strategy')
         )
         
         return case
@@ -444,23 +394,17 @@ class PatientCase(db.Model):
         self.additional_notes = case_data.get('additional_notes', '')
         self.lab_results = patient_info.get('lab_results', '')
         self.custom_sections_json = json.dumps(case_data.get('custom_sections', []), ensure_ascii=False)
+        self.evaluation_strategy = case_data.get('evaluation_strategy', self.evaluation_strategy)
         self.updated_at = datetime.utcnow()
     
     def to_json_data(self):
         """Convert PatientCase instance to JSON case data format"""
         try:
-            patient_info = json.loads(self.patient_info_json) if self.patient_info_json else {}
-            symptoms = json.loads(self.symptoms_json) if self.symptoms_json else []
-            evaluation_checklist = json.loads(self.evaluation_checklist_json) if self.evaluation_checklist_json else []
-            custom_sections = json.loads(self.custom_sections_json) if self.custom_sections_json else []
-            
-            # Handle differential diagnosis
-            differential_diagnosis = None
-            if self.differential_diagnosis_json:
-                try:
-                    differential_diagnosis = json.loads(self.differential_diagnosis_json)
-                except (json.JSONDecodeError, TypeError, ValueError):
-                    differential_diagnosis = self.differential_diagnosis_json
+            patient_info = dict(self.patient_info)  # shared cached value, lab_results is added below
+            symptoms = self.symptoms
+            evaluation_checklist = self.evaluation_checklist
+            custom_sections = self.custom_sections
+            differential_diagnosis = self.differential_diagnosis
             
             # Add lab results to patient info if available
             if self.lab_results:
@@ -495,6 +439,8 @@ class PatientCase(db.Model):
                 case_data['directives'] = self.directives
             if self.additional_notes:
                 case_data['additional_notes'] = self.additional_notes
+            if self.evaluation_strategy:
+                case_data['evaluation_strategy'] = self.evaluation_strategy
             
             return case_data
             
@@ -547,6 +493,11 @@ class PatientCase(db.Model):
 # Student Performance Tracking
 class StudentPerformance(db.Model):
     __tablename__ = 'student_performance'
+    # Covering indexes for the dashboard rollups (reporting.py): they never read the JSON blobs
+    __table_args__ = (
+        db.Index('ix_student_performance_case_rollup', 'case_number', 'percentage_score', 'completed_at'),
+        db.Index('ix_student_performance_student_rollup', 'student_id', 'case_number', 'percentage_score', 'completed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
@@ -561,54 +512,45 @@ class StudentPerformance(db.Model):
     consultation_duration = db.Column(db.Integer)  # in seconds
     time_remaining = db.Column(db.Integer)  # in seconds
     
-    # Detailed evaluation data (JSON)
-    evaluation_results_json = db.Column(db.Text)  # Store full evaluation results
-    recommendations_json = db.Column(db.Text)  # Store recommendations
-    conversation_transcript_json = db.Column(db.Text) # Stores the list of message dicts as JSON
+    # Detailed evaluation data (JSON), deferred: loaded on first access, by group
+    evaluation_results_json = db.deferred(db.Column(db.Text), group='evaluation')  # Store full evaluation results
+    recommendations_json = db.deferred(db.Column(db.Text), group='evaluation')  # Store recommendations
+    conversation_transcript_json = db.deferred(db.Column(db.Text), group='transcript') # Stores the list of message dicts as JSON
+    conversation_id = db.Column(db.String(32), db.ForeignKey('conversations.id'), nullable=True, index=True)  # Transcript in the conversation store instead
 
     # Timestamps
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Columns of the performance lists (dashboards, student details)
+    LIST_COLUMNS = ('id', 'student_id', 'case_number', 'points_earned', 'points_total', 'percentage_score',
+                    'consultation_duration', 'time_remaining', 'started_at', 'completed_at')
+
     def __repr__(self):
         return f'<StudentPerformance {self.student.name} - Case {self.case_number} - {self.percentage_score}%>'
-    
-    @property
-    def evaluation_results(self):
-        if self.evaluation_results_json:
-            try:
-                return json.loads(self.evaluation_results_json)
-            except (json.JSONDecodeError, TypeError, ValueError):
-                return {}
-        return {}
-    
-    @evaluation_results.setter
-    def evaluation_results(self, results):
-        """Set evaluation results as JSON"""
-        self.evaluation_results_json = json.dumps(results, ensure_ascii=False)
 
-    @property
-    def recommendations(self):
-        if self.recommendations_json:
-            try:
-                return json.loads(self.recommendations_json)
-            except (json.JSONDecodeError, TypeError, ValueError):
-                return []
-        return []
+    @classmethod
+    def list_query(cls):
+        """Query for performance lists, loading only LIST_COLUMNS"""
+        return cls.query.options(db.load_only(*(getattr(cls, name) for name in cls.LIST_COLUMNS)))
 
-    @recommendations.setter
-    def recommendations(self, recommendations_list):
-        """Set recommendations as JSON"""
-        self.recommendations_json = json.dumps(recommendations_list, ensure_ascii=False)
+    @staticmethod
+    def report_options():
+        """Loader options for the report paths, which read the evaluation and the transcript"""
+        return [db.undefer_group('evaluation'), db.undefer_group('transcript')]
+    
+    # Decoded once per instance (see json_codec.CachedJSON)
+    evaluation_results = CachedJSON('evaluation_results_json', default=dict, encode=json_codec.dumps)
+    recommendations = CachedJSON('recommendations_json', default=list, encode=json_codec.dumps)
 
     @property
     def conversation_transcript(self):
         if self.conversation_transcript_json:
             try:
-                return json.loads(self.conversation_transcript_json)
-            except (json.JSONDecodeError, TypeError, ValueError):
+                return json_codec.loads(self.conversation_transcript_json)
+            except json_codec.DECODE_ERRORS:
                 return []
-        return []
+        return conversation_messages(self.conversation_id)
 
     @conversation_transcript.setter
     def conversation_transcript(self, conversation_list):
@@ -649,6 +591,81 @@ class StudentPerformance(db.Model):
         
         return performance
 
+    def apply_evaluation(self, evaluation_results):
+        """Replace the stored evaluation and scores (e.g. after re-scoring); does not commit"""
+        self.evaluation_results = evaluation_results
+        self.points_earned = evaluation_results.get('points_earned', 0)
+        self.points_total = evaluation_results.get('points_total', 0)
+        self.percentage_score = evaluation_results.get('percentage', 0.0)
+        self.recommendations = evaluation_results.get('recommendations', [])
+
+
+class StudentStats(db.Model):
+    """Running totals of a student's activity, maintained in the transactions that record it (see rollups.py)"""
+    __tablename__ = 'student_stats'
+
+    student_id = db.Column(db.Integer, primary_key=True)  # student.id; rows of deleted students are removed by rollups.py
+
+    # Practice consultations (StudentPerformance)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    score_sum = db.Column(db.Float, default=0.0, nullable=False)
+    best_score = db.Column(db.Float)
+    last_attempt_at = db.Column(db.DateTime)
+    unique_stations = db.Column(db.Integer, default=0, nullable=False)
+    case_counts_json = db.Column(db.Text)  # {case_number: practice attempts}
+
+    # Completed competition stations (StudentStationAssignment)
+    competition_attempts = db.Column(db.Integer, default=0, nullable=False)
+    competition_score_sum = db.Column(db.Float, default=0.0, nullable=False)
+
+    # Both kinds together
+    category_counts_json = db.Column(db.Text)  # {category: [checklist items completed, items evaluated]}
+    specialty_counts_json = db.Column(db.Text)  # {specialty: attempts}
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def average_score(self):
+        return self.score_sum / self.attempts if self.attempts else 0
+
+    case_counts = CachedJSON('case_counts_json')
+    category_counts = CachedJSON('category_counts_json')
+    specialty_counts = CachedJSON('specialty_counts_json')
+
+    def __repr__(self):
+        return f'<StudentStats {self.student_id}: {self.attempts} attempts>'
+
+
+class CaseStats(db.Model):
+    """Running totals of the attempts on a case, maintained like StudentStats"""
+    __tablename__ = 'case_stats'
+
+    case_number = db.Column(db.String(50), primary_key=True)
+
+    # Practice consultations (StudentPerformance)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    score_sum = db.Column(db.Float, default=0.0, nullable=False)
+    best_score = db.Column(db.Float)
+    last_attempt_at = db.Column(db.DateTime)
+
+    # Completed competition stations (StudentStationAssignment)
+    competition_attempts = db.Column(db.Integer, default=0, nullable=False)
+    competition_score_sum = db.Column(db.Float, default=0.0, nullable=False)
+
+    category_counts_json = db.Column(db.Text)  # {category: [checklist items completed, items evaluated]}, both kinds
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def average_score(self):
+        return self.score_sum / self.attempts if self.attempts else 0
+
+    category_counts = CachedJSON('category_counts_json')
+
+    def __repr__(self):
+        return f'<CaseStats {self.case_number}: {self.attempts} attempts>'
+
+
 class CompetitionSession(db.Model, SessionMixin):
     """Model for OSCE competition sessions"""
     __tablename__ = 'competition_sessions'
@@ -935,6 +952,7 @@ class CompetitionSession(db.Model, SessionMixin):
                 'student_code': student_session.student.student_code,
                 'average_score': avg_score,
                 'stations_completed': student_session.get_completed_stations_count(),
+                'stations_pending': student_session.get_pending_stations_count(),  # not in average_score yet
                 'completion_time': student_session.completed_at
             })
         
@@ -986,9 +1004,16 @@ class CompetitionSession(db.Model, SessionMixin):
             
             # 1. Delete student station assignments first
             student_sessions = StudentCompetitionSession.query.filter_by(session_id=self.id).all()
+            stale_cases = set()
             for student_session in student_sessions:
+                stale_cases.update(case_number for case_number, in db.session.query(StudentStationAssignment.case_number)
+                                   .filter_by(student_session_id=student_session.id, status='completed'))
                 # Delete station assignments for this student session
                 StudentStationAssignment.query.filter_by(student_session_id=student_session.id).delete()
+
+            # Bulk deletes skip the stats hook: recompute the totals they change at the next flush
+            from rollups import mark_stale
+            mark_stale(student_ids={s.student_id for s in student_sessions}, case_numbers=stale_cases)
             
             # 2. Delete student competition sessions
             StudentCompetitionSession.query.filter_by(session_id=self.id).delete()
@@ -1127,12 +1152,13 @@ class StudentCompetitionSession(db.Model):
             # Mark current station as completed
             current_station.status = 'completed'
             current_station.completed_at = datetime.utcnow()
+            current_station.record_scores(evaluation_results)
             current_station.performance_data = json.dumps({
                 'conversation_transcript': conversation_transcript or [],  # Use parameter instead of session
                 'evaluation_results': evaluation_results,
-                'percentage_score': evaluation_results.get('percentage', 0),
-                'points_earned': evaluation_results.get('points_earned', 0),
-                'points_total': evaluation_results.get('points_total', 0),
+                'percentage_score': current_station.percentage_score,
+                'points_earned': current_station.points_earned,
+                'points_total': current_station.points_total,
                 'completed_at': datetime.utcnow().isoformat()
             }, ensure_ascii=False)
             
@@ -1176,31 +1202,19 @@ class StudentCompetitionSession(db.Model):
             return False
     
     def get_total_score(self):
-        """Get total score across all completed stations"""
-        total = 0
-        completed_assignments = [a for a in self.station_assignments if a.status == 'completed']
-        
-        for assignment in completed_assignments:
-            if assignment.performance_data:
-                try:
-                    if isinstance(assignment.performance_data, str):
-                        data = json.loads(assignment.performance_data)
-                    else:
-                        data = assignment.performance_data
-                        
-                    score = data.get('percentage_score', 0)
-                    total += score
-                except (json.JSONDecodeError, TypeError):
-                    logger.error(f"Error parsing performance data for assignment {assignment.id}")
-        
-        return total
+        """Get total score across all scored stations (pending evaluations excluded)"""
+        return sum(a.percentage_score for a in self.station_assignments if a.is_scored)
     
     def get_average_score(self):
-        """Get average score across all completed stations"""
-        completed = self.get_completed_stations_count()
-        if completed == 0:
+        """Get average score across all scored stations (pending evaluations excluded)"""
+        scored = len([a for a in self.station_assignments if a.is_scored])
+        if scored == 0:
             return 0
-        return round(self.get_total_score() / completed, 1)
+        return round(self.get_total_score() / scored, 1)
+
+    def get_pending_stations_count(self):
+        """Get number of completed stations whose evaluation has not finished yet"""
+        return len([a for a in self.station_assignments if a.status == 'completed' and not a.is_scored])
     
     def get_completed_stations_count(self):
         """Get number of completed stations"""
@@ -1257,12 +1271,8 @@ class StudentCompetitionSession(db.Model):
             }
             
             if assignment.status == 'completed':
-                if assignment.performance_data:
-                    try:
-                        perf_data = json.loads(assignment.performance_data)
-                        station_info['score'] = perf_data.get('percentage_score', 0)
-                    except (json.JSONDecodeError, TypeError, ValueError):
-                        station_info['score'] = 0
+                if assignment.percentage_score is not None:
+                    station_info['score'] = assignment.percentage_score
                 completed_stations.append(station_info)
             else:
                 pending_stations.append(station_info)
@@ -1317,8 +1327,14 @@ class StudentStationAssignment(db.Model):
     started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     
-    # Performance data (JSON)
-    performance_data = db.Column(db.Text)  # Store evaluation results, score, etc.
+    # Scores, copied out of performance_data so that scoring and ranking never load it
+    percentage_score = db.Column(db.Float)
+    points_earned = db.Column(db.Integer)
+    points_total = db.Column(db.Integer)
+    duration_seconds = db.Column(db.Integer)  # from started_at to completed_at
+
+    # Performance data (JSON): transcript and full evaluation, loaded only when accessed
+    performance_data = db.deferred(db.Column(db.Text))
     
     # Relationships
     case = db.relationship('PatientCase', backref='competition_assignments')
@@ -1339,6 +1355,76 @@ class StudentStationAssignment(db.Model):
             except (json.JSONDecodeError, TypeError, ValueError):
                 pass
         return None
+
+    @property
+    def is_scored(self):
+        """Completed and evaluated: a station waiting for its evaluation job has no score yet"""
+        return self.status == 'completed' and self.percentage_score is not None
+
+    def record_scores(self, evaluation_results):
+        """Set the score columns from evaluation results; does not commit.
+
+        Pending results (status 'pending', the evaluation job has not run
+        yet) leave them NULL, which keeps the station out of totals, rankings
+        and the stats rollups until the job records the real score.
+        """
+        if evaluation_results.get('status') == 'pending':
+            self.percentage_score = self.points_earned = self.points_total = None
+        else:
+            self.percentage_score = evaluation_results.get('percentage', 0)
+            self.points_earned = evaluation_results.get('points_earned', 0)
+            self.points_total = evaluation_results.get('points_total', 0)
+        if self.started_at and self.completed_at:
+            self.duration_seconds = int((self.completed_at - self.started_at).total_seconds())
+
+    @classmethod
+    def backfill_scores(cls, batch_size=500):
+        """Fill the score columns of assignments completed before they existed, from performance_data; returns how many"""
+        table = cls.__table__
+        filled = 0
+        last_id = 0
+        while True:
+            rows = db.session.execute(db.select(
+                table.c.id, table.c.performance_data, table.c.started_at, table.c.completed_at
+            ).where(
+                table.c.performance_data.isnot(None), table.c.percentage_score.is_(None), table.c.id > last_id
+            ).order_by(table.c.id).limit(batch_size)).all()
+            if not rows:
+                return filled
+            last_id = rows[-1].id
+            for row in rows:
+                try:
+                    data = json.loads(row.performance_data)
+                except (json.JSONDecodeError, TypeError, ValueError):
+                    data = None
+                data = data if isinstance(data, dict) else {}
+                if (data.get('evaluation_results') or {}).get('status') == 'pending':
+                    continue  # its evaluation job has not run yet and will set the scores
+                duration = None
+                if row.started_at and row.completed_at:
+                    duration = int((row.completed_at - row.started_at).total_seconds())
+                db.session.execute(db.update(table).where(table.c.id == row.id).values(
+                    percentage_score=data.get('percentage_score') or 0,
+                    points_earned=data.get('points_earned') or 0,
+                    points_total=data.get('points_total') or 0,
+                    duration_seconds=duration
+                ))
+                filled += 1
+            db.session.commit()
+
+    def record_evaluation(self, evaluation_results, conversation_transcript=None):
+        """Store evaluation results in performance_data, keeping the transcript and completion time; does not commit"""
+        self.record_scores(evaluation_results)
+        data = self.get_performance_summary() or {}
+        data.update({
+            'conversation_transcript': data.get('conversation_transcript') or conversation_transcript or [],
+            'evaluation_results': evaluation_results,
+            'percentage_score': evaluation_results.get('percentage', 0),
+            'points_earned': evaluation_results.get('points_earned', 0),
+            'points_total': evaluation_results.get('points_total', 0),
+            'completed_at': data.get('completed_at') or datetime.utcnow().isoformat()
+        })
+        self.performance_data = json.dumps(data, ensure_ascii=False)
     def get_duration_minutes(self):
         """Get duration of this station in minutes"""
         if not self.started_at:
@@ -1363,19 +1449,239 @@ class StudentStationAssignment(db.Model):
     
     def get_performance_score(self):
         """Get performance score for this station"""
-        if not self.performance_data:
-            return 0
-        
-        try:
-            if isinstance(self.performance_data, str):
-                data = json.loads(self.performance_data)
-            else:
-                data = self.performance_data
-            
-            return data.get('percentage_score', 0)
-        except (json.JSONDecodeError, TypeError, ValueError):
-            return 0
+        return self.percentage_score or 0
     
     def __repr__(self):
         """String representation"""
-        return f'<StudentStationAssignment {self.id}: Case {self.case_number} Order {self.station_order} ({self.status})>'
\ No newline at end of file
+        return f'<StudentStationAssignment {self.id}: Case {self.case_number} Order {self.station_order} ({self.status})>'
+
+class EvaluationJob(db.Model):
+    """Queued evaluation of a finished consultation, processed outside the request"""
+    __tablename__ = 'evaluation_jobs'
+
+    id = db.Column(db.String(36), primary_key=True)  # uuid4, also used as the public job id
+    kind = db.Column(db.String(20), nullable=False)  # 'practice', 'competition' or 'upgrade' (re-score of a degraded practice evaluation)
+    status = db.Column(db.String(20), default='queued', nullable=False, index=True)  # queued, running, completed, failed
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=True)
+    case_number = db.Column(db.String(50), nullable=False)
+
+    conversation_json = db.Column(db.Text)
+    conversation_id = db.Column(db.String(32), db.ForeignKey('conversations.id'), nullable=True, index=True)  # stored transcript, instead of conversation_json
+    payload_json = db.Column(db.Text)  # kind-specific data (consultation duration, station assignment id...)
+    result_json = db.Column(db.Text)
+    error = db.Column(db.Text)
+
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    next_attempt_at = db.Column(db.DateTime)
+    worker_id = db.Column(db.String(100))  # host:pid of the process running the job
+    performance_id = db.Column(db.Integer, db.ForeignKey('student_performance.id'), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+
+    @property
+    def conversation(self):
+        if self.conversation_json:
+            try:
+                return json.loads(self.conversation_json)
+            except (json.JSONDecodeError, TypeError, ValueError):
+                return []
+        return conversation_messages(self.conversation_id)
+
+    @conversation.setter
+    def conversation(self, conversation_list):
+        self.conversation_json = json.dumps(conversation_list, ensure_ascii=False)
+
+    payload = CachedJSON('payload_json', encode=lambda data: json_codec.dumps(data or {}))
+    result = CachedJSON('result_json', encode=json_codec.dumps)
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'case_number': self.case_number,
+            'performance_id': self.performance_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+    def __repr__(self):
+        return f'<EvaluationJob {self.id} {self.kind} ({self.status})>'
+
+
+class RescoreRun(db.Model):
+    """Bulk re-evaluation of stored transcripts, e.g. after a checklist was edited"""
+    __tablename__ = 'rescore_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, running, interrupted, completed
+    scope_json = db.Column(db.Text)  # case_number / competition_id / since / until
+    created_by = db.Column(db.String(50))
+    total_items = db.Column(db.Integer, default=0)
+    processed_items = db.Column(db.Integer, default=0)
+    failed_items = db.Column(db.Integer, default=0)
+    elapsed_seconds = db.Column(db.Float, default=0.0)  # summed over resumed runs
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # refreshed while running; a stale one means the runner died
+
+    items = db.relationship('RescoreItem', backref='run', lazy='dynamic', cascade='all, delete-orphan')
+
+    scope = CachedJSON('scope_json', encode=lambda data: json_codec.dumps(data or {}))
+
+    @property
+    def throughput_per_minute(self):
+        """Transcripts re-scored per minute of run time"""
+        if not self.elapsed_seconds:
+            return 0.0
+        return round(self.processed_items * 60 / self.elapsed_seconds, 1)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'scope': self.scope,
+            'total_items': self.total_items,
+            'processed_items': self.processed_items,
+            'failed_items': self.failed_items,
+            'throughput_per_minute': self.throughput_per_minute,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None
+        }
+
+    def __repr__(self):
+        return f'<RescoreRun {self.id} ({self.status}) {self.processed_items}/{self.total_items}>'
+
+
+class RescoreItem(db.Model):
+    """One transcript of a re-scoring run; doubles as the run's checkpoint"""
+    __tablename__ = 'rescore_items'
+
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('rescore_runs.id'), nullable=False, index=True)
+    target_type = db.Column(db.String(20), nullable=False)  # 'performance' or 'station'
+    target_id = db.Column(db.Integer, nullable=False)
+    case_number = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False, index=True)  # pending, done, failed
+    old_score = db.Column(db.Float)
+    new_score = db.Column(db.Float)
+    error = db.Column(db.Text)
+    processed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'target_type': self.target_type,
+            'target_id': self.target_id,
+            'case_number': self.case_number,
+            'status': self.status,
+            'old_score': self.old_score,
+            'new_score': self.new_score,
+            'delta': round(self.new_score - self.old_score, 1) if self.new_score is not None and self.old_score is not None else None,
+            'error': self.error
+        }
+
+
+class SystemPrompt(db.Model):
+    """A rendered patient-simulation prompt, stored once and shared by every conversation on the case"""
+    __tablename__ = 'system_prompts'
+
+    id = db.Column(db.String(32), primary_key=True)  # hash of the content
+    case_number = db.Column(db.String(50), nullable=False, index=True)
+    case_version = db.Column(db.String(64))  # case update time and template version it was rendered from
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SystemPrompt {self.id} case {self.case_number}>'
+
+
+def system_prompt_reference(prompt_id):
+    """System message standing for a stored SystemPrompt; its content is resolved when needed"""
+    return {'role': 'system', 'content': '', 'prompt_id': prompt_id}
+
+
+class Conversation(db.Model):
+    """A simulated consultation; its messages live in conversation_turns, one row each"""
+    __tablename__ = 'conversations'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, kept in the session as conversation_id
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=True, index=True)
+    case_number = db.Column(db.String(50), nullable=False)
+    kind = db.Column(db.String(20), default='practice', nullable=False)  # 'practice' or 'competition'
+    system_prompt_id = db.Column(db.String(32), db.ForeignKey('system_prompts.id'), nullable=True)
+    status = db.Column(db.String(20), default='active', nullable=False, index=True)  # active, ended
+    message_count = db.Column(db.Integer, default=0, nullable=False)
+    summary = db.Column(db.Text)  # "facts already disclosed" summary of the older turns (context_policy.py)
+    summary_message_count = db.Column(db.Integer, default=0, nullable=False)  # non-system messages it covers
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    ended_at = db.Column(db.DateTime)
+
+    turns = db.relationship('ConversationTurn', backref='conversation', lazy='dynamic',
+                            cascade='all, delete-orphan', order_by='ConversationTurn.id')
+
+    @property
+    def messages(self):
+        """The transcript as a list of {'role', 'content'} dicts, in order"""
+        opening = [system_prompt_reference(self.system_prompt_id)] if self.system_prompt_id else []
+        return opening + [turn.to_message() for turn in self.turns]
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'student_id': self.student_id,
+            'case_number': self.case_number,
+            'kind': self.kind,
+            'system_prompt_id': self.system_prompt_id,
+            'status': self.status,
+            'message_count': self.message_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'ended_at': self.ended_at.isoformat() if self.ended_at else None
+        }
+
+    def __repr__(self):
+        return f'<Conversation {self.id} case {self.case_number} ({self.message_count} messages)>'
+
+
+class ConversationTurn(db.Model):
+    """One message of a conversation; rows are only ever appended"""
+    __tablename__ = 'conversation_turns'
+
+    id = db.Column(db.Integer, primary_key=True)  # insertion order is message order
+    conversation_id = db.Column(db.String(32), db.ForeignKey('conversations.id'), nullable=False, index=True)
+    role = db.Column(db.String(20), nullable=False)  # system, human, assistant
+    content = db.Column(db.Text, nullable=False, default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_message(self):
+        return {'role': self.role, 'content': self.content}
+
+
+def conversation_messages(conversation_id):
+    """Messages of a stored conversation, or [] if it does not exist.
+
+    The system prompt comes first as a reference (see system_prompt_reference);
+    SystemPromptRegistry.resolve fills in its text.
+    """
+    if not conversation_id:
+        return []
+    prompt_id = db.session.query(Conversation.system_prompt_id).filter_by(id=conversation_id).scalar()
+    opening = [system_prompt_reference(prompt_id)] if prompt_id else []
+    turns = (
+        ConversationTurn.query
+        .filter_by(conversation_id=conversation_id)
+        .order_by(ConversationTurn.id)
+        .all()
+    )
+    return opening + [turn.to_message() for turn in turns]
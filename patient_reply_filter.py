@@ -0,0 +1,172 @@
+"""
+Guard rails applied to the simulated patient's replies.
+
+filter_patient_reply() checks a complete reply. PatientReplyFilter applies
+the same rules to a streamed reply chunk by chunk, in the same order: the
+phrase check runs on the whole reply, then the sentence limit. It holds
+back just enough trailing text that a forbidden phrase is detected before
+any of its characters are released to the client, and its final reply is
+filter_patient_reply() of the whole stream.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Phrases that break patient immersion
+IMMERSION_BREAKING_PHRASES = [
+    "en tant qu'ia", "je suis une intelligence artificielle",
+    "comme assistant", "en tant qu'assistant", "en tant que modèle",
+    "je ne suis pas un vrai patient", "je suis un simulateur",
+    "je suis programmé", "mon rôle est de", "dans le cadre de cet exercice",
+    "en tant que patient simulé"
+]
+
+# Phrases where AI gives medical advice (patient should never do this)
+MEDICAL_ADVICE_PHRASES = [
+    "consultez un médecin", "je vous recommande de", "vous devriez",
+    "il serait préférable de", "je vous conseille", "il faut que vous",
+    "le traitement serait", "le diagnostic est", "vous avez probablement"
+]
+
+IMMERSION_BREAKING_REPLY = "Pardon docteur, je n'ai pas bien compris votre question."
+MEDICAL_ADVICE_REPLY = "Je ne sais pas trop, docteur. C'est vous le spécialiste."
+
+# Enforce brevity — max 3 sentences for patient realism
+MAX_PATIENT_SENTENCES = 3
+
+
+def _forbidden_phrase(text):
+    """(phrase, canned reply) of the first forbidden phrase in `text`, or None"""
+    text_lower = text.lower()
+    for phrases, replacement in ((IMMERSION_BREAKING_PHRASES, IMMERSION_BREAKING_REPLY),
+                                 (MEDICAL_ADVICE_PHRASES, MEDICAL_ADVICE_REPLY)):
+        for phrase in phrases:
+            if phrase in text_lower:
+                return phrase, replacement
+    return None
+
+
+def _log_forbidden_phrase(phrase, replacement):
+    if replacement == IMMERSION_BREAKING_REPLY:
+        logger.warning(f"AI broke immersion with: {phrase}")
+    else:
+        logger.warning(f"AI gave medical advice: {phrase}")
+
+
+def forbidden_phrase_replacement(text):
+    """Canned reply to use instead of `text` if it contains a forbidden phrase, else None"""
+    found = _forbidden_phrase(text)
+    if found is None:
+        return None
+    _log_forbidden_phrase(*found)
+    return found[1]
+
+
+def truncate_sentences(text, max_sentences=MAX_PATIENT_SENTENCES):
+    """Keep at most `max_sentences` sentences (split on '.')"""
+    sentences = [s.strip() for s in text.split('.') if s.strip()]
+    if len(sentences) > max_sentences:
+        logger.info("Truncated long response for patient simulation")
+        return '. '.join(sentences[:max_sentences]) + '.'
+    return text
+
+
+def filter_patient_reply(text):
+    """Apply the immersion, medical-advice and brevity rules to a complete reply"""
+    return forbidden_phrase_replacement(text) or truncate_sentences(text)
+
+
+def _sentence_limit_end(text, max_sentences):
+    """Index just past the period closing the `max_sentences`-th sentence, or None"""
+    completed = 0
+    has_content = False
+    for index, char in enumerate(text):
+        if char == '.':
+            if has_content:
+                completed += 1
+                if completed == max_sentences:
+                    return index + 1
+            has_content = False
+        elif not char.isspace():
+            has_content = True
+    return None
+
+
+class PatientReplyFilter:
+    """
+    Incremental version of filter_patient_reply() for streamed replies.
+
+    feed() returns the text that is safe to send to the client. Text is
+    released with a hold-back of (longest forbidden phrase - 1) characters,
+    so a phrase is always caught before any of its characters are released,
+    and never past the sentence limit. The stream is read to its end even
+    once the limit is reached, because a forbidden phrase anywhere in the
+    reply replaces it, as in filter_patient_reply(). `stopped` is set once
+    the outcome cannot change any more (an immersion-breaking phrase, which
+    takes precedence over medical advice) and the rest can be dropped.
+
+    After finish(), `reply` is the reply to store. When it differs from
+    `released_text` the client must be sent it as a replacement.
+    """
+
+    HOLD_BACK = max(len(p) for p in IMMERSION_BREAKING_PHRASES + MEDICAL_ADVICE_PHRASES) - 1
+
+    def __init__(self, max_sentences=MAX_PATIENT_SENTENCES):
+        self.max_sentences = max_sentences
+        self.text = ''
+        self.released = 0
+        self.limit = None
+        self.replacement = None
+        self._reply = None
+
+    @property
+    def stopped(self):
+        return self.replacement == IMMERSION_BREAKING_REPLY
+
+    @property
+    def released_text(self):
+        """Text sent to the client so far"""
+        return self.text[:self.released]
+
+    def _check_phrases(self):
+        found = _forbidden_phrase(self.text)
+        if found is not None and found[1] != self.replacement:
+            _log_forbidden_phrase(*found)
+            self.replacement = found[1]
+
+    def _release(self, end):
+        end = max(self.released, end)
+        released = self.text[self.released:end]
+        self.released = end
+        return released
+
+    def feed(self, chunk):
+        if self.stopped or not chunk:
+            return ''
+
+        self.text += chunk
+        self._check_phrases()
+        if self.replacement is not None:
+            return ''
+
+        if self.limit is None:
+            self.limit = _sentence_limit_end(self.text, self.max_sentences)
+        end = len(self.text) - self.HOLD_BACK
+        if self.limit is not None:
+            end = min(end, self.limit)
+        return self._release(end)
+
+    def finish(self):
+        """Release the held-back tail once the stream has ended"""
+        self._reply = self.replacement if self.replacement is not None else truncate_sentences(self.text)
+        if self.replacement is not None:
+            return ''
+        return self._release(self.limit if self.limit is not None else len(self.text))
+
+    @property
+    def reply(self):
+        """The reply to store in the conversation"""
+        if self._reply is None:
+            return self.replacement if self.replacement is not None else self.text
+        return self._reply
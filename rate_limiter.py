@@ -0,0 +1,164 @@
+"""
+Proactive per-model rate limiting for the Groq model chain.
+
+Each model gets token buckets for requests/minute, tokens/minute and
+tokens/day. Calls reserve an estimated token cost before they are sent and
+are reconciled with the real usage reported by the API afterwards, so the
+client can route around a model that is about to be throttled instead of
+burning a failed round-trip on it.
+
+Budgets are tracked per process: with several workers each one keeps its
+own view, which is why the limits in LLAMA_MODELS should stay conservative.
+"""
+
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_MINUTE = 60.0
+SECONDS_PER_DAY = 86400.0
+
+
+class QuotaExhaustedError(Exception):
+    """Raised when no model in the chain has budget left for a request"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` units, refilled continuously over `period` seconds"""
+
+    def __init__(self, capacity, period, clock):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / float(period)
+        self.clock = clock
+        self.level = self.capacity
+        self.updated_at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = max(0.0, now - self.updated_at)
+        self.level = min(self.capacity, self.level + elapsed * self.rate)
+        self.updated_at = now
+
+    def available(self):
+        self._refill()
+        return self.level
+
+    def can_consume(self, amount):
+        return self.available() >= amount
+
+    def consume(self, amount):
+        """Take `amount` units; the level may go negative when reconciling real usage"""
+        self._refill()
+        self.level -= amount
+
+    def refund(self, amount):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+    def seconds_until(self, amount):
+        """Seconds until `amount` units are available (0 if they already are)"""
+        missing = min(amount, self.capacity) - self.available()
+        return max(0.0, missing / self.rate) if self.rate else float('inf')
+
+
+class ModelRateLimiter:
+    """
+    Per-model request/token budgets.
+
+    `limits` maps a model name to a dict with any of 'rpm' (requests per
+    minute), 'tpm' (tokens per minute) and 'tpd' (tokens per day). Models
+    without limits are never throttled.
+    """
+
+    _WINDOWS = {
+        'rpm': SECONDS_PER_MINUTE,
+        'tpm': SECONDS_PER_MINUTE,
+        'tpd': SECONDS_PER_DAY,
+    }
+
+    def __init__(self, limits, clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}
+        for model, model_limits in (limits or {}).items():
+            self._buckets[model] = {
+                name: TokenBucket(model_limits[name], window, clock)
+                for name, window in self._WINDOWS.items()
+                if model_limits.get(name)
+            }
+
+    def _cost(self, name, tokens):
+        return 1 if name == 'rpm' else tokens
+
+    def has_budget(self, model, estimated_tokens):
+        """True if `model` can take a request of `estimated_tokens` right now"""
+        with self._lock:
+            return all(
+                bucket.can_consume(self._cost(name, estimated_tokens))
+                for name, bucket in self._buckets.get(model, {}).items()
+            )
+
+    def acquire(self, model, estimated_tokens):
+        """Reserve one request and `estimated_tokens` on `model`; False if over budget"""
+        with self._lock:
+            buckets = self._buckets.get(model, {})
+            if not all(bucket.can_consume(self._cost(name, estimated_tokens))
+                       for name, bucket in buckets.items()):
+                return False
+            for name, bucket in buckets.items():
+                bucket.consume(self._cost(name, estimated_tokens))
+            return True
+
+    def reconcile(self, model, estimated_tokens, actual_tokens):
+        """Replace a reservation's estimated token cost with the usage the API reported"""
+        delta = actual_tokens - estimated_tokens
+        if not delta:
+            return
+        with self._lock:
+            for name, bucket in self._buckets.get(model, {}).items():
+                if name == 'rpm':
+                    continue
+                if delta > 0:
+                    bucket.consume(delta)
+                else:
+                    bucket.refund(-delta)
+
+    def release(self, model, estimated_tokens):
+        """Give back the tokens of a reservation whose request never produced output"""
+        with self._lock:
+            for name, bucket in self._buckets.get(model, {}).items():
+                if name != 'rpm':
+                    bucket.refund(estimated_tokens)
+
+    def seconds_until_available(self, model, estimated_tokens):
+        """Seconds until `model` could take a request of `estimated_tokens`"""
+        with self._lock:
+            return max(
+                (bucket.seconds_until(self._cost(name, estimated_tokens))
+                 for name, bucket in self._buckets.get(model, {}).items()),
+                default=0.0
+            )
+
+    def remaining_budget(self, model=None):
+        """
+        Remaining budget per model, e.g.
+        {'llama-3.1-8b-instant': {'rpm': 29, 'tpm': 5400, 'tpd': 499400}}
+
+        Pass `model` to get a single model's budget.
+        """
+        with self._lock:
+            models = [model] if model is not None else list(self._buckets)
+            budget = {
+                name: {
+                    limit: max(0, int(bucket.available()))
+                    for limit, bucket in self._buckets.get(name, {}).items()
+                }
+                for name in models
+            }
+        return budget[model] if model is not None else budget
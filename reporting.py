@@ -0,0 +1,73 @@
+"""
+Set-based rollups of student performances for the dashboards.
+
+The station and student lists used to load every StudentPerformance of
+every case or student, JSON blobs included, just to count and average
+them: one query per row of the list, each reading the whole table. The
+per-case and per-student lists now read the case_stats / student_stats
+totals maintained by rollups.py, one row per key. The per-case view of a
+single student is a GROUP BY over the columns of the covering index of
+student_performance (see StudentPerformance.__table_args__), answered
+without reading the evaluation and transcript blobs.
+
+Each function returns a dict keyed by case number or student id, with
+entries {'count', 'average', 'best', 'last_attempt'} (plus
+'unique_stations' for students). Keys with no performance are missing;
+use EMPTY_ROLLUP for them.
+"""
+
+from sqlalchemy import func
+
+from models import db, StudentPerformance, StudentStats, CaseStats
+
+EMPTY_ROLLUP = {'count': 0, 'average': 0, 'best': 0, 'last_attempt': None, 'unique_stations': 0}
+
+
+def _rollup(row):
+    return {
+        'count': row.count,
+        'average': row.average or 0,
+        'best': row.best or 0,
+        'last_attempt': row.last_attempt,
+    }
+
+
+def _aggregates():
+    return (
+        func.count(StudentPerformance.id).label('count'),
+        func.avg(StudentPerformance.percentage_score).label('average'),
+        func.max(StudentPerformance.percentage_score).label('best'),
+        func.max(StudentPerformance.completed_at).label('last_attempt'),
+    )
+
+
+def _stats_rollup(stats):
+    return {
+        'count': stats.attempts,
+        'average': stats.average_score,
+        'best': stats.best_score or 0,
+        'last_attempt': stats.last_attempt_at,
+    }
+
+
+def case_rollups():
+    """Performances per case, all students together"""
+    rows = CaseStats.query.filter(CaseStats.attempts > 0).all()
+    return {row.case_number: _stats_rollup(row) for row in rows}
+
+
+def student_rollups():
+    """Performances per student, with the number of distinct cases played"""
+    rows = StudentStats.query.filter(StudentStats.attempts > 0).all()
+    return {row.student_id: {**_stats_rollup(row), 'unique_stations': row.unique_stations} for row in rows}
+
+
+def student_case_rollups(student_id):
+    """One student's performances per case"""
+    rows = (
+        db.session.query(StudentPerformance.case_number, *_aggregates())
+        .filter(StudentPerformance.student_id == student_id)
+        .group_by(StudentPerformance.case_number)
+        .all()
+    )
+    return {row.case_number: _rollup(row) for row in rows}
@@ -0,0 +1,398 @@
+"""
+Bulk re-scoring of stored consultations.
+
+Editing a case's evaluation_checklist leaves existing StudentPerformance rows
+and competition station results with stale scores. A re-scoring run
+re-evaluates the stored transcripts in a scope: a case, a competition and/or
+a completion date range.
+
+- A run first records one RescoreItem per transcript. These rows are the
+  checkpoint: an interrupted run resumes with the items still pending.
+- Transcripts are evaluated on a small worker pool. Before each evaluation a
+  worker waits until the Groq chain has rate-limit headroom, so a run does
+  not starve interactive traffic. Results with criteria that could not be
+  assessed are retried rather than written.
+- Results are written in batched transactions. Each transaction updates the
+  re-scored rows, their RescoreItem and the run's counters.
+- summary() reports throughput (transcripts per minute) and the score
+  changes.
+- A run is claimed atomically before it is processed, so a resume reaching
+  another worker process, or a CLI run next to the admin one, cannot
+  evaluate the same items twice. The runner refreshes the run's heartbeat
+  while it works; a running run whose heartbeat is older than
+  `stale_after_seconds` (its process died) can be claimed again.
+
+Run it with `python rescore.py --case 12` (see --help), or start it from the
+admin interface.
+"""
+
+import sys
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+
+from models import (
+    db, RescoreRun, RescoreItem, StudentPerformance,
+    StudentCompetitionSession, StudentStationAssignment
+)
+from enhanced_evaluation_agent import has_assessment_errors
+
+logger = logging.getLogger(__name__)
+
+
+class RescoreRunBusyError(Exception):
+    """The run is already being processed (by this or another process)"""
+
+
+def _parse_date(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+class RescoreRunner:
+    """Creates, runs and resumes re-scoring runs"""
+
+    def __init__(self, app, evaluate, llm_client=None, workers=2, batch_size=20,
+                 max_attempts=3, retry_delay_seconds=20, headroom_tokens=4000,
+                 stale_after_seconds=600, heartbeat_seconds=30):
+        self.app = app
+        self.evaluate = evaluate
+        self.llm_client = llm_client
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay_seconds = retry_delay_seconds
+        self.headroom_tokens = headroom_tokens
+        self.stale_after_seconds = stale_after_seconds
+        self.heartbeat_seconds = min(heartbeat_seconds, stale_after_seconds / 3)
+        self._threads = {}
+
+    # ------------------------------------------------------------------ #
+    # Runs
+    # ------------------------------------------------------------------ #
+
+    def create_run(self, case_number=None, competition_id=None, since=None, until=None, created_by=None):
+        """Record a run and one pending item per stored transcript in scope; returns the run"""
+        scope = {
+            'case_number': str(case_number) if case_number else None,
+            'competition_id': competition_id,
+            'since': since.isoformat() if isinstance(since, datetime) else since,
+            'until': until.isoformat() if isinstance(until, datetime) else until,
+        }
+        run = RescoreRun(status='pending', created_by=created_by)
+        run.scope = scope
+        db.session.add(run)
+        db.session.flush()
+
+        items = [
+            RescoreItem(run_id=run.id, target_type=target_type, target_id=target_id,
+                        case_number=case, old_score=score)
+            for target_type, target_id, case, score in self._targets(scope)
+        ]
+        db.session.add_all(items)
+        run.total_items = len(items)
+        db.session.commit()
+
+        logger.info(f"Created rescore run {run.id} with {len(items)} transcripts ({scope})")
+        return run
+
+    def _targets(self, scope):
+        """(target_type, target_id, case_number, current score) for every transcript in scope"""
+        since, until = _parse_date(scope.get('since')), _parse_date(scope.get('until'))
+
+        if not scope.get('competition_id'):
+            query = StudentPerformance.query.filter(or_(
+                StudentPerformance.conversation_transcript_json.isnot(None),
+                StudentPerformance.conversation_id.isnot(None)
+            ))
+            if scope.get('case_number'):
+                query = query.filter(StudentPerformance.case_number == scope['case_number'])
+            if since:
+                query = query.filter(StudentPerformance.completed_at >= since)
+            if until:
+                query = query.filter(StudentPerformance.completed_at <= until)
+            for performance in query.order_by(StudentPerformance.id):
+                yield 'performance', performance.id, performance.case_number, performance.percentage_score
+
+        query = StudentStationAssignment.query.filter(
+            StudentStationAssignment.status == 'completed',
+            StudentStationAssignment.performance_data.isnot(None)
+        )
+        if scope.get('competition_id'):
+            query = query.join(StudentCompetitionSession).filter(
+                StudentCompetitionSession.session_id == scope['competition_id']
+            )
+        if scope.get('case_number'):
+            query = query.filter(StudentStationAssignment.case_number == scope['case_number'])
+        if since:
+            query = query.filter(StudentStationAssignment.completed_at >= since)
+        if until:
+            query = query.filter(StudentStationAssignment.completed_at <= until)
+        for assignment in query.order_by(StudentStationAssignment.id):
+            yield 'station', assignment.id, assignment.case_number, assignment.get_performance_score()
+
+    def claim(self, run_id):
+        """Atomically mark a run as running; False if it is running elsewhere (or completed)"""
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.stale_after_seconds)
+        claimed = RescoreRun.query.filter(
+            RescoreRun.id == run_id,
+            RescoreRun.status != 'completed',
+            or_(RescoreRun.status != 'running',
+                RescoreRun.heartbeat_at.is_(None),
+                RescoreRun.heartbeat_at < stale)
+        ).update({
+            'status': 'running',
+            'started_at': db.func.coalesce(RescoreRun.started_at, now),
+            'heartbeat_at': now
+        }, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    def start(self, run_id):
+        """Claim `run_id` and run (or resume) it on a background thread.
+
+        Raises RescoreRunBusyError if the run is already running.
+        """
+        if not self.claim(run_id):
+            raise RescoreRunBusyError(f"Rescore run {run_id} is already running")
+        thread = threading.Thread(target=self._run_in_context, args=(run_id,),
+                                  name=f'rescore-{run_id}', daemon=True)
+        self._threads[run_id] = thread
+        thread.start()
+        return thread
+
+    def _run_in_context(self, run_id):
+        with self.app.app_context():
+            try:
+                self.run(run_id, claimed=True)
+            except Exception as e:
+                logger.error(f"Rescore run {run_id} crashed: {e}", exc_info=True)
+            finally:
+                db.session.remove()
+
+    def run(self, run_id, progress=None, claimed=False):
+        """Process the run's pending items; safe to call again after an interruption.
+
+        Raises RescoreRunBusyError if the run is already running (unless
+        `claimed`, i.e. start() claimed it for this call).
+        """
+        run = db.session.get(RescoreRun, run_id)
+        if run is None:
+            raise ValueError(f"Rescore run {run_id} not found")
+        if run.status == 'completed':
+            return self.summary(run_id)
+        if not claimed and not self.claim(run_id):
+            raise RescoreRunBusyError(f"Rescore run {run_id} is already running")
+
+        pending = [
+            (item.id, item.target_type, item.target_id, item.case_number)
+            for item in run.items.filter_by(status='pending').order_by(RescoreItem.id)
+        ]
+        logger.info(f"Rescore run {run_id}: {len(pending)} transcripts to evaluate")
+
+        started = time.monotonic()
+        beat = time.monotonic()
+        batch = []
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='rescore')
+        try:
+            remaining = {executor.submit(self._evaluate_item, *item) for item in pending}
+            while remaining:
+                # Wake up at least every heartbeat, even while the workers wait for budget
+                done, remaining = wait(remaining, timeout=self.heartbeat_seconds, return_when=FIRST_COMPLETED)
+                batch.extend(future.result() for future in done)
+                if len(batch) >= self.batch_size:
+                    self._write_batch(run_id, batch, time.monotonic() - started)
+                    started = beat = time.monotonic()
+                    batch = []
+                    if progress:
+                        progress(db.session.get(RescoreRun, run_id))
+                elif time.monotonic() - beat >= self.heartbeat_seconds:
+                    self._heartbeat(run_id)
+                    beat = time.monotonic()
+            self._write_batch(run_id, batch, time.monotonic() - started)
+        except BaseException:
+            # Ctrl-C or a crash: keep what was evaluated, the rest stays pending
+            executor.shutdown(wait=False, cancel_futures=True)
+            db.session.rollback()
+            self._write_batch(run_id, batch, time.monotonic() - started, status='interrupted')
+            raise
+        executor.shutdown()
+
+        run = db.session.get(RescoreRun, run_id)
+        run.status = 'completed'
+        run.completed_at = datetime.utcnow()
+        db.session.commit()
+        logger.info(f"Rescore run {run_id} completed: {run.processed_items} re-scored, "
+                    f"{run.failed_items} failed, {run.throughput_per_minute} transcripts/min")
+        return self.summary(run_id)
+
+    # ------------------------------------------------------------------ #
+    # Workers
+    # ------------------------------------------------------------------ #
+
+    def _wait_for_budget(self):
+        """Block until some model of the chain could take an evaluation-sized request"""
+        rate_limiter = getattr(self.llm_client, 'rate_limiter', None)
+        models = getattr(self.llm_client, 'models', None)
+        if rate_limiter is None or not models:
+            return
+        while True:
+            wait = min(rate_limiter.seconds_until_available(model, self.headroom_tokens) for model in models)
+            if wait <= 0:
+                return
+            logger.info(f"Rescore waiting {wait:.0f}s for Groq rate-limit headroom")
+            time.sleep(min(wait, 30))
+
+    def _load_transcript(self, target_type, target_id):
+        if target_type == 'performance':
+            performance = db.session.get(StudentPerformance, target_id)
+            return performance.conversation_transcript if performance else None
+        assignment = db.session.get(StudentStationAssignment, target_id)
+        summary = assignment.get_performance_summary() if assignment else None
+        return (summary or {}).get('conversation_transcript')
+
+    def _evaluate_item(self, item_id, target_type, target_id, case_number):
+        """Evaluate one transcript; returns (item_id, results or None, error)"""
+        with self.app.app_context():
+            try:
+                conversation = self._load_transcript(target_type, target_id)
+            finally:
+                db.session.remove()
+            if not conversation:
+                return item_id, None, "Transcription introuvable"
+
+            error = None
+            for attempt in range(1, self.max_attempts + 1):
+                self._wait_for_budget()
+                try:
+                    # A deliberate re-score paces itself on the budget: never let the load policy degrade it
+                    results = self.evaluate(conversation, case_number, tier='full')
+                except Exception as e:
+                    results, error = None, str(e)
+                else:
+                    if not has_assessment_errors(results):
+                        return item_id, results, None
+                    error = results.get('feedback') or "Critères non évalués"
+                if attempt < self.max_attempts:
+                    logger.warning(f"Rescore of {target_type} {target_id} incomplete (attempt {attempt}), retrying")
+                    time.sleep(self.retry_delay_seconds * attempt)
+            return item_id, None, error
+
+    def _heartbeat(self, run_id):
+        RescoreRun.query.filter_by(id=run_id).update(
+            {'heartbeat_at': datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+
+    def _write_batch(self, run_id, batch, elapsed, status=None):
+        """Write a batch of results, their checkpoints and the run counters in one transaction"""
+        run = db.session.get(RescoreRun, run_id)
+        now = datetime.utcnow()
+        for item_id, results, error in batch:
+            item = db.session.get(RescoreItem, item_id)
+            item.processed_at = now
+            if results is None:
+                item.status = 'failed'
+                item.error = error
+                run.failed_items += 1
+                continue
+            if item.target_type == 'performance':
+                target = db.session.get(StudentPerformance, item.target_id)
+                target.apply_evaluation(results)
+            else:
+                target = db.session.get(StudentStationAssignment, item.target_id)
+                target.record_evaluation(results)
+            item.status = 'done'
+            item.new_score = results.get('percentage', 0)
+            run.processed_items += 1
+        run.elapsed_seconds = (run.elapsed_seconds or 0.0) + elapsed
+        run.heartbeat_at = now
+        if status:
+            run.status = status
+        db.session.commit()
+
+    # ------------------------------------------------------------------ #
+    # Reporting
+    # ------------------------------------------------------------------ #
+
+    def summary(self, run_id, max_changes=200):
+        """Run progress, throughput and the score changes it made"""
+        run = db.session.get(RescoreRun, run_id)
+        if run is None:
+            return None
+        done = run.items.filter_by(status='done').all()
+        deltas = [item.new_score - (item.old_score or 0) for item in done]
+        changes = sorted(
+            (item.to_dict() for item in done if item.new_score != item.old_score),
+            key=lambda change: abs(change['delta'] or 0), reverse=True
+        )
+        return {
+            **run.to_dict(),
+            'diff': {
+                'changed': len(changes),
+                'unchanged': len(done) - len(changes),
+                'increased': sum(1 for d in deltas if d > 0),
+                'decreased': sum(1 for d in deltas if d < 0),
+                'mean_delta': round(sum(deltas) / len(deltas), 1) if deltas else 0.0,
+                'changes': changes[:max_changes],
+            },
+            'failures': [item.to_dict() for item in run.items.filter_by(status='failed').limit(max_changes)]
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored consultations after a checklist change")
+    parser.add_argument('--case', help='Case number to re-score')
+    parser.add_argument('--competition', type=int, help='Competition session id to re-score')
+    parser.add_argument('--since', help='Only consultations completed on/after this date (YYYY-MM-DD)')
+    parser.add_argument('--until', help='Only consultations completed on/before this date (YYYY-MM-DD)')
+    parser.add_argument('--resume', type=int, metavar='RUN_ID', help='Resume an interrupted run')
+    parser.add_argument('--workers', type=int, help='Transcripts evaluated at once')
+    args = parser.parse_args()
+
+    if not args.resume and not (args.case or args.competition or args.since or args.until):
+        parser.error("give a scope (--case, --competition, --since/--until) or --resume RUN_ID")
+
+    from app import create_app
+    app = create_app()
+    runner = app.config['RESCORE_RUNNER']
+    if args.workers:
+        runner.workers = args.workers
+
+    with app.app_context():
+        if args.resume:
+            run_id = args.resume
+        else:
+            run_id = runner.create_run(args.case, args.competition, args.since, args.until, created_by='cli').id
+        print(f"🔁 Rescore run {run_id}")
+
+        def progress(run):
+            print(f"  {run.processed_items + run.failed_items}/{run.total_items} "
+                  f"({run.throughput_per_minute} transcripts/min)")
+
+        try:
+            summary = runner.run(run_id, progress=progress)
+        except RescoreRunBusyError:
+            print(f"⏳ Rescore run {run_id} is already running (admin interface or another process)")
+            return False
+        except KeyboardInterrupt:
+            print(f"\n⏸️  Interrupted — resume with: python rescore.py --resume {run_id}")
+            return False
+
+        diff = summary['diff']
+        print(f"✅ {summary['processed_items']} re-scored, {summary['failed_items']} failed, "
+              f"{summary['throughput_per_minute']} transcripts/min")
+        print(f"   Scores changed: {diff['changed']} (↑ {diff['increased']}, ↓ {diff['decreased']}), "
+              f"mean Δ {diff['mean_delta']:+} points")
+        for change in diff['changes'][:20]:
+            print(f"   {change['target_type']} {change['target_id']} (case {change['case_number']}): "
+                  f"{change['old_score']} → {change['new_score']} ({change['delta']:+})")
+        return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,429 @@
+"""
+Incrementally maintained totals per student and per case.
+
+Student.get_average_score, get_total_workouts and PatientCase.get_average_score
+used to aggregate student_performance on every call, once per row of the
+dashboards. student_stats and case_stats hold running totals instead:
+attempt count, score sum, best score, last attempt, per-category checklist
+completion and per-specialty attempt counts, for practice consultations and
+completed competition stations. A station whose evaluation job has not run
+yet has no score (NULL) and is left out until the job records it. Reading
+them is a primary-key lookup.
+
+A session after_flush hook keeps them current in the transaction that
+records the attempt, so a rollback undoes both:
+
+    a new StudentPerformance, or a station assignment becoming 'completed',
+    adds its contribution to the student's and the case's rows;
+    any other change to an attempt (re-scoring, deletion, a case changing
+    specialty) and a first attempt without a stats row yet recompute the
+    rows concerned from the raw tables.
+
+Bulk Query.delete() calls bypass the hook, so the code doing them calls
+mark_stale() with the keys they affect. rebuild() recomputes every row
+(init_db.py rebuild-stats) and check() compares the stored rows with a
+fresh recomputation (init_db.py check-stats).
+"""
+
+import json
+import logging
+from collections import namedtuple
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import event, select, insert, update, delete, inspect
+
+import json_codec
+from models import (db, Student, PatientCase, StudentPerformance, StudentStationAssignment,
+                    StudentCompetitionSession, StudentStats, CaseStats)
+
+logger = logging.getLogger(__name__)
+
+STALE_KEY = 'stats_stale'
+WRITTEN_KEY = 'stats_written'
+
+Attempt = namedtuple('Attempt', 'kind student_id case_number score completed_at categories')
+
+_performances = StudentPerformance.__table__
+_assignments = StudentStationAssignment.__table__
+_student_sessions = StudentCompetitionSession.__table__
+_cases = PatientCase.__table__
+
+STUDENT = {'table': StudentStats.__table__, 'key': 'student_id',
+           'json': ('case_counts', 'category_counts', 'specialty_counts')}
+CASE = {'table': CaseStats.__table__, 'key': 'case_number', 'json': ('category_counts',)}
+
+_SCALARS = ('attempts', 'score_sum', 'best_score', 'last_attempt_at', 'competition_attempts', 'competition_score_sum')
+
+# Attributes whose change alters the contribution of an existing attempt
+_PERFORMANCE_FIELDS = ('student_id', 'case_number', 'percentage_score', 'completed_at', 'evaluation_results_json')
+_ASSIGNMENT_FIELDS = ('student_session_id', 'case_number', 'status', 'completed_at', 'percentage_score', 'performance_data')
+
+
+def _loads(value):
+    if isinstance(value, dict):
+        return value
+    try:
+        data = json_codec.loads(value) if value else {}
+    except json_codec.DECODE_ERRORS:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _categories(evaluation_results):
+    """{category: [completed, total]} of the checklist of an evaluation"""
+    counts = {}
+    checklist = evaluation_results.get('checklist') if isinstance(evaluation_results, dict) else None
+    for item in checklist or []:
+        if not isinstance(item, dict):
+            continue
+        entry = counts.setdefault(str(item.get('category') or 'Général'), [0, 0])
+        entry[1] += 1
+        if item.get('completed'):
+            entry[0] += 1
+    return counts
+
+
+def _practice_attempt(student_id, case_number, score, completed_at, evaluation_results_json):
+    return Attempt('practice', student_id, case_number, float(score or 0), completed_at,
+                   _categories(_loads(evaluation_results_json)))
+
+
+def _competition_attempt(student_id, case_number, score, completed_at, performance_data):
+    return Attempt('competition', student_id, case_number, float(score or 0), completed_at,
+                   _categories(_loads(performance_data).get('evaluation_results')))
+
+
+# Totals
+
+def _empty(rollup):
+    totals = {'attempts': 0, 'score_sum': 0.0, 'best_score': None, 'last_attempt_at': None,
+              'competition_attempts': 0, 'competition_score_sum': 0.0}
+    totals.update({name: {} for name in rollup['json']})
+    return totals
+
+
+def _add(totals, attempt, specialty=None):
+    if attempt.kind == 'practice':
+        totals['attempts'] += 1
+        totals['score_sum'] += attempt.score
+        if totals['best_score'] is None or attempt.score > totals['best_score']:
+            totals['best_score'] = attempt.score
+        if attempt.completed_at and (totals['last_attempt_at'] is None or attempt.completed_at > totals['last_attempt_at']):
+            totals['last_attempt_at'] = attempt.completed_at
+        if 'case_counts' in totals:
+            totals['case_counts'][attempt.case_number] = totals['case_counts'].get(attempt.case_number, 0) + 1
+    else:
+        totals['competition_attempts'] += 1
+        totals['competition_score_sum'] += attempt.score
+
+    for category, (completed, total) in attempt.categories.items():
+        entry = totals['category_counts'].setdefault(category, [0, 0])
+        entry[0] += completed
+        entry[1] += total
+    if 'specialty_counts' in totals and specialty:
+        totals['specialty_counts'][specialty] = totals['specialty_counts'].get(specialty, 0) + 1
+
+
+def _from_row(rollup, row):
+    totals = {name: row[name] for name in _SCALARS}
+    totals.update({name: _loads(row[f'{name}_json']) for name in rollup['json']})
+    return totals
+
+
+def _to_values(rollup, totals):
+    values = {name: totals[name] for name in _SCALARS}
+    values.update({f'{name}_json': json.dumps(totals[name], ensure_ascii=False, sort_keys=True) for name in rollup['json']})
+    if 'case_counts' in totals:
+        values['unique_stations'] = len(totals['case_counts'])
+    values['updated_at'] = datetime.utcnow()
+    return values
+
+
+# Raw rows
+
+def _practice_attempts(connection, *criteria):
+    query = select(
+        _performances.c.student_id, _performances.c.case_number, _performances.c.percentage_score,
+        _performances.c.completed_at, _performances.c.evaluation_results_json
+    ).where(*criteria)
+    for row in connection.execute(query):
+        yield _practice_attempt(*row)
+
+
+def _competition_attempts(connection, *criteria):
+    query = select(
+        _student_sessions.c.student_id, _assignments.c.case_number, _assignments.c.percentage_score,
+        _assignments.c.completed_at, _assignments.c.performance_data
+    ).select_from(
+        _assignments.join(_student_sessions, _assignments.c.student_session_id == _student_sessions.c.id)
+    ).where(_assignments.c.status == 'completed', _assignments.c.percentage_score.isnot(None), *criteria)
+    for row in connection.execute(query):
+        yield _competition_attempt(*row)
+
+
+def _specialties(connection):
+    return dict(connection.execute(select(_cases.c.case_number, _cases.c.specialty)).all())
+
+
+def _compute(connection, attempts):
+    """Student and case totals of some attempts, keyed by student id and case number"""
+    specialties = _specialties(connection)
+    students, cases = {}, {}
+    for attempt in attempts:
+        _add(students.setdefault(attempt.student_id, _empty(STUDENT)), attempt, specialties.get(attempt.case_number))
+        _add(cases.setdefault(attempt.case_number, _empty(CASE)), attempt)
+    return students, cases
+
+
+# Stored rows
+
+def _load(connection, rollup, key):
+    table = rollup['table']
+    query = select(table).where(table.c[rollup['key']] == key).with_for_update()
+    return connection.execute(query).mappings().first()
+
+
+def _store(connection, rollup, key, totals, exists=None):
+    """Write the totals of a key (None deletes its row)"""
+    table = rollup['table']
+    column = table.c[rollup['key']]
+    if totals is None:
+        connection.execute(delete(table).where(column == key))
+        return
+    if exists is None:
+        exists = connection.execute(select(column).where(column == key)).first() is not None
+    values = _to_values(rollup, totals)
+    if exists:
+        connection.execute(update(table).where(column == key).values(**values))
+    else:
+        connection.execute(insert(table).values(**values, **{rollup['key']: key}))
+
+
+def _recompute(connection, student_ids=(), case_numbers=()):
+    """Rewrite the rows of some students and cases from the raw tables"""
+    student_ids = sorted(key for key in student_ids if key is not None)
+    case_numbers = sorted(key for key in case_numbers if key is not None)
+    if student_ids:
+        students, _ = _compute(connection, chain(
+            _practice_attempts(connection, _performances.c.student_id.in_(student_ids)),
+            _competition_attempts(connection, _student_sessions.c.student_id.in_(student_ids)),
+        ))
+        for student_id in student_ids:
+            _store(connection, STUDENT, student_id, students.get(student_id))
+    if case_numbers:
+        _, cases = _compute(connection, chain(
+            _practice_attempts(connection, _performances.c.case_number.in_(case_numbers)),
+            _competition_attempts(connection, _assignments.c.case_number.in_(case_numbers)),
+        ))
+        for case_number in case_numbers:
+            _store(connection, CASE, case_number, cases.get(case_number))
+
+
+def _apply(connection, rollup, attempts):
+    """Add new attempts to the stored rows of one rollup; returns the keys that have no row yet"""
+    if not attempts:
+        return set()
+    specialties = _specialties(connection) if rollup is STUDENT else {}
+    grouped = {}
+    for attempt in attempts:
+        grouped.setdefault(getattr(attempt, rollup['key']), []).append(attempt)
+
+    missing = set()
+    for key, items in grouped.items():
+        row = _load(connection, rollup, key)
+        if row is None:
+            missing.add(key)
+            continue
+        totals = _from_row(rollup, row)
+        for attempt in items:
+            _add(totals, attempt, specialties.get(attempt.case_number))
+        _store(connection, rollup, key, totals, exists=True)
+    return missing
+
+
+# Session hook
+
+def _history(obj, name):
+    return inspect(obj).attrs[name].history
+
+
+def _changed(obj, names):
+    return any(_history(obj, name).has_changes() for name in names)
+
+
+def _current_and_previous(obj, name):
+    history = _history(obj, name)
+    return {value for value in chain(history.added or (), history.unchanged or (), history.deleted or ())}
+
+
+def _assignment_student(connection, assignment):
+    student_id = connection.execute(
+        select(_student_sessions.c.student_id).where(_student_sessions.c.id == assignment.student_session_id)
+    ).scalar()
+    if student_id is None:
+        # Its student session is being deleted in the same flush
+        student_session = inspect(assignment).dict.get('student_session')
+        student_id = student_session.student_id if student_session is not None else None
+    return student_id
+
+
+def _newly_completed(assignment):
+    status = _history(assignment, 'status')
+    return (list(status.added or ()) == ['completed'] and bool(status.deleted)
+            and 'completed' not in status.deleted
+            and not _changed(assignment, ('student_session_id', 'case_number')))
+
+
+def _after_flush(session, flush_context):
+    stale = session.info.pop(STALE_KEY, None) or {'students': set(), 'cases': set()}
+    students, cases = stale['students'], stale['cases']
+    dropped_students, dropped_cases = set(), set()
+    new_attempts = []
+    connection = None
+
+    def conn():
+        nonlocal connection
+        if connection is None:
+            connection = session.connection()
+        return connection
+
+    for obj in session.new:
+        if isinstance(obj, StudentPerformance):
+            new_attempts.append(_practice_attempt(obj.student_id, obj.case_number, obj.percentage_score,
+                                                  obj.completed_at, obj.evaluation_results_json))
+        elif isinstance(obj, StudentStationAssignment) and obj.is_scored:
+            new_attempts.append(_competition_attempt(_assignment_student(conn(), obj), obj.case_number,
+                                                     obj.percentage_score, obj.completed_at, obj.performance_data))
+
+    for obj in session.dirty:
+        if isinstance(obj, StudentPerformance) and _changed(obj, _PERFORMANCE_FIELDS):
+            students |= _current_and_previous(obj, 'student_id')
+            cases |= _current_and_previous(obj, 'case_number')
+        elif isinstance(obj, StudentStationAssignment) and _changed(obj, _ASSIGNMENT_FIELDS):
+            if _newly_completed(obj):
+                if obj.is_scored:
+                    new_attempts.append(_competition_attempt(_assignment_student(conn(), obj), obj.case_number,
+                                                             obj.percentage_score, obj.completed_at, obj.performance_data))
+            elif 'completed' in _current_and_previous(obj, 'status'):
+                students.add(_assignment_student(conn(), obj))
+                cases |= _current_and_previous(obj, 'case_number')
+        elif isinstance(obj, PatientCase) and _history(obj, 'specialty').has_changes():
+            players = chain(
+                conn().execute(select(_performances.c.student_id).where(_performances.c.case_number == obj.case_number)),
+                conn().execute(select(_student_sessions.c.student_id).select_from(
+                    _assignments.join(_student_sessions, _assignments.c.student_session_id == _student_sessions.c.id)
+                ).where(_assignments.c.case_number == obj.case_number)),
+            )
+            students |= {row.student_id for row in players}
+
+    for obj in session.deleted:
+        if isinstance(obj, StudentPerformance):
+            students.add(obj.student_id)
+            cases.add(obj.case_number)
+        elif isinstance(obj, StudentStationAssignment) and 'completed' in _current_and_previous(obj, 'status'):
+            students.add(_assignment_student(conn(), obj))
+            cases.add(obj.case_number)
+        elif isinstance(obj, Student):
+            dropped_students.add(obj.id)
+        elif isinstance(obj, PatientCase):
+            dropped_cases.add(obj.case_number)
+
+    if not (new_attempts or students or cases or dropped_students or dropped_cases):
+        return
+
+    # Keys being recomputed already see the new attempts in the raw tables
+    missing_students = _apply(conn(), STUDENT, [a for a in new_attempts if a.student_id not in students])
+    missing_cases = _apply(conn(), CASE, [a for a in new_attempts if a.case_number not in cases])
+    _recompute(conn(), (students | missing_students) - dropped_students, (cases | missing_cases) - dropped_cases)
+    for student_id in dropped_students:
+        _store(conn(), STUDENT, student_id, None)
+    for case_number in dropped_cases:
+        _store(conn(), CASE, case_number, None)
+    session.info[WRITTEN_KEY] = True
+
+
+def _after_flush_postexec(session, flush_context):
+    """Expire the StudentStats/CaseStats objects loaded in the session, their rows were rewritten"""
+    if not session.info.pop(WRITTEN_KEY, False):
+        return
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, (StudentStats, CaseStats)):
+            session.expire(obj)
+
+
+def enable_stats_rollups(session=None):
+    """Maintain student_stats and case_stats on every flush of `session` (db.session by default)"""
+    session = session or db.session
+    if not event.contains(session, 'after_flush', _after_flush):
+        event.listen(session, 'after_flush', _after_flush)
+        event.listen(session, 'after_flush_postexec', _after_flush_postexec)
+
+
+def mark_stale(student_ids=(), case_numbers=(), session=None):
+    """Recompute these rows at the next flush (for changes made with bulk Query.delete/update)"""
+    session = session or db.session
+    stale = session.info.setdefault(STALE_KEY, {'students': set(), 'cases': set()})
+    stale['students'].update(student_ids)
+    stale['cases'].update(case_numbers)
+
+
+# Backfill and consistency
+
+def _all_attempts(connection):
+    return chain(_practice_attempts(connection), _competition_attempts(connection))
+
+
+def needs_rebuild(session=None):
+    """True when the stats tables are empty but attempts exist (e.g. right after they were added)"""
+    session = session or db.session
+    if session.query(StudentStats.student_id).first() is not None:
+        return False
+    completed = session.query(StudentStationAssignment.id).filter_by(status='completed').first()
+    return session.query(StudentPerformance.id).first() is not None or completed is not None
+
+
+def rebuild(session=None):
+    """Recompute every row from the raw tables and commit; returns the number of rows written"""
+    session = session or db.session
+    connection = session.connection()
+    students, cases = _compute(connection, _all_attempts(connection))
+    for rollup, rows in ((STUDENT, students), (CASE, cases)):
+        connection.execute(delete(rollup['table']))
+        if rows:
+            connection.execute(insert(rollup['table']), [
+                {**_to_values(rollup, totals), rollup['key']: key} for key, totals in rows.items()
+            ])
+    session.commit()
+    logger.info(f"Rebuilt stats of {len(students)} students and {len(cases)} cases")
+    return {'students': len(students), 'cases': len(cases)}
+
+
+def _same(stored, expected, tolerance):
+    if isinstance(expected, float) and isinstance(stored, (int, float)):
+        return abs(stored - expected) <= tolerance
+    return stored == expected
+
+
+def check(session=None, tolerance=1e-6):
+    """Differences between the stored rows and a fresh recomputation.
+
+    Returns a list of {'table', 'key', 'field', 'stored', 'expected'}; empty when consistent.
+    """
+    session = session or db.session
+    connection = session.connection()
+    students, cases = _compute(connection, _all_attempts(connection))
+    problems = []
+    for rollup, expected in ((STUDENT, students), (CASE, cases)):
+        table = rollup['table']
+        stored = {row[rollup['key']]: _from_row(rollup, row) for row in connection.execute(select(table)).mappings()}
+        for key in sorted(set(stored) | set(expected), key=str):
+            if key not in stored or key not in expected:
+                problems.append({'table': table.name, 'key': key, 'field': None,
+                                 'stored': key in stored, 'expected': key in expected})
+                continue
+            for field, value in expected[key].items():
+                if not _same(stored[key][field], value, tolerance):
+                    problems.append({'table': table.name, 'key': key, 'field': field,
+                                     'stored': stored[key][field], 'expected': value})
+    return problems
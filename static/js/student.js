@@ -280,9 +280,18 @@ document.addEventListener('DOMContentLoaded', async function() {
                     chatMessages.scrollTop = chatMessages.scrollHeight;
                 }
 
-                const response = await authenticatedFetch('/chat', {
-                    method: 'POST',
-                    body: JSON.stringify({ message })
+                let streamingElem = null;
+                const reply = await streamChatReply(message, text => {
+                    const loadingElement = document.querySelector('.loading');
+                    if (loadingElement) {
+                        loadingElement.remove();
+                    }
+                    if (!streamingElem) {
+                        streamingElem = addMessageToChat('assistant', '');
+                    }
+                    if (!streamingElem) return;
+                    streamingElem.querySelector('.message-content').textContent = text;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
                 });
 
                 const loadingElement = document.querySelector('.loading');
@@ -290,21 +299,16 @@ document.addEventListener('DOMContentLoaded', async function() {
                     loadingElement.remove();
                 }
 
-                if (!response) return; // Authentication failed
-
-                if (!response.ok) {
-                    throw new Error(`HTTP error! status: ${response.status}`);
-                }
+                if (reply === null) return; // Authentication failed
 
-                const data = await response.json();
-                
-                if (data.error) {
-                    addMessageToChat('system', `Erreur: ${data.error}`);
-                } else {
-                    addMessageToChat('assistant', data.reply);
+                // Re-render the final reply (handles image references)
+                if (streamingElem) {
+                    streamingElem.remove();
                 }
+                addMessageToChat('assistant', reply);
 
             } catch (error) {
+                document.querySelector('.loading')?.remove();
                 console.error('Error:', error);
                 addMessageToChat('system', 'Une erreur est survenue lors de l\'envoi du message');
             } finally {
@@ -457,6 +461,27 @@ function startTimer(minutes = 10) {
     }, 1000);
 }
 
+// Long-poll a background evaluation job until it has finished
+async function waitForEvaluation(jobId) {
+    while (true) {
+        const response = await authenticatedFetch(`/evaluation/${jobId}?wait=25`);
+        if (!response) {
+            throw new Error('Authentication failed');
+        }
+
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || `HTTP ${response.status}: Failed to fetch evaluation`);
+        }
+        if (data.status === 'completed') {
+            return data;
+        }
+        if (data.status === 'failed') {
+            throw new Error(data.error || "L'évaluation a échoué");
+        }
+    }
+}
+
 // End the consultation
 async function endConsultation() {
     clearInterval(timerInterval);
@@ -511,6 +536,11 @@ async function endConsultation() {
             throw new Error(data.error || `HTTP ${response.status}: Failed to end chat`);
         }
 
+        // The evaluation runs in the background; wait for its result
+        if (data.job_id) {
+            data = await waitForEvaluation(data.job_id);
+        }
+
         // Hide chat container and show evaluation screen
         if (chatContainer) chatContainer.classList.add('hidden');
         if (evaluationContainer) evaluationContainer.classList.remove('hidden');
@@ -1212,25 +1242,12 @@ async function endCurrentStation() {
     }
 }
 
-// Show station feedback
-function showStationFeedback(result) {
-    console.log('Showing station feedback:', result);
-    
-    hideAllCompetitionScreens();
-    const betweenStations = document.getElementById('between-stations');
-    if (betweenStations) {
-        betweenStations.classList.remove('hidden');
-    }
-    
-    // Update feedback display
-    const completedStationNumber = document.getElementById('completed-station-number');
+// Render a station's score and detailed feedback
+function renderStationEvaluation(evaluation, recommendations) {
     const stationScore = document.getElementById('station-score');
     
-    if (completedStationNumber) {
-        completedStationNumber.textContent = result.current_station;
-    }
     if (stationScore) {
-        stationScore.textContent = `${result.evaluation.percentage || 0}%`;
+        stationScore.textContent = `${evaluation.percentage || 0}%`;
     }
     
     // Display detailed feedback
@@ -1238,9 +1255,9 @@ function showStationFeedback(result) {
     if (feedbackDetails) {
         let feedbackHTML = '<h5>Détails de l\'évaluation:</h5>';
         
-        if (result.evaluation.checklist) {
+        if (evaluation.checklist) {
             feedbackHTML += '<ul class="feedback-list">';
-            result.evaluation.checklist.forEach(item => {
+            evaluation.checklist.forEach(item => {
                 const status = item.completed ? '✅' : '❌';
                 feedbackHTML += `<li class="${item.completed ? 'completed' : 'not-completed'}">
                     ${status} ${item.description} (${item.points} pts)
@@ -1250,9 +1267,9 @@ function showStationFeedback(result) {
             feedbackHTML += '</ul>';
         }
         
-        if (result.recommendations && result.recommendations.length > 0) {
+        if (recommendations && recommendations.length > 0) {
             feedbackHTML += '<h6>Recommandations:</h6><ul class="recommendations-list">';
-            result.recommendations.forEach(rec => {
+            recommendations.forEach(rec => {
                 feedbackHTML += `<li>${rec}</li>`;
             });
             feedbackHTML += '</ul>';
@@ -1260,6 +1277,44 @@ function showStationFeedback(result) {
         
         feedbackDetails.innerHTML = feedbackHTML;
     }
+}
+
+// Show station feedback
+function showStationFeedback(result) {
+    console.log('Showing station feedback:', result);
+    
+    hideAllCompetitionScreens();
+    const betweenStations = document.getElementById('between-stations');
+    if (betweenStations) {
+        betweenStations.classList.remove('hidden');
+    }
+    
+    // Update feedback display
+    const completedStationNumber = document.getElementById('completed-station-number');
+    const stationScore = document.getElementById('station-score');
+    
+    if (completedStationNumber) {
+        completedStationNumber.textContent = result.current_station;
+    }
+    if (result.evaluation_pending && result.job_id) {
+        if (stationScore) {
+            stationScore.textContent = '...';
+        }
+        const feedbackDetails = document.getElementById('feedback-details');
+        if (feedbackDetails) {
+            feedbackDetails.innerHTML = '<p class="evaluation-pending">Évaluation en cours...</p>';
+        }
+        waitForEvaluation(result.job_id)
+            .then(data => renderStationEvaluation(data.evaluation, data.recommendations || []))
+            .catch(error => {
+                console.error('Error fetching station evaluation:', error);
+                if (feedbackDetails) {
+                    feedbackDetails.innerHTML = `<p class="evaluation-error">${error.message}</p>`;
+                }
+            });
+    } else {
+        renderStationEvaluation(result.evaluation, result.recommendations || []);
+    }
     
     // If not finished, start countdown for next station (auto-advance)
     if (!result.is_finished) {
@@ -2456,6 +2511,66 @@ function addMessageToChat(role, text) {
     
     chatMessages.appendChild(messageElem);
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    return messageElem;
+}
+
+/**
+ * Send a message to /chat/stream and read the patient's reply as Server-Sent Events.
+ * onText(text) is called with the reply shown so far; resolves with the final reply
+ * (null if authentication failed).
+ */
+async function streamChatReply(message, onText) {
+    const response = await authenticatedFetch('/chat/stream', {
+        method: 'POST',
+        body: JSON.stringify({ message })
+    });
+
+    if (!response) return null; // Authentication failed
+
+    if (!response.ok || !response.body) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    let reply = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let event = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (!data) continue;
+
+            const payload = JSON.parse(data);
+            if (event === 'token') {
+                text += payload.text;
+                onText(text);
+            } else if (event === 'replace') {
+                text = payload.text;
+                onText(text);
+            } else if (event === 'done') {
+                reply = payload.reply;
+            } else if (event === 'error') {
+                throw new Error(payload.error);
+            }
+        }
+    }
+
+    return reply !== null ? reply : text;
 }
 
 // Global image modal function
@@ -3463,9 +3578,19 @@ async function sendMessage() {
             chatMessages.scrollTop = chatMessages.scrollHeight;
         }
 
-        const response = await authenticatedFetch('/chat', {
-            method: 'POST',
-            body: JSON.stringify({ message })
+        let streamingElem = null;
+        const reply = await streamChatReply(message, text => {
+            // Remove loading indicator on the first streamed text
+            const loadingElement = document.querySelector('.loading');
+            if (loadingElement) {
+                loadingElement.remove();
+            }
+            if (!streamingElem) {
+                streamingElem = addMessageToChat('assistant', '');
+            }
+            if (!streamingElem) return;
+            streamingElem.querySelector('.message-content').textContent = text;
+            chatMessages.scrollTop = chatMessages.scrollHeight;
         });
 
         // Remove loading indicator
@@ -3474,21 +3599,16 @@ async function sendMessage() {
             loadingElement.remove();
         }
 
-        if (!response) return;
+        if (reply === null) return;
 
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-
-        const data = await response.json();
-        
-        if (data.error) {
-            addMessageToChat('system', `Erreur: ${data.error}`);
-        } else {
-            addMessageToChat('assistant', data.reply);
+        // Re-render the final reply (handles image references)
+        if (streamingElem) {
+            streamingElem.remove();
         }
+        addMessageToChat('assistant', reply);
 
     } catch (error) {
+        document.querySelector('.loading')?.remove();
         console.error('Error:', error);
         addMessageToChat('system', 'Une erreur est survenue lors de l\'envoi du message');
     } finally {
@@ -0,0 +1,107 @@
+"""
+Shared storage of the rendered patient-simulation prompts.
+
+The system prompt of a consultation is the response template plus the case's
+identity card, symptoms and diagnosis: several kilobytes, identical for every
+student on the same case. It is rendered once per (case, case version),
+stored in system_prompts under a hash of its content, and conversations only
+reference it by id. Transcripts then carry a system message with a
+`prompt_id` and empty content (see models.system_prompt_reference), and the
+paths that need the text (the LLM call, PDF reports) resolve it here.
+
+The case version is the case's update time plus the template version, so
+editing a case or the template renders a new prompt. Conversations already
+started keep the prompt they began with.
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, SystemPrompt, system_prompt_reference
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_hash(content):
+    """Id of a prompt: a short hash of its text"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+
+
+class SystemPromptRegistry:
+    """Materialises system prompts once and resolves the references to them"""
+
+    def __init__(self, render, version, max_entries=256):
+        """
+        `render(case_number)` returns the prompt text of a case.
+        `version(case_number)` returns a string that changes whenever that text would.
+        """
+        self.render = render
+        self.version = version
+        self.max_entries = max_entries
+        self._ids = {}  # (case_number, version) -> prompt id
+        self._texts = OrderedDict()  # prompt id -> text, least recently used first
+        self._lock = threading.Lock()
+
+    def reference(self, case_number):
+        """System message referencing the current prompt of a case"""
+        return system_prompt_reference(self.prompt_id(case_number))
+
+    def prompt_id(self, case_number):
+        """Id of the current prompt of a case, rendering and storing it on first use"""
+        case_number = str(case_number)
+        key = (case_number, self.version(case_number))
+        with self._lock:
+            prompt_id = self._ids.get(key)
+        if prompt_id:
+            return prompt_id
+
+        content = self.render(case_number)
+        prompt_id = prompt_hash(content)
+        if db.session.get(SystemPrompt, prompt_id) is None:
+            db.session.add(SystemPrompt(id=prompt_id, case_number=case_number, case_version=key[1], content=content))
+            try:
+                db.session.commit()
+                logger.info(f"Stored system prompt {prompt_id} for case {case_number} ({len(content)} chars)")
+            except IntegrityError:
+                # Another worker stored the same prompt first
+                db.session.rollback()
+
+        with self._lock:
+            self._ids[key] = prompt_id
+            self._remember(prompt_id, content)
+        return prompt_id
+
+    def text(self, prompt_id):
+        """Text of a stored prompt, or None if it is unknown"""
+        with self._lock:
+            content = self._texts.get(prompt_id)
+            if content is not None:
+                self._texts.move_to_end(prompt_id)
+                return content
+
+        prompt = db.session.get(SystemPrompt, prompt_id)
+        if prompt is None:
+            logger.warning(f"System prompt {prompt_id} not found")
+            return None
+        with self._lock:
+            self._remember(prompt_id, prompt.content)
+        return prompt.content
+
+    def resolve(self, messages):
+        """Copy of `messages` with the system prompt references replaced by their text"""
+        resolved = []
+        for msg in messages or []:
+            if isinstance(msg, dict) and msg.get('prompt_id'):
+                msg = {'role': msg.get('role', 'system'), 'content': self.text(msg['prompt_id']) or ''}
+            resolved.append(msg)
+        return resolved
+
+    def _remember(self, prompt_id, content):
+        self._texts[prompt_id] = content
+        self._texts.move_to_end(prompt_id)
+        while len(self._texts) > self.max_entries:
+            self._texts.popitem(last=False)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The application modules are top-level; the offline fakes live in benchmarks/
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
@@ -0,0 +1,19 @@
+"""One EnhancedEvaluationAgent shared by many threads (see benchmarks/concurrent_evaluation.py)"""
+
+import os
+
+import pytest
+
+from concurrent_evaluation import BENCHMARK_DIR, stress
+from evaluation_benchmark import load_corpus
+
+
+@pytest.fixture(scope='module')
+def recordings():
+    return load_corpus(os.path.join(BENCHMARK_DIR, 'corpus.json'))
+
+
+@pytest.mark.parametrize('strategy', ['concurrent', 'sequential', 'batched'])
+def test_shared_agent_gives_each_thread_its_own_verdicts(recordings, strategy):
+    assert recordings
+    assert stress(recordings, evaluations=60, threads=8, strategy=strategy) == []
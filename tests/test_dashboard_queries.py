@@ -0,0 +1,27 @@
+"""SQL statements per dashboard request must not grow with the data (see benchmarks/dashboard_queries.py)"""
+
+import pytest
+
+import app as ecos
+from dashboard_queries import ENDPOINTS, count_statements, fake_groq_client
+
+SMALL = (8, 5, 40)  # students, cases, performances
+SCALE = 5
+
+
+@pytest.fixture(scope='module')
+def counts():
+    """{endpoint: ((status, statements) small, (status, statements) large)}"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('GROQ_API_KEY', 'offline')
+        monkeypatch.setattr(ecos, 'create_groq_client', fake_groq_client)
+        small = count_statements(*SMALL)
+        large = count_statements(*(n * SCALE for n in SMALL))
+    return {name: (small[name], large[name]) for name in small}
+
+
+@pytest.mark.parametrize('endpoint', [name for name, _, _ in ENDPOINTS])
+def test_statement_count_does_not_depend_on_rows(counts, endpoint):
+    (small_status, small_statements), (large_status, large_statements) = counts[endpoint]
+    assert small_status == large_status == 200
+    assert large_statements == small_statements
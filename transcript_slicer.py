@@ -0,0 +1,194 @@
+"""
+Relevance-filtered transcript slices for per-criterion evaluation prompts.
+
+A criterion such as "asks about allergies" is usually settled by one or two
+exchanges. TranscriptIndex splits a consultation into turns: a student
+message plus the patient's reply. It then ranks the turns for a criterion
+with BM25 over the French turns, giving extra weight to the category's
+FALLBACK_KEYWORDS. A slice holds the opening turn, the closing turn and the
+top-k relevant turns within a token budget, in their original order, with
+an ellipsis marker where turns were left out. Transcripts that already fit
+the budget are sent whole.
+
+Every slice is counted, so the token savings can be reported. Whether the
+slices grade as well as the full transcript can be checked with
+benchmarks/transcript_slicing.py.
+"""
+
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+# Rough tokens-per-character ratio, as used for the Groq rate-limit estimates
+CHARS_PER_TOKEN = 4
+
+OMITTED_TURNS_MARKER = "[... échanges sans rapport avec ce critère omis ...]"
+
+_TOKEN = re.compile(r'\w{3,}')
+
+_FRENCH_STOPWORDS = frozenset({
+    'les', 'des', 'une', 'est', 'que', 'qui', 'pas', 'pour', 'dans', 'avec', 'sur', 'par',
+    'vous', 'votre', 'vos', 'nous', 'mon', 'mes', 'ton', 'son', 'ses', 'elle', 'ils', 'elles',
+    'mais', 'donc', 'car', 'cette', 'ces', 'aux', 'ete', 'etre', 'avez', 'avoir', 'fait',
+    'faire', 'tout', 'tres', 'plus', 'bien', 'oui', 'non', 'docteur', 'patient', 'patiente',
+    'demander', 'rechercher', 'preciser', 'evaluer', 'etudiant'
+})
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _fold(text):
+    """Lower-case and strip accents so 'Fièvre' and 'fievre' match"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text, stem_length=6):
+    """Accent-folded word prefixes, stop words removed"""
+    return [
+        word[:stem_length] for word in _TOKEN.findall(_fold(text))
+        if word not in _FRENCH_STOPWORDS
+    ]
+
+
+def _format_message(msg):
+    role = "Étudiant (médecin)" if msg.get('role') == 'human' else "Patient"
+    return f"{role}: {msg.get('content', '')}"
+
+
+def split_turns(conversation):
+    """Turns as formatted text: each student message with the replies that follow it"""
+    turns = []
+    for msg in conversation:
+        if msg.get('role') == 'system':
+            continue
+        if msg.get('role') == 'human' or not turns:
+            turns.append([])
+        turns[-1].append(_format_message(msg))
+    return ["\n\n".join(lines) for lines in turns]
+
+
+class SliceStats:
+    """Thread-safe counters of transcript tokens available vs. actually sent"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.prompts = 0
+        self.sliced_prompts = 0
+        self.full_tokens = 0
+        self.sent_tokens = 0
+
+    def record(self, full_tokens, sent_tokens):
+        with self._lock:
+            self.prompts += 1
+            self.sliced_prompts += sent_tokens < full_tokens
+            self.full_tokens += full_tokens
+            self.sent_tokens += sent_tokens
+
+    def merge(self, other):
+        snapshot = other.snapshot()
+        with self._lock:
+            self.prompts += snapshot['prompts']
+            self.sliced_prompts += snapshot['sliced_prompts']
+            self.full_tokens += snapshot['full_tokens']
+            self.sent_tokens += snapshot['sent_tokens']
+
+    def snapshot(self):
+        with self._lock:
+            saved = self.full_tokens - self.sent_tokens
+            return {
+                'prompts': self.prompts,
+                'sliced_prompts': self.sliced_prompts,
+                'full_tokens': self.full_tokens,
+                'sent_tokens': self.sent_tokens,
+                'saved_tokens': saved,
+                'saved_ratio': round(saved / self.full_tokens, 3) if self.full_tokens else 0.0,
+            }
+
+
+class TranscriptIndex:
+    """BM25 index over the turns of one consultation"""
+
+    def __init__(self, conversation, k1=1.5, b=0.75):
+        self.turns = split_turns(conversation)
+        self.text = "\n\n".join(self.turns)
+        self.stats = SliceStats()
+        self.k1 = k1
+        self.b = b
+
+        self._term_counts = [Counter(tokenize(turn)) for turn in self.turns]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        document_frequency = Counter(term for counts in self._term_counts for term in counts)
+        total = len(self.turns)
+        self._idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def __str__(self):
+        return self.text
+
+    def scores(self, query, boost_keywords=(), boost=0.5):
+        """BM25 score of each turn for `query`, plus a lighter weight for `boost_keywords`"""
+        weights = Counter()
+        for term in tokenize(query):
+            weights[term] = 1.0
+        for keyword in boost_keywords:
+            for term in tokenize(keyword):
+                weights[term] = max(weights[term], boost)
+
+        scores = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_length) if self._avg_length else self.k1
+            for term, weight in weights.items():
+                frequency = counts.get(term)
+                if frequency:
+                    score += weight * self._idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+    def full(self):
+        """The whole transcript, counted as an unsliced prompt"""
+        full_tokens = estimate_tokens(self.text)
+        self.stats.record(full_tokens, full_tokens)
+        return self.text
+
+    def slice(self, query, boost_keywords=(), top_k=4, token_budget=1200):
+        """Text of the opening turn, the closing turn and the `top_k` most relevant turns"""
+        full_tokens = estimate_tokens(self.text)
+        if full_tokens <= token_budget or len(self.turns) <= top_k + 2:
+            return self.full()
+
+        last = len(self.turns) - 1
+        selected = {0, last}
+        used = estimate_tokens(self.turns[0]) + estimate_tokens(self.turns[last])
+
+        scores = self.scores(query, boost_keywords)
+        ranked = sorted(
+            (index for index in range(1, last) if scores[index] > 0),
+            key=lambda index: scores[index], reverse=True
+        )
+        for index in ranked[:top_k]:
+            cost = estimate_tokens(self.turns[index])
+            if used + cost > token_budget:
+                continue
+            selected.add(index)
+            used += cost
+
+        parts = []
+        previous = None
+        for index in sorted(selected):
+            if previous is not None and index != previous + 1:
+                parts.append(OMITTED_TURNS_MARKER)
+            parts.append(self.turns[index])
+            previous = index
+        text = "\n\n".join(parts)
+
+        self.stats.record(full_tokens, estimate_tokens(text))
+        return text